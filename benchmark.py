@@ -0,0 +1,372 @@
+#!/usr/bin/python3
+"""
+Program times search and rendering hot paths on synthetic sendmail logs (see generate_sendmail_log.py)
+and stores results as json, so results of different versions can be compared. Rendering is run on windows
+in memory, it`s time per keystroke and peak memory are checked against limits, whatever number of rows is.
+"""  # Example: ./benchmark.py --size 100M --output new.json --compare old.json
+
+import os
+import sys
+import gzip
+import json
+import time
+import platform
+import argparse
+import datetime
+import tempfile
+import statistics
+import subprocess
+import contextlib
+import tracemalloc
+
+import curses
+
+import maillog
+import generate_sendmail_log
+
+RESULTS_VERSION = 1
+KEYSTROKES = 200  # keystrokes timed in one run of scrolling benchmark
+MAX_KEYSTROKE_MS = 5.0  # default limits of rendering benchmarks, which are checked by tests too
+MAX_RENDER_KB = 1024
+
+
+def conf_args_parser() -> argparse.Namespace:
+    """
+    Function config program cli interface.
+
+    Returns
+    -------
+    :return: argparse.Namespace
+        Namespace of program arguments
+    """
+    parser = argparse.ArgumentParser(description=__doc__, prog='benchmark',
+                                     formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--version', action='version', version='%(prog)s 1.0')
+    parser.add_argument('--log', default=None, dest="log",
+                        help='existing log to benchmark on, otherwise one is generated')
+    parser.add_argument('--size', '-s', default="10M", dest="size", type=generate_sendmail_log.parse_size,
+                        help='size of generated log (default 10M)')
+    parser.add_argument('--gzip', '-z', default=False, dest="gzip", action='store_true',
+                        help='compress generated log with gzip')
+    parser.add_argument('--blocks', default=False, dest="blocks", action='store_true',
+                        help='compress generated log as block gzip (see convert_rotated_logs.py)')
+    parser.add_argument('--email', default="user1@", dest="email",
+                        help='e-mail to search for (default `user1@` - the most active generated sender)')
+    parser.add_argument('--repeat', '-r', default=3, dest="repeat", type=int,
+                        help='times to run every benchmark, the best time is compared (default 3)')
+    parser.add_argument('--rows', default="10,10000,1000000", dest="rows",
+                        help='comma separated numbers of rows to render (default 10,10000,1000000)')
+    parser.add_argument('--max_keystroke_ms', default=MAX_KEYSTROKE_MS, dest="max_keystroke_ms", type=float,
+                        metavar="MS",
+                        help='exit with status 1, if rendering takes more than MS milliseconds per keystroke\n'
+                             '(default 5)')
+    parser.add_argument('--max_render_kb', default=MAX_RENDER_KB, dest="max_render_kb", type=int, metavar="KB",
+                        help='exit with status 1, if rendering allocates more than KB kilobytes at peak\n'
+                             '(default 1024)')
+    parser.add_argument('--output', '-o', default=None, dest="output",
+                        help='json file to store results in')
+    parser.add_argument('--compare', '-c', default=None, dest="compare",
+                        help='json file with results of other version to compare with')
+    parser.add_argument('--max_slowdown', default=None, dest="max_slowdown", type=float,
+                        help='exit with status 1, if any benchmark is this times slower than compared one')
+    return parser.parse_args()
+
+
+def measure(function, repeat: int, calls=None) -> dict:
+    """
+    Function run :function: :repeat: times and returns it`s timings in seconds. If function makes :calls:
+    keystrokes, time of one of them and peak of memory allocated by one run are returned too.
+    """
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        seconds.append(time.perf_counter() - start)
+    result = {"seconds": seconds, "best": min(seconds), "median": statistics.median(seconds)}
+    if calls:
+        result["keystrokes"] = calls
+        result["per_keystroke"] = result["best"] / calls
+        tracemalloc.start()
+        try:
+            function()
+            result["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+class FakeWindow:
+    """
+    Class of curses window in memory: it keeps characters of cells, counts written cells and refreshes, and raises
+    curses.error, when text goes out of window, as curses does. Classes of interface are drawn on it without
+    terminal (see :fake_curses:), so their output can be checked and timed.
+    """
+
+    def __init__(self, height=40, width=120, y=0, x=0):
+        self.height, self.width = height, width
+        self.begin = (y, x)
+        self.cells = [[" "] * width for _ in range(height)]
+        self.cursor = (0, 0)
+        self.written = 0  # cells written or changed
+        self.refreshes = 0
+        self.keys = []  # keys returned by getch, then -1 as if time is out
+
+    def getmaxyx(self):
+        return self.height, self.width
+
+    def getbegyx(self):
+        return self.begin
+
+    def addstr(self, *args):
+        """Method write text at (y, x) or at cursor, wrapping it at width of window."""
+        if len(args) >= 3:
+            (y, x), text = args[:2], args[2]
+        else:
+            (y, x), text = self.cursor, args[0]
+        if not (0 <= y < self.height and 0 <= x < self.width):
+            raise curses.error("addwstr() returned ERR")
+        for char in text:
+            if char == "\n":
+                y, x = y + 1, 0
+                continue
+            if y >= self.height:
+                raise curses.error("addwstr() returned ERR")
+            self.cells[y][x] = char
+            self.written += 1
+            x += 1
+            if x == self.width:
+                y, x = y + 1, 0
+        if y >= self.height:  # cursor can`t go after the last cell
+            raise curses.error("addwstr() returned ERR")
+        self.cursor = (y, x)
+
+    def chgat(self, y, x, num, attr=0):
+        if not (0 <= y < self.height and 0 <= x < self.width):
+            raise curses.error("chgat() returned ERR")
+        self.written += min(num, self.width - x)
+
+    def clear(self):
+        self.cells = [[" "] * self.width for _ in range(self.height)]
+
+    erase = clear
+
+    def box(self, *args):
+        for row in (0, self.height - 1):
+            self.cells[row] = ["+"] + ["-"] * (self.width - 2) + ["+"]
+        for row in range(1, self.height - 1):
+            self.cells[row][0] = self.cells[row][-1] = "|"
+
+    def subwin(self, *args):
+        if len(args) == 2:
+            y, x = args
+            height, width = self.height - (y - self.begin[0]), self.width - (x - self.begin[1])
+        else:
+            height, width, y, x = args
+        return FakeWindow(height, width, y, x)
+
+    def refresh(self):
+        self.refreshes += 1
+
+    def getch(self):
+        return self.keys.pop(0) if self.keys else -1
+
+    def attron(self, attr):
+        pass
+
+    def attroff(self, attr):
+        pass
+
+    def bkgd(self, char, attr=0):
+        pass
+
+    def touchwin(self):
+        pass
+
+    def keypad(self, flag):
+        pass
+
+    def text(self) -> str:
+        """Method returns characters of window, line by line."""
+        return "\n".join("".join(row).rstrip() for row in self.cells)
+
+
+@contextlib.contextmanager
+def fake_curses():
+    """Context manager, which replaces functions of curses, that need terminal, with ones working on :FakeWindow:."""
+    fakes = {"newwin": lambda height, width, y=0, x=0: FakeWindow(height, width, y, x),
+             "initscr": lambda: FakeWindow(), "color_pair": lambda num: num << 8, "has_colors": lambda: False}
+    fakes.update(dict.fromkeys(("init_pair", "start_color", "curs_set", "noecho", "echo", "cbreak", "nocbreak",
+                                "endwin"), lambda *args: None))
+    originals = {name: getattr(curses, name) for name in fakes}
+    for name, function in fakes.items():
+        setattr(curses, name, function)
+    try:
+        yield
+    finally:
+        for name, function in originals.items():
+            setattr(curses, name, function)
+
+
+def benchmarks(log_path: str, email: str) -> dict:
+    """Function returns {name: function to time} of hot paths."""
+    pattern = [email, "msgid="]
+    cases = {}
+
+    for backend in maillog.BACKENDS.available():
+        kind = maillog.log_kind(log_path)
+        if backend.can_search(pattern, kind != "plain", kind == "blocks"):
+            cases["grep[{}]".format(backend.name)] = lambda backend=backend: backend(log_path, pattern, as_list=True)
+
+    def run_read_logs():
+        # read_logs of interface drawn on :FakeWindow:, new interface opens log anew, so nothing is cached
+        from gather_send_mail_log import CliGraphInterface, conf_args_parser
+        with fake_curses():
+            program = CliGraphInterface(conf_args_parser(["-P", log_path, "--prefetch", "0", "--session", "",
+                                                          "--indexer_socket", ""]))
+            program.email_to_search = email
+            program.patterns_to_search_for = {"email": email}
+            try:
+                program.read_logs()
+            finally:
+                program.mail_log.close()
+    cases["read_logs"] = run_read_logs
+    return cases
+
+
+def rendering_benchmarks(rows: list, keystrokes=KEYSTROKES) -> dict:
+    """
+    Function returns {name: (function to time, number of keystrokes it makes)} of drawing of tables with :rows:
+    and warnings on :FakeWindow:. Functions must be called inside :fake_curses:.
+    """
+    # importing interface module initializes nothing, screen is created only by CliGraphInterface
+    from gather_send_mail_log import MovingOrganizer, Warnings
+    cases = {}
+    for count in rows:
+        texts = ["Jul 19 04:40:0{} kibr sm-mta[12713]: 06J1e42n0127{:02d}: to=<user{}@example.net>, delay=00:00:01"
+                 .format(num % 10, num % 100, num) + ", relay=mx.example.net. [10.0.0.1], stat=Sent" * (num % 3)
+                 for num in range(count)]
+
+        def run_refill(texts=texts):
+            MovingOrganizer(FakeWindow(), print_with_indent=True).refill_elements(texts)
+        cases["MovingOrganizer.refill_elements[{}]".format(count)] = (run_refill, 1)
+
+        organizer = MovingOrganizer(FakeWindow(), print_with_indent=True)
+        organizer.refill_elements(texts)
+        start = max(count // 2 - keystrokes // 2, 0)  # in the middle, as far from start, as possible
+
+        def run_draw(organizer=organizer, start=start):
+            organizer.select(start)
+            for _ in range(keystrokes):
+                organizer.draw_on_screen()
+        cases["MovingOrganizer.draw_on_screen[{}]".format(count)] = (run_draw, keystrokes)
+
+        def run_move_down(organizer=organizer, start=start):
+            organizer.select(start)
+            for _ in range(keystrokes):
+                organizer.move_down()  # pages are scrolled, when pointer gets to the bottom
+        cases["MovingOrganizer.move_down[{}]".format(count)] = (run_move_down, keystrokes)
+
+    def run_warnings():
+        screen = FakeWindow()
+        for num in range(keystrokes):
+            Warnings("Warning {} ".format(num) * 10, (20, 60), is_err=bool(num % 2)).show(screen)
+    cases["Warnings.show"] = (run_warnings, keystrokes)
+    return cases
+
+
+def check_limits(results: dict, max_keystroke: float, max_bytes: int, out=sys.stdout) -> list:
+    """Function print and returns names of rendering benchmarks, which are slower or take more memory than limits."""
+    failed = []
+    for name, result in results["results"].items():
+        if "per_keystroke" not in result:
+            continue
+        if result["per_keystroke"] > max_keystroke:
+            out.write("{}: {:.3f} ms per keystroke is more than {:.3f} ms\n".format(
+                name, result["per_keystroke"] * 1000, max_keystroke * 1000))
+            failed.append(name)
+        if result["peak_bytes"] > max_bytes:
+            out.write("{}: {} KB at peak is more than {} KB\n".format(
+                name, result["peak_bytes"] // 1024, max_bytes // 1024))
+            failed.append(name)
+    return failed
+
+
+def git_version() -> str:
+    """Function returns git commit of working tree, if it is a git repository."""
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or "unknown"
+    except OSError:
+        return "unknown"
+
+
+def compare(results: dict, old_results: dict, out=sys.stdout) -> float:
+    """Function print best times of both results and returns the largest slowdown."""
+    worst = 0.0
+    out.write("{:<45} {:>12} {:>12} {:>8}\n".format("benchmark", "old, ms", "new, ms", "ratio"))
+    for name, result in results["results"].items():
+        old = old_results["results"].get(name)
+        if not old:
+            out.write("{:<45} {:>12} {:>12.3f} {:>8}\n".format(name, "-", result["best"] * 1000, "-"))
+            continue
+        ratio = result["best"] / old["best"] if old["best"] else float("inf")
+        worst = max(worst, ratio)
+        out.write("{:<45} {:>12.3f} {:>12.3f} {:>8.2f}\n".format(name, old["best"] * 1000, result["best"] * 1000,
+                                                                 ratio))
+    return worst
+
+
+def main():
+    parser_arg = conf_args_parser()
+    rows = [int(count) for count in parser_arg.rows.split(",") if count]
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        log_path = parser_arg.log
+        if log_path is None:
+            log_path = os.path.join(temp_dir, "maillog" + ".gz" * (parser_arg.gzip or parser_arg.blocks))
+            with open(log_path, "wb") as out:
+                if parser_arg.gzip and not parser_arg.blocks:
+                    with gzip.GzipFile(fileobj=out, mode="wb", compresslevel=6) as compressed:
+                        generate_sendmail_log.generate(compressed, parser_arg.size)
+                else:
+                    generate_sendmail_log.generate(out, parser_arg.size)
+            if parser_arg.blocks:
+                os.rename(log_path, log_path + ".plain")
+                maillog.write_block_gzip(log_path + ".plain", log_path)
+                os.unlink(log_path + ".plain")
+
+        results = {"version": RESULTS_VERSION,
+                   "tree": git_version(),
+                   "date": datetime.datetime.now().isoformat(timespec="seconds"),
+                   "python": platform.python_version(),
+                   "platform": platform.platform(),
+                   "log": {"path": parser_arg.log, "bytes": os.path.getsize(log_path), "gzip": parser_arg.gzip,
+                           "blocks": parser_arg.blocks},
+                   "results": {}}
+        for name, function in benchmarks(log_path, parser_arg.email).items():
+            results["results"][name] = measure(function, parser_arg.repeat)
+            print("{:<45} {:>12.3f} ms".format(name, results["results"][name]["best"] * 1000))
+
+    with fake_curses():
+        for name, (function, calls) in rendering_benchmarks(rows).items():
+            result = results["results"][name] = measure(function, parser_arg.repeat, calls)
+            print("{:<45} {:>12.3f} ms {:>9.3f} ms/key {:>8} KB".format(
+                name, result["best"] * 1000, result["per_keystroke"] * 1000, result["peak_bytes"] // 1024))
+
+    if parser_arg.output:
+        with open(parser_arg.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if parser_arg.compare:
+        with open(parser_arg.compare) as file:
+            worst = compare(results, json.load(file))
+        if parser_arg.max_slowdown and worst > parser_arg.max_slowdown:
+            print("Slowdown {:.2f} is larger than allowed {:.2f}".format(worst, parser_arg.max_slowdown))
+            sys.exit(1)
+
+    if check_limits(results, parser_arg.max_keystroke_ms / 1000, parser_arg.max_render_kb * 1024):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
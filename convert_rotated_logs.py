@@ -0,0 +1,88 @@
+#!/usr/bin/python3
+"""
+Program converts gzip compressed rotated sendmail logs to block gzip files: lines are compressed by blocks
+into separate gzip members with their sizes in headers, so the files are searched by blocks in parallel
+processes and are still read by zcat, zgrep and other tools as usual.
+"""  # Example: ./convert_rotated_logs.py /var/log/maillog  (converts maillog.1.gz, maillog.2.gz, ...)
+
+import os
+import shutil
+import argparse
+import zlib
+
+from maillog import GZIP_BLOCK_SIZE, log_kind, rotated_log_set, write_block_gzip, open_log
+
+
+def conf_args_parser() -> argparse.Namespace:
+    """
+    Function config program cli interface.
+
+    Returns
+    -------
+    :return: argparse.Namespace
+        Namespace of program arguments
+    """
+    parser = argparse.ArgumentParser(description=__doc__, prog='convert_rotated_logs',
+                                     formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--version', action='version', version='%(prog)s 1.0')
+    parser.add_argument('--block_size', default=GZIP_BLOCK_SIZE, dest="block_size", type=int, metavar="BYTES",
+                        help='bytes of lines in one block (default {})'.format(GZIP_BLOCK_SIZE))
+    parser.add_argument('--level', default=6, dest="level", type=int, choices=range(1, 10), metavar="LEVEL",
+                        help='compression level 1-9 (default 6)')
+    parser.add_argument('--dry_run', '-n', default=False, dest="dry_run", action='store_true',
+                        help='only print files, which would be converted')
+    parser.add_argument('logs', nargs='+', metavar="LOG",
+                        help='logs, gzip compressed rotated files of which are converted (`maillog` means\n'
+                             '`maillog.1.gz`, `maillog-20200719.gz`...), or compressed files themselves')
+    return parser.parse_args()
+
+
+def log_crc(file_path: str) -> tuple:
+    """Function returns (crc32, size) of lines of log, to check that converted file has the same lines."""
+    crc, size = 0, 0
+    with open_log(file_path) as file:
+        for data in iter(lambda: file.read(1024 * 1024), b""):
+            crc = zlib.crc32(data, crc)
+            size += len(data)
+    return crc, size
+
+
+def convert(file_path: str, block_size=GZIP_BLOCK_SIZE, level=6) -> int:
+    """
+    Function replace gzip :file_path: with block gzip file of the same lines, keeping it`s owner, permissions
+    and times. Converted file is checked before it replaces original. Returns number of blocks.
+    """
+    temp_path = file_path + ".blocks.tmp"
+    try:
+        count = write_block_gzip(file_path, temp_path, block_size=block_size, level=level)
+        if log_crc(temp_path) != log_crc(file_path):
+            raise OSError("Converted file `{}` differs from original.".format(temp_path))
+        st = os.stat(file_path)
+        os.chown(temp_path, st.st_uid, st.st_gid)  # before mode is copied, as chown can drop setuid bits
+        shutil.copystat(file_path, temp_path)
+        os.replace(temp_path, file_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+    return count
+
+
+def main():
+    parser_arg = conf_args_parser()
+    files = []
+    for path in parser_arg.logs:
+        for file_path in ([path] if path.endswith(".gz") else rotated_log_set(path)):
+            if file_path not in files and log_kind(file_path) == "gzip":
+                files.append(file_path)  # plain files are not compressed, block files are converted already
+
+    for file_path in files:
+        if parser_arg.dry_run:
+            print(file_path)
+            continue
+        size = os.path.getsize(file_path)
+        count = convert(file_path, block_size=parser_arg.block_size, level=parser_arg.level)
+        print("{}: {} blocks, {} -> {} bytes".format(file_path, count, size, os.path.getsize(file_path)))
+
+
+if __name__ == '__main__':
+    main()
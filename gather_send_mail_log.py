@@ -7,27 +7,48 @@ then you choose letter of your interest and  get all sendmail actions with this
 import re
 import os
 import math
-import platform
+import bisect
+import unicodedata
+import collections
 import collections.abc
-import subprocess
-from io import TextIOWrapper
 import argparse
 import datetime
+import threading
+import time
+import sys
+import json
+import contextlib
+import cProfile
+import pstats
 
 import curses
 import curses.ascii
 import curses.textpad
 
+from maillog import (DEFAULT_INDEXER_SOCKET, BACKENDS, MailLog, Query, PhaseTimer, NULL_TIMER, LogTail,
+                     universal_if_file_exist, filter_lines, decode_line, batch_lookup, print_batch_report,
+                     rotated_log_set, parse_duration, find_in_archive, print_found, HostLog, parse_host_source,
+                     merge_hosts, trace_message, print_timeline, SpillList, EXPORT_FORMATS, export_transactions,
+                     DEFAULT_CACHE_DIR, file_stamp, TrigramIndex, TransactionSummary)
+from maillog_stats import (TrafficStats, latency_stats, latency_report, print_latency_report, dashboard_report,
+                           print_dashboard, distinct_stats, print_distinct_report, track_queue, STUCK_HEADER,
+                           stuck_row, print_stuck_report, AlertMonitor, alert_text, print_alert_changes)
+
 WARN_COLOR = 98
 ERROR_COLOR = 99
 PROG_BG_COLOR = 111
 ON_CURSOR_COLOR = 100
 DEFAULT_PATH_TO_SENDMAIL_LOG = './message.log'  # '/var/log/messages.log'     # TODO: REPLACE
+DASHBOARD_REFRESH_MS = 1000  # how often dashboard checks log for appended lines
+SESSION_VERSION = 1
+SESSION_IDS = 10000  # ids of id table kept in session file, to show them at once on next start
+WARM_UP_POLL_MS = 100  # how often interface checks, if background search of restored session finished
+ALERT_REFRESH_MS = 1000  # how often interface reads lines appended to log, to count them in alerts
 
 
-def conf_args_parser() -> argparse.Namespace:
+def conf_args_parser(args=None) -> argparse.Namespace:
     """
-    Function config program cli interface.
+    Function config program cli interface, :args: are parsed instead of sys.argv, if they are given.
 
     Returns
     -------
@@ -43,118 +64,185 @@ def conf_args_parser() -> argparse.Namespace:
     parser.add_argument('--version', action='version', version='%(prog)s 1.0')
     parser.add_argument('--path_to_log', '-P', default=default_path_to_sendmail_log, dest="path_to_log", nargs='?',
                         help='change default path to sendmail logs', action='store')
-    return parser.parse_args()
-
-
-def universal_grep(file: (TextIOWrapper, str), patterns: (str, list), as_list=False) -> (list, str):
+    parser.add_argument('--prefetch', default=5, dest="prefetch", type=int, metavar="K",
+                        help='load lines of K ids before and after the highlighted one in background (0 - off)')
+    parser.add_argument('--indexer_socket', default=DEFAULT_INDEXER_SOCKET, dest="indexer_socket", metavar="PATH",
+                        help='unix socket of sendmail_log_indexer.py daemon, used instead of reading logs\n'
+                             'when it is running (empty - never use it)', action='store')
+    parser.add_argument('--backend', default="auto", dest="backend", choices=["auto"] + BACKENDS.names,
+                        help='way to search logs, by default the fastest available one is chosen for every file\n'
+                             '(tools are checked and timed on first run, see ~/.cache/sendmail_log_reader)')
+    parser.add_argument('--session', default=os.path.join(DEFAULT_CACHE_DIR, "session.json"), dest="session",
+                        metavar="FILE", help='file to save session (log, email, date, query, ids, selected id) in\n'
+                                             'on exit and restore it from on start (empty - do not save)')
+    parser.add_argument('--memory_limit', default=SpillList.MAX_MEMORY // (1024 * 1024), dest="memory_limit",
+                        type=int, metavar="MB",
+                        help='results larger than MB megabytes are kept in temporary files, not in memory\n'
+                             '(default %(default)s)')
+    parser.add_argument('--summary', default=False, dest="summary", action='store_true',
+                        help='show transactions in log table by recipients: attempts, their times, the last\n'
+                             'status and delay (`s` switches it, Enter shows attempts of recipient)')
+    parser.add_argument('--batch', '-B', default=None, dest="batch", metavar="FILE",
+                        help='print transactions of all addresses listed in FILE (one per line)\n'
+                             'grouped by address and id, without interactive interface', action='store')
+    parser.add_argument('--find', default=None, dest="find", metavar="KEY",
+                        help='print lines of log and it`s rotated files with KEY (queue id, message id\n'
+                             'or address), reading only parts, which Bloom filters can not rule out,\n'
+                             'without interactive interface', action='store')
+    parser.add_argument('--host', default=[], dest="hosts", metavar="[NAME=]LOG", action='append',
+                        help='log of one more host (MX, submission, relay) with it`s rotated files, can be\n'
+                             'repeated; NAME is shown with it`s lines instead of syslog host')
+    parser.add_argument('--timeline', default=False, dest="timeline", action='store_true',
+                        help='print lines of log and logs of `--host` as one timeline with host in the\n'
+                             'first column (`--since`/`--until` limit time), without interactive interface')
+    parser.add_argument('--trace', default=None, dest="trace", metavar="MSGID",
+                        help='print transactions of message MSGID on all hosts (log and `--host` logs)\n'
+                             'as one timeline, without interactive interface', action='store')
+    parser.add_argument('--export', default=None, dest="export", metavar="FILE",
+                        help='write transactions of messages of `--email` (and `--query`) to FILE (`-` - stdout)\n'
+                             'in `--export_format`, without interactive interface', action='store')
+    parser.add_argument('--export_format', default="jsonl", dest="export_format", choices=EXPORT_FORMATS,
+                        help='format of export, also by F12 in interface: json object per transaction,\n'
+                             'csv row per line or lines grouped by id (default jsonl)')
+    parser.add_argument('--email', default=None, dest="email", metavar="ADDRESS",
+                        help='export messages of ADDRESS (part of it)', action='store')
+    parser.add_argument('--query', default=None, dest="query", metavar="QUERY",
+                        help='export messages with lines, which satisfy QUERY (as F5 in interface)',
+                        action='store')
+    parser.add_argument('--stats', default=False, dest="stats", action='store_true',
+                        help='print delivery latency percentiles by mailer, relay and recipient domain\n'
+                             'of log and it`s rotated files, without interactive interface')
+    parser.add_argument('--distinct', default=None, dest="distinct", nargs='?', const="", metavar="SENDER",
+                        help='print estimated numbers of distinct senders, recipients and message ids of log\n'
+                             'and it`s rotated files, and of SENDER (address or @domain) or of top senders,\n'
+                             'without interactive interface')
+    parser.add_argument('--error', default=0.01, dest="error", type=float,
+                        help='standard error of distinct counts (default 0.01 - 1%%)')
+    parser.add_argument('--stuck', default=False, dest="stuck", action='store_true',
+                        help='print messages of log and it`s rotated files, which were deferred and\n'
+                             'not delivered or bounced yet, the oldest first, without interactive interface')
+    parser.add_argument('--min_age', default="0", dest="min_age", type=parse_duration, metavar="DURATION",
+                        help='print only stuck messages older than DURATION ("00:30:00", "1+00:00:00")')
+    parser.add_argument('--dashboard', default=False, dest="dashboard", action='store_true',
+                        help='print numbers of deliveries by status, top senders, recipients, relays\n'
+                             'and deferring domains of log, without interactive interface')
+    parser.add_argument('--since', default=None, dest="since", metavar="TIME",
+                        help='count only lines since TIME in dashboard and timeline ("Jul 19", "Jul 19 04:00"),\n'
+                             'only files with lines since TIME in distinct counts')
+    parser.add_argument('--until', default=None, dest="until", metavar="TIME",
+                        help='print only lines until TIME in timeline, count only files with lines until TIME\n'
+                             'in distinct counts')
+    parser.add_argument('--follow', '-f', default=False, dest="follow", action='store_true',
+                        help='keep reading lines appended to log and print dashboard or alerts again,\n'
+                             'when they come')
+    parser.add_argument('--alerts', default=False, dest="alerts", action='store_true',
+                        help='print alerts, raised when share of deferred and bounced deliveries by relay or\n'
+                             'recipient domain in sliding window goes over RATE, and ended, without\n'
+                             'interactive interface; interface shows them for appended lines as banner')
+    parser.add_argument('--alert_window', default="00:10:00", dest="alert_window", type=parse_duration,
+                        metavar="DURATION", help='sliding window of alerts (default 00:10:00)')
+    parser.add_argument('--alert_rate', default=0.5, dest="alert_rate", type=float, metavar="RATE",
+                        help='share of deferred and bounced deliveries, over which alert is raised (default 0.5)')
+    parser.add_argument('--alert_min', default=20, dest="alert_min", type=int, metavar="N",
+                        help='raise alert only if there were at least N deliveries in window (default 20)')
+    parser.add_argument('--alert_exit', default=None, dest="alert_exit", type=int, metavar="STATUS",
+                        help='exit with STATUS, if alert is on after log is read, or as soon as alert is\n'
+                             'raised with --follow')
+    parser.add_argument('--profile', default=None, dest="profile", metavar="FILE",
+                        help='profile program and write cProfile report with timings of search phases\n'
+                             'to FILE on exit', action='store')
+    return parser.parse_args(args)
+
+
+def write_profile(path: str, profiler: cProfile.Profile, timer=NULL_TIMER):
+    """Function write report of :profiler: sorted by cumulative time and totals of :timer: phases to file :path:."""
+    with open(path, "w") as file:
+        file.write("Search phases\n")
+        timer.report(file)
+        file.write("\n")
+        pstats.Stats(profiler, stream=file).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(50)
+
+
+class IdPrefetcher:
     """
-    Function imitate linux grep, and returns list of lines from :file: that matches :pattern:
-
-    Parameters
-    This is a ops wrong word.
-    This is a ops wrong word.
-    ----------
-    :param file: TextIOWrapper(opened file) or str
-        File object or string where to search for :pattern:
-    :param patterns: str, list
-        Pattern is one or patterns separated by newline characters for grep to search for in :file:
-    :param as_list: bool
-        If is True, return list of strings that matches :pattern:, instead of gathering them in one str obj.
-
-    Returns
-    -------
-    :return: list or str
-        List of strings row or gathered in str obj, each line of which matches :pattern:
-    """
-
-    assert isinstance(file, (TextIOWrapper, str)), ValueError(
-        ":file: param must be str or link to opened file.")
-    assert isinstance(patterns, (str, list, tuple, set)), ValueError(":pattern: must be string.")
-
-    if isinstance(file, TextIOWrapper):
-        # it`s unnecessary to load all file in memory, it`s enough to be able to iter by lines
-        iterable_obj = file
-
-    else:
-        # split str object by liens, to be able to iter though it similar as though file
-        iterable_obj = re.split("\r?\n", file)
-
-    result = []
-    # if list of patterns
-    if not isinstance(patterns, str):
-        for line in iterable_obj:
-            if re.findall(patterns[0], line):
-                result.append(re.sub("\r?\n", "", line.strip(" ")))
-        if len(patterns) > 1:
-            for pattern in patterns[1:]:
-                result = (line for line in result if re.findall(pattern, line))
-    # it the only pattern
-    else:
-        for line in iterable_obj:
-            if re.findall(patterns, line):
-                result.append(re.sub("\r?\n", "", line.strip(" ")))
-
-    if not as_list:
-        # gathering list of strings to one string
-        result = os.linesep.join(result)
-
-    if isinstance(file, TextIOWrapper):
-        # Change the stream position to the start of stream
-        file.seek(0, 0)
-
-    return result
-
-
-def linux_zgrep(file, patterns: (list, str), as_list=False):
+    Class load lines of ids around highlighted one in background thread into bounded cache,
+    so moving along id table does not wait for log file reading.
     """
-    Function use linux zgrep, and returns list of lines from :file:(even if :file: is compessed) that matches :pattern:
-
-    Parameters
-    ----------
-    :param file: str
-        path to file or text in which to search for :pattern:
-    :param patterns: str, list
-        Pattern is one or patterns separated by newline characters for grep to search for in :file:
-    :param as_list: bool
-        If is True, return list of strings that matches :pattern:, instead of gathering them in one str obj.
 
-    Returns
-    -------
-    :return: list or str
-        List of strings row or gathered in str obj, each line of which matches :pattern:
+    def __init__(self, fetch, radius=5, cache_size=256):
         """
-    if isinstance(patterns, (list, tuple, set)):
-        pattern = "".join(("(?=.*{})".format(i) for i in patterns))
-    else:
-        pattern = "(?=.*{})".format(patterns)
-
-    out = subprocess.Popen(["zgrep", "-s", "-P", pattern, file],
-                           stdout=subprocess.PIPE,
-                           stderr=subprocess.DEVNULL)
-    std = [i.decode("utf-8") for i in out.communicate() if i]
-    res = ''.join(std)
-    if as_list:
-        res = res.split('\n')
-
-    return res
-
-
-def linux_if_file_exist(file_path: str):
-    """Function gives information if file at :file_path: exist."""
-    out = subprocess.Popen(["file", file_path],
-                           stdout=subprocess.PIPE)
-    std = "".join([i.decode("utf-8") for i in out.communicate() if i])
-    returncode = 1
-
-    if "(No such file or directory)" in std:
-        returncode = 0
-    return returncode
-
-
-def universal_if_file_exist(file_path: str):
-    """Function gives information if file at :file_path: exist."""
-    out = os.path.isfile(file_path)
-    return out
+        :param fetch: callable
+            Function, which takes list of ids and returns {id: lines} reading them in one pass.
+        :param radius: int
+            Number of ids before and after highlighted one to load.
+        """
+        self.radius = radius
+        self.__fetch = fetch
+        self.__cache = collections.OrderedDict()  # id - lines, least recently used first
+        self.__cache_size = max(cache_size, 2 * radius + 1)
+        self.__wanted = []  # ids to load, nearest to highlighted first
+        self.__epoch = 0  # changes when cached lines become invalid, e.g. log file was reread
+        self.__condition = threading.Condition()
+
+        self.__thread = threading.Thread(target=self.__work, name="id-prefetcher", daemon=True)
+        self.__thread.start()
+
+    def get(self, id_):
+        """Method returns cached lines of id or None."""
+        with self.__condition:
+            lines = self.__cache.get(id_)
+            if lines is not None:
+                self.__cache.move_to_end(id_)
+            return lines
+
+    def put(self, id_, lines):
+        """Method add lines of id to cache, dropping least recently used ones if it is full."""
+        with self.__condition:
+            self.__put(id_, lines)
+
+    def __put(self, id_, lines):
+        self.__cache[id_] = lines
+        self.__cache.move_to_end(id_)
+        while len(self.__cache) > self.__cache_size:
+            self.__cache.popitem(last=False)
+
+    def focus(self, ids: list, position: int):
+        """
+        Method set id at :position: of :ids: as highlighted one. Ids around it, which are not cached yet,
+        replace previously wanted ones, so lookups, which are not needed any more, are dropped.
+        """
+        if not self.radius:
+            return
+        around = sorted(range(max(position - self.radius, 0), min(position + self.radius + 1, len(ids))),
+                        key=lambda num: abs(num - position))
+        with self.__condition:
+            self.__wanted = [ids[num] for num in around if ids[num] not in self.__cache]
+            if self.__wanted:
+                self.__condition.notify()
+
+    def clear(self):
+        """Method forget cached and wanted ids, lookups in progress are discarded when finished."""
+        with self.__condition:
+            self.__cache.clear()
+            self.__wanted = []
+            self.__epoch += 1
+
+    def __work(self):
+        """Method of background thread, load all wanted ids in one pass at a time."""
+        while True:
+            with self.__condition:
+                while not self.__wanted:
+                    self.__condition.wait()
+                batch, self.__wanted = self.__wanted, []
+                epoch = self.__epoch
+            try:
+                result = self.__fetch(batch)
+            except Exception:  # file could be changed or removed meanwhile, it will be read on demand
+                continue
+            with self.__condition:
+                if epoch == self.__epoch:
+                    for id_, lines in result.items():
+                        self.__put(id_, lines)
 
 
 class Button:
@@ -175,7 +263,7 @@ class Button:
             curses.init_pair(color, color, bg_color)
         return color
 
-    def print_on(self, screen, is_bold=False):
+    def print_on(self, screen, is_bold=False, marked=""):
         """
         Method print given text on given coordinates, with given colors.
 
@@ -183,6 +271,8 @@ class Button:
         ----------
         :param screen: _CursesWindow
             Screen on which to print. By default self.stdscr.
+        :param marked: str
+            Lower case text, every occurrence of which in button text is shown reversed.
         """
         if is_bold:
             screen.attron(curses.color_pair(ON_CURSOR_COLOR))  # is on cursor
@@ -192,12 +282,33 @@ class Button:
             screen.addstr(*self.coordinates, self.text)
         except curses.error:
             pass
+        if marked:
+            self.__mark(screen, marked, ON_CURSOR_COLOR if is_bold else self.color)
 
         if is_bold:
             screen.attroff(curses.color_pair(ON_CURSOR_COLOR))  # is on cursor
         elif self.color != 0:
             screen.attroff(curses.color_pair(self.color))
 
+    def __mark(self, screen, marked: str, color: int):
+        """Method reverse cells of occurrences of :marked: in text, which may be wrapped at width of :screen:."""
+        width = screen.getmaxyx()[1]
+        text = self.text.lower()
+        start = text.find(marked)
+        while start >= 0:
+            cell = self.coordinates[1] + text_width(self.text[:start])
+            length = text_width(self.text[start:start + len(marked)])
+            while length > 0:
+                part = min(length, width - cell % width)
+                try:
+                    screen.chgat(self.coordinates[0] + cell // width, cell % width, part,
+                                 curses.color_pair(color) | curses.A_REVERSE)
+                except curses.error:  # below the screen
+                    return
+                cell += part
+                length -= part
+            start = text.find(marked, start + len(marked))
+
     def is_pressed(self, character_pressed=None):
         """Method check whether button was pressed, or clicked by mouse, if so, returns True."""
         return character_pressed and self.key == character_pressed
@@ -334,12 +445,58 @@ class Warnings:
             self.screen_to_del_on = None
 
 
+def text_width(text: str) -> int:
+    """Function returns number of screen cells :text: takes: tabs are expanded, wide characters take two cells."""
+    if text.isascii() and "\t" not in text:
+        return len(text)
+    width = 0
+    for char in text:
+        if char == "\t":
+            width += 8 - width % 8
+        elif unicodedata.combining(char):
+            continue
+        elif unicodedata.east_asian_width(char) in "WF":
+            width += 2
+        else:
+            width += 1
+    return width
+
+
+class LayoutCache:
+    """
+    Class keep numbers of screen lines, which texts take wrapped at width of screen, by (text, width).
+    The least recently used ones are evicted, when there are more than :size:.
+    """
+
+    def __init__(self, size=4096):
+        self.size = size
+        self.__heights = collections.OrderedDict()
+
+    def height(self, text: str, width: int) -> int:
+        key = (text, width)
+        height = self.__heights.get(key)
+        if height is None:
+            height = self.__heights[key] = max(math.ceil(text_width(text) / max(width, 1)), 1)
+            if len(self.__heights) > self.size:
+                self.__heights.popitem(last=False)
+        else:
+            self.__heights.move_to_end(key)
+        return height
+
+
 class MovingOrganizer:
-    """Class organize simple cursor moving """
+    """
+    Class organize simple cursor moving. Every element takes as many screen lines, as it`s text takes wrapped
+    at width of screen (see :LayoutCache:), layout is found only for elements on screen. Buttons are made only
+    for visible elements, when they are shown, so elements can be any long sequence (e.g. :SpillList: on disk).
+    Text can be searched in elements (see :find: and :jump:), with index built in background from the first search.
+    """
+    FOUND_LIMIT = 100  # found elements are counted up to it, while text is entered
 
     def __init__(self, screen, print_with_indent=False, field_actions=None):
         self.is_active = False
-        self._queue = []  # Buttons
+        self.elements = []  # texts of buttons
+        self.__buttons = {}  # number of element - it`s Button, only of visible elements
         self._pointer = 0
         self.__screen = screen
         self.__wind_height, self.__wind_width = self.__screen.getmaxyx()
@@ -347,66 +504,157 @@ class MovingOrganizer:
         self.first_visible = 0
         self.last_visible = 0
 
-        self.__indent = 0
         self.__print_with_indent = int(print_with_indent)
         self.__field_actions = field_actions
+        self.__layout = LayoutCache()
+
+        self.search_text = ""  # text marked in elements, it is kept, when elements are changed
+        self.__index = None  # TrigramIndex of elements, built in background from the first search in them
+
+    def __height(self, num: int) -> int:
+        """Method returns number of screen lines element :num: takes with indent after it."""
+        height = self.__layout.height(self.elements[num], self.__wind_width) + self.__print_with_indent
+        return min(height, self.__wind_height)
+
+    def __fill_from(self, first: int):
+        """Method make visible elements from :first: one, as many as fit on screen."""
+        self.first_visible = first
+        lines = 0
+        num = first
+        while num < len(self.elements):
+            height = self.__height(num)
+            if lines + height > self.__wind_height and num > first:
+                break
+            lines += height
+            num += 1
+        self.last_visible = num
+
+    def __fill_to(self, last: int):
+        """Method make visible element :last: at the bottom of screen, and as many elements before it as fit."""
+        lines = 0
+        first = last
+        while first >= 0:
+            height = self.__height(first)
+            if lines + height > self.__wind_height and first < last:
+                break
+            lines += height
+            first -= 1
+        self.__fill_from(first + 1)
 
     @property
     def __active_queue(self):
-        return self._queue[self.first_visible: self.last_visible]
+        for num in [num for num in self.__buttons if not self.first_visible <= num < self.last_visible]:
+            del self.__buttons[num]  # buttons, which were scrolled out
+        buttons = []
+        line_num = 0
+        for num in range(self.first_visible, self.last_visible):
+            button = self.__buttons.get(num)
+            if button is None:
+                button = self.__buttons[num] = Button(text=self.elements[num], coordinates=[0, 0],
+                                                      is_keyboard_reachable=True,
+                                                      button_action=self.__field_actions)
+            button.coordinates[0] = line_num
+            line_num += self.__height(num)
+            buttons.append(button)
+        return buttons
 
     @property
     def active_element(self):
         """Method returns active button object."""
-        if self.__active_queue:
-            return self.__active_queue[self._pointer]
+        active_queue = self.__active_queue
+        if active_queue:
+            return active_queue[self._pointer]
+
+    @property
+    def active_num(self) -> int:
+        """Number of active element."""
+        return self.first_visible + self._pointer
 
-    def refill_elements(self, elements: collections.abc.Iterable):
+    def refill_elements(self, elements: collections.abc.Sequence):
         """Method change current queue elements to given, and reset pointer."""
         self._pointer = 0
         self.__clear_queue()
-        self.__add_elements(elements)
-
-        self.first_visible = 0
-        self.last_visible = 0
-
-        if self.__indent != 0:
-            self.last_visible = self.__wind_height // self.__indent
-
-    def __add_elements(self, list_):
-        """Method add button objects to queue."""
-        line_num = 0
-        if list_:
-            self.__indent = max(map(lambda x: math.ceil(len(x) / self.__wind_width) + self.__print_with_indent, list_))
-
-        for field in list_:
-            self._queue.append(Button(text=field, coordinates=[line_num, 0],
-                                      is_keyboard_reachable=True, button_action=self.__field_actions))
+        self.elements = elements
+        if self.__index:
+            self.__index.stop()
+        self.__index = None
+        self.__fill_from(0)
+
+    def select(self, num: int):
+        """Method make element :num: active, scrolling to it."""
+        if not self.elements:
+            return
+        num = max(0, min(num, len(self.elements) - 1))
+        if not self.first_visible <= num < self.last_visible:
+            self.__fill_from(0)
+            if num >= self.last_visible:
+                self.__fill_to(num)
+        self._pointer = num - self.first_visible
+
+    def resize(self, screen):
+        """Method move elements to resized :screen:, only their layout is found anew, active element is kept."""
+        active = self.active_num
+        self.__screen = screen
+        self.__wind_height, self.__wind_width = self.__screen.getmaxyx()
+        self.__buttons = {}
+        self.__fill_from(self.first_visible)
+        self.select(active)
+
+    def start_search(self):
+        """Method start indexing elements in background, so they are searched fast, when text is entered."""
+        if self.__index is None:
+            self.__index = TrigramIndex(self.elements)
+        self.__index.start()
+
+    def __find(self, start: int, limit: int, backward=False) -> list:
+        if not self.search_text:
+            return []
+        self.start_search()
+        return self.__index.find(self.search_text, start, limit, backward)
+
+    def find(self, text: str) -> int:
+        """
+        Method mark :text: in elements, returns number of elements with it, but not more than :FOUND_LIMIT: + 1,
+        so only the first of them are looked for. Text shorter than :TrigramIndex.MIN_TEXT: is not marked.
+        Screen is redrawn by :jump:.
+        """
+        self.search_text = text if len(text) >= TrigramIndex.MIN_TEXT else ""
+        return len(self.__find(0, self.FOUND_LIMIT + 1))
 
-            if line_num < self.__wind_height - (self.__indent - 1):
-                line_num += self.__indent  # plus num of lines in field
+    def jump(self, forward=True, from_num=None):
+        """
+        Method make active the next (or previous, if not :forward:) element with search text after active one,
+        or from element :from_num: including it, going round at the end. Returns it`s number, None if there is no one.
+        """
+        if from_num is None:
+            from_num = self.active_num + 1 if forward else self.active_num - 1
+        found = self.__find(from_num, 1, backward=not forward) if 0 <= from_num < len(self.elements) else []
+        if not found:  # going round
+            found = self.__find(len(self.elements) - 1 if not forward else 0, 1, backward=not forward)
+        if not found:
+            return None
+        num = found[0]
+        self.select(num)
+        self.draw_on_screen()
+        return num
 
     def __clear_queue(self):
         """Method clear queue"""
-        self._queue = []
+        self.elements = []
+        self.__buttons = {}
 
     def move_up(self):
         """Method change active button to one, up in queue."""
-        # to do scrolling
         if (self.first_visible > 0) and (self._pointer == 0):
-
-            for button in self.__active_queue:
-                button.coordinates[0] = button.coordinates[0] + self.__indent
-
-            self.first_visible -= 1
-            self.last_visible -= 1
+            self.__fill_from(self.first_visible - 1)
 
             self.draw_on_screen()
 
         elif self._pointer > 0:
-            self.__active_queue[self._pointer].print_on(self.__screen, is_bold=False)
+            active_queue = self.__active_queue
+            active_queue[self._pointer].print_on(self.__screen, is_bold=False, marked=self.__marked)
             self._pointer -= 1
-            self.__active_queue[self._pointer].print_on(self.__screen, is_bold=True)
+            active_queue[self._pointer].print_on(self.__screen, is_bold=True, marked=self.__marked)
 
             self.__screen.refresh()
         else:
@@ -414,26 +662,28 @@ class MovingOrganizer:
 
     def move_down(self):
         """Method change active button to one, down in queue."""
-        # to do scrolling
-        if (self.last_visible < len(self._queue) - 1) and \
-                (self._pointer == len(self.__active_queue) - 1):
-            self.first_visible += 1
-            self.last_visible += 1
-
-            for button in self.__active_queue:
-                button.coordinates[0] = button.coordinates[0] - self.__indent
+        if (self.last_visible < len(self.elements)) and \
+                (self._pointer == self.last_visible - self.first_visible - 1):
+            # the next element is shown at the bottom, as many elements, as it needs lines, go up
+            self.__fill_to(self.last_visible)
+            self._pointer = self.last_visible - self.first_visible - 1
 
             self.draw_on_screen()
 
-        elif self._pointer < len(self.__active_queue) - 1:
-            self.__active_queue[self._pointer].print_on(self.__screen, is_bold=False)
+        elif self._pointer < self.last_visible - self.first_visible - 1:
+            active_queue = self.__active_queue
+            active_queue[self._pointer].print_on(self.__screen, is_bold=False, marked=self.__marked)
             self._pointer += 1
-            self.__active_queue[self._pointer].print_on(self.__screen, is_bold=True)
+            active_queue[self._pointer].print_on(self.__screen, is_bold=True, marked=self.__marked)
 
             self.__screen.refresh()
         else:
             return 1  # err sign
 
+    @property
+    def __marked(self) -> str:
+        return self.search_text.lower()
+
     def draw_on_screen(self):
         """Method draw menu on screen."""
         self.__screen.clear()
@@ -442,12 +692,12 @@ class MovingOrganizer:
             is_bold = False
             if num == self._pointer:
                 is_bold = True
-            button.print_on(self.__screen, is_bold=is_bold)
+            button.print_on(self.__screen, is_bold=is_bold, marked=self.__marked)
         self.__screen.refresh()
 
     def highlight(self, un_do=False):
         if self.active_element:
-            self.active_element.print_on(self.__screen, is_bold=(not un_do))
+            self.active_element.print_on(self.__screen, is_bold=(not un_do), marked=self.__marked)
         self.__screen.refresh()
 
 
@@ -457,23 +707,45 @@ class CliGraphInterface:
     then you choose letter of your interest and  get all sendmail actions with this letter.
     """
 
-    def __init__(self):
-        self.parser_arg = conf_args_parser()  # all arguments from cli execution
+    def __init__(self, parser_arg=None):
+        self.parser_arg = parser_arg or conf_args_parser()  # all arguments from cli execution
         self.path_to_log = self.parser_arg.path_to_log
-        if platform.platform().startswith("Linux"):
-            self.__grep = linux_zgrep
-            self.__file_checker = linux_if_file_exist
-        else:
-            self.__grep = universal_grep
-            self.__file_checker = universal_if_file_exist
+        # grep backend is chosen for every file and query, unless it was set explicitly
+        self.__grep = BACKENDS[self.parser_arg.backend] if self.parser_arg.backend != "auto" else None
+        self.__file_checker = universal_if_file_exist
         self.__continue_entering = ''
         self.email_to_search = ''
         self.date_to_search = ""
         self.__num_of_ids = 0
+        self.__all_ids = []  # ids in id table
+        self.__shown_id = None  # id, lines of which are in log table
+        self.__shown_lines = []  # lines of shown id, as they were read
+        self.__summarize = self.parser_arg.summary  # log table shows transaction by recipients
+        self.__summary = None  # (TransactionSummary, expanded keys, keys of rows) of shown id in summary view
+        self.__id_positions = {}  # id - it`s position in id table
         self.__active_id_num = 0
         self.max_email_length = 33
         self.first_table_width = 18
         self.patterns_to_search_for = {}  # type - pattern
+        self.query = None  # Query over parsed fields, checked additionally to patterns
+
+        # phases of searching and drawing are measured only when they are shown or profiled
+        self.__profiler = cProfile.Profile() if self.parser_arg.profile else None
+        self.timer = PhaseTimer() if self.__profiler else NULL_TIMER
+        self.show_timings = False
+
+        self.__dashboard = None  # (TrafficStats, LogTail) while dashboard is shown and followed
+        # (thread searching log in background, stamp of log in restored session, whether ids were cut in session)
+        self.__warm_up = None
+        self.__alerts = None  # (AlertMonitor, LogTail) of lines appended to log since it was opened
+        self.__next_alert_check = 0  # time.monotonic() of the next reading of appended lines
+
+        # log file, which keeps result set of the last scan, it asks indexer daemon first, if it is running
+        self.__mail_log = None
+
+        # lines of ids around highlighted one are loaded in background
+        self.__prefetcher = IdPrefetcher(self.__read_ids, radius=self.parser_arg.prefetch) \
+            if self.parser_arg.prefetch > 0 else None
 
         self.stdscr = curses.initscr()  # initialize curses screen
 
@@ -516,6 +788,22 @@ class CliGraphInterface:
         curses.cbreak()  # enter break mode where pressing Enter key
         self.stdscr.keypad(True)  # enable special Key values such as curses.KEY_LEFT etc
 
+        self.init_buttons()
+
+    @property
+    def mail_log(self):
+        """Log file being read, it is opened anew when path to log changes."""
+        if self.__mail_log is None or self.__mail_log.path != self.path_to_log:
+            if self.__mail_log is not None:
+                self.__mail_log.close()
+            # lines of ids are cached by prefetcher
+            self.__mail_log = MailLog(self.path_to_log, grep=self.__grep,
+                                      indexer_socket=self.parser_arg.indexer_socket, id_cache_size=0,
+                                      timer=self.timer)
+        return self.__mail_log
+
+    def init_buttons(self):
+        """Method create buttons to appear on screen and define their locations."""
         # buttons to appear on screen
         self.buttons = []
 
@@ -543,11 +831,23 @@ class CliGraphInterface:
                      Button(text="[ F3 Date ]", key=curses.KEY_F3, coordinates=[],
                             button_action=self.change_date_to_search),
                      Button(text="[ F4 Reread ]", key=curses.KEY_F4, coordinates=[],
-                            button_action=self.read_logs),
+                            button_action=self.reread_logs),
+                     Button(text="[ F5 Query ]", key=curses.KEY_F5, coordinates=[],
+                            button_action=self.change_query),
+                     Button(text="[ F6 Stats ]", key=curses.KEY_F6, coordinates=[],
+                            button_action=self.show_stats),
+                     Button(text="[ F7 Dashboard ]", key=curses.KEY_F7, coordinates=[],
+                            button_action=self.show_dashboard),
+                     Button(text="[ F8 Timings ]", key=curses.KEY_F8, coordinates=[],
+                            button_action=self.toggle_timings),
                      Button(text="[ F9 Select log file ]", key=curses.KEY_F9, coordinates=[],
                             button_action=self.change_log_loc),
                      Button(text="[ F10 Exit ]", key=curses.KEY_F10,
-                            coordinates=[], button_action=self.shut_down)]
+                            coordinates=[], button_action=self.shut_down),
+                     Button(text="[ F11 Stuck ]", key=curses.KEY_F11, coordinates=[],
+                            button_action=self.show_stuck),
+                     Button(text="[ F12 Export ]", key=curses.KEY_F12, coordinates=[],
+                            button_action=self.export)]
 
         # get F__ buttons location
         button_x_pos = 2
@@ -562,11 +862,6 @@ class CliGraphInterface:
         # add f_buttons to other
         self.buttons += f_buttons
 
-    @property
-    def __sys_path_to_log(self):
-        """Needs to differ windows and linux path."""
-        return self.path_to_log + ("$#universal_grep_path" * (not platform.platform().startswith("Linux")))
-
     def check_minimum_term_size(self):
         """Method check and shut down program if term size is too small."""
         # check minimum term size
@@ -675,16 +970,7 @@ class CliGraphInterface:
 
         self.check_minimum_term_size()
 
-        # make two tables working to
-        old_left_table_text = [button.text for button in self.left_table._queue]
-        old_right_table_text = [button.text for button in self.right_table._queue]
-        if self.right_table.is_active:
-            active_one = "right"
-        else:
-            active_one = "left"
-
-        del self.__left_window, self.__right_window, self.left_table, \
-            self.right_table, self.left_window, self.right_window
+        del self.__left_window, self.__right_window, self.left_window, self.right_window
 
         self.__left_window = curses.newwin(self.wind_height - 7, self.first_table_width - 3, 3, 2)
         self.left_window = self.__left_window.subwin(3, 2)
@@ -695,68 +981,17 @@ class CliGraphInterface:
         self.right_window = self.__right_window.subwin(3, self.first_table_width + 2)
         self.__right_window.bkgd(" ", curses.color_pair(PROG_BG_COLOR) | curses.A_BOLD)
 
-        # make moving organizers for right and left tables
-        self.left_table = MovingOrganizer(screen=self.left_window, field_actions=self.read_logs)
-        self.right_table = MovingOrganizer(screen=self.right_window, print_with_indent=True)
-
-        self.left_table.refill_elements(old_left_table_text)
-        self.right_table.refill_elements(old_right_table_text)
-
-        if active_one == "left":
-            self.active_table = self.left_table
-        else:
-            self.active_table = self.right_table
-
-        # buttons to appear on screen
-        self.buttons = []
-
-        # get log location button
-        log_button = Button(text="Log file: ".format(self.path_to_log),
-                            coordinates=[self.wind_height - 3, 2])
-        self.buttons.append(log_button)
-        self.len_of_log_loc_intro = len(log_button.text) + 2
-
-        # add email location button
-        email_button = Button(text="Email: ",
-                              coordinates=[1, 2])
-        self.buttons.append(email_button)
-        self.len_of_email_intro = len(email_button.text) + 2  # 2 -len of indent
-
-        # add date location button
-        date_button = Button(text="Date: ",
-                             coordinates=[1, self.len_of_email_intro + self.max_email_length + 2])
-        self.buttons.append(date_button)
-        self.len_of_date_intro = len(date_button.text) + 2  # 2 -len of indent
-
-        # init F__ buttons
-        f_buttons = [Button(text="[ F2 Email ]", key=curses.KEY_F2, coordinates=[],
-                            button_action=self.change_email),
-                     Button(text="[ F3 Date ]", key=curses.KEY_F3, coordinates=[],
-                            button_action=self.change_date_to_search),
-                     Button(text="[ F4 Reread ]", key=curses.KEY_F4, coordinates=[],
-                            button_action=self.read_logs),
-                     Button(text="[ F9 Select log file ]", key=curses.KEY_F9, coordinates=[],
-                            button_action=self.change_log_loc),
-                     Button(text="[ F10 Exit ]", key=curses.KEY_F10,
-                            coordinates=[], button_action=self.shut_down)]
+        # tables keep their elements and active ones, only layout is found anew
+        self.left_table.resize(self.left_window)
+        self.right_table.resize(self.right_window)
 
-        # get F__ buttons location
-        button_x_pos = 2
-        button_y_pos = self.wind_height - 2
-        for button in f_buttons:
-            button.coordinates = [button_y_pos, button_x_pos]
-            button_x_pos += len(button.text) + 2
-            if button_x_pos // self.wind_width:
-                button_y_pos -= 1
-                button_x_pos = 1
-
-        # add f_buttons to other
-        self.buttons += f_buttons
+        self.init_buttons()
 
         # draw
         self.stdscr.clear()
 
         self.make_frame()
+        self.draw_alerts()
         self.draw_buttons()
         if not continue_entering == "file_path":
             self.change_log_loc(exact_file=old_path_to_log)
@@ -764,6 +999,8 @@ class CliGraphInterface:
             self.change_date_to_search(exact_date=old_date)
         if not continue_entering == "email":
             self.change_email(exact_mail=old_mail)
+        self.print_query()
+        self.print_timings()
 
         self.right_table.draw_on_screen()
         self.left_table.draw_on_screen()
@@ -958,6 +1195,413 @@ class CliGraphInterface:
 
         self.stdscr.refresh()
 
+    def change_query(self):
+        """Method create window to enter query over log fields, e.g. `to=@gmail.com AND stat=Deferred`."""
+        to_save = True  # define whether to save entrance of textbox
+        to_shut_down = False  # define whether to close program just after text box finishing
+        err_to_show = None  # if something goes wrong
+        win_width = min(self.wind_width - 4, 80)
+        coordinates = [self.wind_height // 2 - 1, (self.wind_width - win_width) // 2]
+
+        def validator(ch):
+            """Function change some entered characters to another."""
+            if ch == curses.KEY_RESIZE:
+                self.resize_terminal(continue_entering="query")
+                ch = curses.ascii.ESC
+
+            if ch == curses.ascii.ESC:
+                ch = curses.ascii.BEL  # Enter
+                nonlocal to_save
+                to_save = False
+
+            if ch == curses.KEY_F10:
+                nonlocal to_shut_down
+                to_shut_down = True
+                ch = curses.ascii.BEL  # Enter
+
+            return ch
+
+        # create framed window
+        win = curses.newwin(3, win_width, *coordinates)
+        win.box()
+        win.addstr(0, 2, " Query (field=value AND ...) ")
+        sub = win.subwin(1, win_width - 2, coordinates[0] + 1, coordinates[1] + 1)
+        if self.query:
+            sub.addstr(0, 0, self.query.text[:win_width - 3])
+
+        curses.cbreak()
+        curses.curs_set(1)
+        win.keypad(True)
+
+        # create text pad to write in
+        tb = curses.textpad.Textbox(sub)
+        win.refresh()
+        tb.edit(validate=validator)
+
+        if to_shut_down:
+            self.shut_down()
+
+        text = tb.gather().strip()
+
+        # cleaning entered window
+        del win, sub
+        self.stdscr.touchwin()
+        self.stdscr.refresh()
+        curses.curs_set(0)
+
+        if to_save:
+            try:
+                query = Query(text) if text else None
+            except ValueError as err:
+                err_to_show = Warnings(str(err), (self.wind_height // 2, self.wind_width // 2), is_err=True)
+            else:
+                old_query = self.query
+                self.query = query
+                if self.read_logs():  # return err sign
+                    self.query = old_query
+
+                # fill by first output
+                button = self.active_table.active_element
+                if button:
+                    button.act(button.text)
+
+        self.print_query()
+
+        # redraw existing id and log messages tables
+        self.draw_tables()
+
+        # show err if some occurs
+        if err_to_show:
+            err_to_show.show(self.stdscr)
+            # redraw tables
+            self.draw_tables()
+
+        self.stdscr.refresh()
+
+    def print_query(self):
+        """Method print current query next to date, shortened to fit the screen."""
+        x_start = self.len_of_email_intro + self.max_email_length + self.len_of_date_intro + 10
+        width = self.wind_width - x_start - 2
+        if width < 10:
+            return
+        text = "Query: {}".format(self.query.text if self.query else "-")
+        if len(text) > width:
+            text = text[:width - 3] + "..."
+        self.print_on_screen((1, x_start), text.ljust(width), curses.COLOR_CYAN)
+
+    def search_in_table(self):
+        """
+        Method create window to enter text to find in active table. Matches are found and marked while text is
+        entered, the first one from highlighted element becomes active; `n`/`N` jump to next/previous one.
+        """
+        table = self.active_table
+        table.start_search()
+        start = table.active_num
+        old_text = table.search_text
+        text = ""
+        found = 0  # number of elements with text, up to :FOUND_LIMIT: + 1
+        to_save = True  # define whether to keep found text or return to previous one
+        to_shut_down = False  # define whether to close program just after text box finishing
+        win_width = min(self.wind_width - 4, 60)
+        coordinates = [self.wind_height - 7, self.wind_width - win_width - 2]
+
+        # create framed window
+        win = curses.newwin(3, win_width, *coordinates)
+        sub = win.subwin(1, win_width - 2, coordinates[0] + 1, coordinates[1] + 1)
+
+        def show_found(count=None):
+            """Function redraw frame of window with number of found elements."""
+            win.box()
+            if count is None:
+                title = " Find (n/N next/previous) "
+            elif len(text) < TrigramIndex.MIN_TEXT:
+                title = " Find: enter {} characters ".format(TrigramIndex.MIN_TEXT)
+            elif count > table.FOUND_LIMIT:
+                title = " Find: {}+ found ".format(table.FOUND_LIMIT)
+            else:
+                title = " Find: {} found ".format(count)
+            win.addstr(0, 2, title[:win_width - 4])
+            win.touchwin()
+            win.refresh()
+
+        def validator(ch):
+            """Function find text entered so far, and change some entered characters to another."""
+            nonlocal text, found, to_save, to_shut_down
+            if ch == curses.KEY_RESIZE:
+                self.resize_terminal(continue_entering="search")
+                ch = curses.ascii.BEL  # Enter
+
+            if ch == curses.ascii.ESC:
+                ch = curses.ascii.BEL  # Enter
+                to_save = False
+
+            if ch == curses.KEY_F10:
+                to_shut_down = True
+                ch = curses.ascii.BEL  # Enter
+
+            if ch == curses.ascii.DEL:
+                ch = curses.KEY_BACKSPACE
+            if ch in (curses.KEY_BACKSPACE, curses.ascii.BS) or curses.ascii.isprint(ch):
+                text = text + chr(ch) if curses.ascii.isprint(ch) else text[:-1]  # text is edited at it`s end
+                found = table.find(text)
+                if not found or table.jump(from_num=start) is None:
+                    table.select(start)
+                    table.draw_on_screen()
+                show_found(found if text else None)
+            return ch
+
+        show_found()
+        curses.cbreak()
+        curses.curs_set(1)
+        win.keypad(True)
+
+        # create text pad to write in
+        tb = curses.textpad.Textbox(sub)
+        sub.refresh()
+        tb.edit(validate=validator)
+
+        if to_shut_down:
+            self.shut_down()
+
+        # cleaning entered window
+        del win, sub
+        self.stdscr.touchwin()
+        self.stdscr.refresh()
+        curses.curs_set(0)
+
+        if not to_save:
+            table.find(old_text)
+            table.select(start)
+        elif table.search_text and not found:
+            Warnings("`{}` was not found.".format(text), (self.wind_height // 2, self.wind_width // 2),
+                     is_err=True).show(self.stdscr)
+        self.left_table.draw_on_screen()
+        self.right_table.draw_on_screen()
+        if table is self.left_table:
+            self.right_table.highlight(un_do=True)
+            if table.active_num != start:
+                self.__active_id_num = -table.active_num
+                button = table.active_element
+                button.act(button.text)
+        self.draw_tables()
+
+    def jump_to_found(self, forward=True):
+        """Method make active the next (or previous, if not :forward:) element of active table with found text."""
+        table = self.active_table
+        if not table.search_text:
+            return
+        if table.jump(forward) is None:
+            Warnings("`{}` was not found.".format(table.search_text), (self.wind_height // 2, self.wind_width // 2),
+                     is_err=True).show(self.stdscr)
+            self.draw_tables()
+            return
+        if table is self.left_table:
+            self.__active_id_num = -table.active_num
+            button = table.active_element
+            button.act(button.text)
+
+    def show_stats(self):
+        """Method show delivery latency of log and it`s rotated files in log table."""
+        self.stop_dashboard()
+        self.__shown_id = None  # log table shows report
+        self.__summary = None
+        note = Warnings("Counting delivery latency...", (self.wind_height // 2, self.wind_width // 2))
+        note.show(self.stdscr, leave_on_screen=True)
+        try:
+            with self.timer.phase("stats"):
+                report = latency_report(latency_stats(rotated_log_set(self.path_to_log)))
+        except OSError as err:
+            note.hide()
+            Warnings("Can`t read logs: {}".format(err), (self.wind_height // 2, self.wind_width // 2),
+                     is_err=True).show(self.stdscr)
+            self.draw_tables()
+            return
+        note.hide()
+
+        self.right_table.refill_elements(report)
+        self.right_table.draw_on_screen()
+        self.draw_tables()
+
+    def show_stuck(self):
+        """
+        Method show ids of messages, which were deferred and are not delivered yet, the oldest first, in id table,
+        and their recipients waiting for delivery in log table.
+        """
+        self.stop_dashboard()
+        self.__shown_id = None  # log table shows report
+        self.__summary = None
+        note = Warnings("Following messages through logs...", (self.wind_height // 2, self.wind_width // 2))
+        note.show(self.stdscr, leave_on_screen=True)
+        try:
+            # states are streamed from tracker, only ids and rows of report are kept, they can be on disk
+            ids, rows = SpillList(), SpillList([STUCK_HEADER])
+            with self.timer.phase("stuck"), track_queue(rotated_log_set(self.path_to_log)) as tracker:
+                for state in tracker.open_messages():
+                    ids.append(state["qid"])
+                    rows.append(stuck_row(state))
+        except OSError as err:
+            note.hide()
+            Warnings("Can`t read logs: {}".format(err), (self.wind_height // 2, self.wind_width // 2),
+                     is_err=True).show(self.stdscr)
+            self.draw_tables()
+            return
+        note.hide()
+        if not ids:
+            Warnings("No stuck messages were found.", (self.wind_height // 2, self.wind_width // 2)).show(self.stdscr)
+            self.draw_tables()
+            return
+
+        if self.__prefetcher:
+            self.__prefetcher.clear()
+        self.__all_ids = ids
+        self.__id_positions = {found: num for num, found in enumerate(self.__all_ids)}
+        self.__num_of_ids = len(self.__all_ids) - 1
+        self.__active_id_num = 0
+        self.left_table.refill_elements(self.__all_ids)
+        self.left_table.draw_on_screen()
+        self.right_table.refill_elements(rows)
+        self.right_table.draw_on_screen()
+        self.draw_tables()
+        self.refresh_ids_ord_number()
+
+    def export(self):
+        """
+        Method write transactions to file in current directory in format of `--export_format`: the one shown in log
+        table, if it is active, otherwise all ids of id table. Transactions are read and written one by one.
+        """
+        self.stop_dashboard()
+        ids = [self.__shown_id] if self.active_table is self.right_table and self.__shown_id else self.__all_ids
+        if not ids:
+            Warnings("Nothing to export.", (self.wind_height // 2, self.wind_width // 2),
+                     is_err=True).show(self.stdscr)
+            self.draw_tables()
+            return
+        export_format = self.parser_arg.export_format
+        path = "export-{}.{}".format(datetime.datetime.now().strftime("%Y%m%d-%H%M%S"),
+                                     "txt" if export_format == "report" else export_format)
+        note = Warnings("Exporting {} transactions...".format(len(ids)), (self.wind_height // 2, self.wind_width // 2))
+        note.show(self.stdscr, leave_on_screen=True)
+        try:
+            with self.timer.phase("export"), open(path, "w", newline="") as out:
+                count = export_transactions(self.mail_log.transactions(ids), out, export_format)
+        except OSError as err:
+            note.hide()
+            Warnings("Can`t export: {}".format(err), (self.wind_height // 2, self.wind_width // 2),
+                     is_err=True).show(self.stdscr)
+            self.draw_tables()
+            return
+        note.hide()
+        Warnings("{} transactions were written to `{}`.".format(count, os.path.abspath(path)),
+                 (self.wind_height // 2, self.wind_width // 2)).show(self.stdscr)
+        self.draw_tables()
+
+    def show_dashboard(self):
+        """
+        Method show traffic dashboard of log (since date to search, if it is set) in log table.
+        It is refreshed with lines appended to log, until other information is shown.
+        """
+        self.__shown_id = None  # log table shows report
+        self.__summary = None
+        try:
+            stats = TrafficStats(since=self.patterns_to_search_for.get("date"))
+        except ValueError:
+            stats = TrafficStats()  # date with wildcards
+        tail = LogTail(self.path_to_log)
+        with self.timer.phase("dashboard"):
+            for lines in tail.read():
+                stats.add_lines(lines)
+        self.__dashboard = (stats, tail)
+        self.stdscr.timeout(DASHBOARD_REFRESH_MS)
+        self.draw_dashboard()
+
+    def refresh_dashboard(self):
+        """Method count lines appended to log since previous refresh, and redraw dashboard."""
+        stats, tail = self.__dashboard
+        chunks = tail.read()
+        if tail.restarted:  # log was rotated, it`s counted anew
+            self.show_dashboard()
+            return
+        appended = False
+        with self.timer.phase("dashboard"):
+            for lines in chunks:
+                stats.add_lines(lines)
+                appended = True
+        if appended:
+            self.draw_dashboard()
+
+    def draw_dashboard(self):
+        """Method show dashboard in log table."""
+        self.right_table.refill_elements(dashboard_report(self.__dashboard[0]))
+        self.right_table.draw_on_screen()
+        self.draw_tables()
+
+    def stop_dashboard(self):
+        """Method stop refreshing dashboard."""
+        if self.__dashboard:
+            self.__dashboard = None
+            self.stdscr.timeout(WARM_UP_POLL_MS if self.__warm_up else ALERT_REFRESH_MS)
+
+    def check_alerts(self):
+        """
+        Method count deliveries appended to log since previous check in alert counters (see :AlertMonitor:),
+        and redraw banner of alerts, if they changed. Counters start anew, when log is changed or rotated.
+        """
+        self.__next_alert_check = time.monotonic() + ALERT_REFRESH_MS / 1000
+        args = self.parser_arg
+        if self.__alerts is None or self.__alerts[1].path != self.path_to_log:
+            self.__alerts = (AlertMonitor(args.alert_window, args.alert_rate, args.alert_min),
+                             LogTail(self.path_to_log, from_end=True))
+            self.draw_alerts()
+        monitor, tail = self.__alerts
+        chunks = tail.read()
+        if tail.restarted:
+            monitor = AlertMonitor(args.alert_window, args.alert_rate, args.alert_min)
+            self.__alerts = (monitor, tail)
+        appended = False
+        with self.timer.phase("alerts"):
+            for lines in chunks:
+                monitor.add_lines(lines)
+                appended = True
+        if monitor.pop_changes() or (appended and monitor.alerts) or tail.restarted:
+            self.draw_alerts()
+
+    def draw_alerts(self):
+        """Method show the worst alert (the highest share of failed deliveries) in banner above log table."""
+        x_start = self.first_table_width + 6
+        width = self.wind_width - x_start - 2
+        if width < 10:
+            return
+        alerts = self.__alerts[0].worst() if self.__alerts else []
+        text = ""
+        if alerts:
+            kind, name, counter = alerts[0]
+            text = " ALERT {} {}".format(alert_text(kind, name, counter.failed, counter.events, counter.window),
+                                         "(+{} more) ".format(len(alerts) - 1) if len(alerts) > 1 else "")[:width]
+            try:
+                self.stdscr.addstr(2, x_start, text, curses.color_pair(ERROR_COLOR) | curses.A_BOLD)
+            except curses.error:
+                pass
+        self.print_on_screen((2, x_start + len(text)), "-" * (width - len(text)))
+
+    def toggle_timings(self):
+        """Method show or hide line with timings of the last search, phases are measured only while it is shown."""
+        self.show_timings = not self.show_timings
+        if not self.__profiler:
+            self.timer = PhaseTimer() if self.show_timings else NULL_TIMER
+            if self.__mail_log is not None:
+                self.__mail_log.timer = self.timer
+        self.print_timings()
+
+    def print_timings(self):
+        """Method print timings and counters of the last search above the tables, or clear them if they are hidden."""
+        width = self.wind_width - 4
+        text = ""
+        if self.show_timings:
+            text = self.timer.summary() or "Timings are shown after the next search"
+            if len(text) > width:
+                text = text[:width - 3] + "..."
+        self.print_on_screen((0, 2), text.ljust(width), curses.COLOR_CYAN)
+
     def change_log_loc(self, by_def=False, exact_file=None):
         """Method create window to enter log file location to search where."""
 
@@ -1129,11 +1773,15 @@ class CliGraphInterface:
                 self.draw_tables()
                 return
 
+        self.save_session()
         curses.nocbreak()
         curses.curs_set(1)
         self.stdscr.keypad(False)
         curses.echo()
         curses.endwin()
+        if self.__profiler:
+            self.__profiler.disable()
+            write_profile(self.parser_arg.profile, self.__profiler, self.timer)
         if message:
             print(message)
         exit(state)
@@ -1187,20 +1835,225 @@ class CliGraphInterface:
         self.right_window.refresh()
         self.left_window.refresh()
 
+    def reread_logs(self):
+        """Method forget previous result set and read logs from file again."""
+        self.mail_log.forget()
+        return self.read_logs()
+
+    def __read_ids(self, ids):
+        """Method read lines of all :ids: in one pass, is used by prefetcher in background."""
+        mail_log = self.__mail_log
+        return mail_log.read_ids(ids) if mail_log is not None else {}
+
+    def search_patterns(self) -> list:
+        """Method returns patterns to grep log by: email, date and prefilter of query."""
+        patterns = list(self.patterns_to_search_for.values())
+        if self.query:
+            return patterns + self.query.prefilter or ['']
+        return patterns or ['msgid=']
+
+    def save_session(self):
+        """Method save log, search and ids on screen to session file, to restore them on next start."""
+        path = self.parser_arg.session
+        if not path or not self.email_to_search:
+            return
+        shown = self.__shown_id
+        session = {"version": SESSION_VERSION,
+                   "path_to_log": self.path_to_log,
+                   "indexer_socket": self.parser_arg.indexer_socket,
+                   "email": self.email_to_search,
+                   "date": self.patterns_to_search_for.get("date"),
+                   "query": self.query.text if self.query else None,
+                   "stamp": file_stamp(self.path_to_log),
+                   "ids": list(self.__all_ids[:SESSION_IDS]),
+                   "truncated": len(self.__all_ids) > SESSION_IDS,
+                   "selected_id": shown,
+                   "lines": [decode_line(line) for line in self.__shown_lines] if shown else []}
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            # session has addresses of mail, only user can read it
+            with open(os.open(path + ".tmp", os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as file:
+                json.dump(session, file)
+            os.replace(path + ".tmp", path)
+        except OSError:
+            pass  # session is just not saved
+
+    def restore_session(self) -> bool:
+        """
+        Method show ids and lines saved by :save_session: for the same log at once, and search log in background,
+        so results are refreshed from warm result set, when log was changed since or not all ids were saved.
+        Returns False if there is nothing to restore.
+        """
+        try:
+            with open(self.parser_arg.session) as file:
+                session = json.load(file)
+        except (OSError, ValueError, TypeError):
+            return False
+        if session.get("version") != SESSION_VERSION or session.get("path_to_log") != self.path_to_log or \
+                not session.get("email") or not session.get("ids"):
+            return False
+        try:
+            self.query = Query(session["query"]) if session.get("query") else None
+        except ValueError:
+            return False
+        if self.parser_arg.indexer_socket == DEFAULT_INDEXER_SOCKET and session.get("indexer_socket"):
+            self.parser_arg.indexer_socket = session["indexer_socket"]
+
+        self.email_to_search = session["email"]
+        self.patterns_to_search_for = {"email": session["email"]}
+        if session.get("date"):
+            self.patterns_to_search_for["date"] = session["date"]
+            self.change_date_to_search(exact_date=session["date"])
+        self.print_query()
+        self.print_on_screen((1, self.len_of_email_intro), self.email_to_search.ljust(self.max_email_length - 1, "_"),
+                             curses.COLOR_CYAN)
+        self.show_ids(session["ids"], session.get("selected_id"), session.get("lines") or [])
+
+        stamp = session.get("stamp")
+        patterns = self.search_patterns()
+        mail_log = self.mail_log
+        thread = threading.Thread(target=mail_log.search, args=(patterns,), name="session-warm-up", daemon=True)
+        self.__warm_up = (thread, stamp, session.get("truncated", len(session["ids"]) >= SESSION_IDS))
+        thread.start()
+        self.stdscr.timeout(WARM_UP_POLL_MS)
+        return True
+
+    def finish_warm_up(self):
+        """
+        Method show results of background search of restored session, if log changed since it was saved,
+        or only the first ids were saved.
+        """
+        thread, stamp, truncated = self.__warm_up
+        self.__warm_up = None
+        self.stdscr.timeout(DASHBOARD_REFRESH_MS if self.__dashboard else ALERT_REFRESH_MS)
+        current = file_stamp(self.path_to_log)
+        if current is not None and list(current) == stamp and not truncated:
+            return  # restored ids are up to date
+        selected = self.__shown_id
+        if self.read_logs():  # return err sign
+            return
+        if selected in self.__id_positions:
+            self.show_ids(self.__all_ids, selected)
+
+    def show_ids(self, ids: collections.abc.Sequence, selected=None, lines=None):
+        """Method show :ids: in id table, with :selected: one highlighted, and it`s :lines: (or read ones)."""
+        if self.__prefetcher:
+            self.__prefetcher.clear()
+        self.__all_ids = ids
+        self.__id_positions = {found: num for num, found in enumerate(ids)}
+        self.__num_of_ids = len(ids) - 1
+        position = self.__id_positions.get(selected, 0)
+        self.__active_id_num = -position
+        self.left_table.refill_elements(ids)
+        self.left_table.select(position)
+        self.left_table.draw_on_screen()
+        if lines and ids[position] == selected:
+            self.__shown_id = ids[position]
+            self.right_table.refill_elements(self.transaction_rows(lines))
+            self.right_table.draw_on_screen()
+            self.right_table.highlight(un_do=True)
+            self.refresh_ids_ord_number()
+        else:
+            self.read_logs(ids[position])
+        self.draw_tables()
+
+    def transaction_rows(self, lines: collections.abc.Iterable) -> list:
+        """
+        Method returns rows of log table of shown transaction: decoded :lines:, or rows of it`s recipients and other
+        lines in summary view (see :TransactionSummary:). New lines are read once: the loop, which keeps them in
+        :SpillList: (long transactions are on disk), decodes them or feeds summary, attempts are read back from it.
+        """
+        summary = TransactionSummary() if self.__summarize else None
+        texts = []
+        if lines is not self.__shown_lines:
+            self.__shown_lines = SpillList()
+            for line in lines:
+                self.__shown_lines.append(line)
+                if summary is None:
+                    texts.append(decode_line(line))
+                else:
+                    summary.add_line(line)
+        elif summary is None:
+            texts = [decode_line(line) for line in lines]
+        else:
+            summary.add_lines(lines)
+        if summary is None:
+            self.__summary = None
+            return texts
+        texts, keys = summary.rows(self.__shown_lines)
+        self.__summary = (summary, set(), keys)
+        return texts
+
+    def toggle_summary(self):
+        """Method switch log table between lines of shown transaction and summary of them by recipients."""
+        self.__summarize = not self.__summarize
+        if not self.__shown_id:
+            return
+        self.right_table.refill_elements(self.transaction_rows(self.__shown_lines))
+        self.right_table.draw_on_screen()
+        if self.active_table is not self.right_table:
+            self.right_table.highlight(un_do=True)
+        self.draw_tables()
+
+    def toggle_attempts(self):
+        """Method show lines of attempts of recipient, which is active in summary view of log table, or hide them."""
+        if not self.__summary:
+            return
+        summary, expanded, keys = self.__summary
+        num = self.right_table.active_num
+        key = keys[num] if num < len(keys) else None
+        if key is None:
+            return
+        expanded ^= {key}
+        texts, keys = summary.rows(self.__shown_lines, expanded)
+        self.__summary = (summary, expanded, keys)
+        self.right_table.refill_elements(texts)
+        self.right_table.select(keys.index(key))  # row of recipient
+        self.right_table.draw_on_screen()
+        self.draw_tables()
+
     def read_logs(self, id_=None):
         """Method read logs and give messages sorted by date, by id and mail."""
-        grep, file = self.__grep, self.__sys_path_to_log
-        # for windows grep
-        if file.endswith("$#universal_grep_path"):
-            file = open(self.path_to_log)
-
+        self.stop_dashboard()
+        timer = self.timer
+        timer.start_round()
         # if only by one id
         if id_:
-            text = grep(file, [id_], as_list=True)
+            with timer.phase("read id"):
+                text = self.__prefetcher.get(id_) if self.__prefetcher else None
+                if text is None:
+                    text = self.mail_log.grep([id_])
+                    if self.__prefetcher:
+                        self.__prefetcher.put(id_, text)
         else:
-            all_ids = list(
-                set(re.findall(r": (\w+):", grep(file, list(self.patterns_to_search_for.values()) + ['msgid=']))))
+            if self.__prefetcher:
+                self.__prefetcher.clear()
+            if self.__warm_up:
+                self.__warm_up[0].join()  # the same search may be running in background
+            if self.query:
+                # grep only lines, which could satisfy query, and check query on them in one pass
+                lines = self.mail_log.search(self.search_patterns())
+                with timer.phase("match"):
+                    matched = SpillList(line for line in lines if self.query.match(line))
+            else:
+                lines = self.mail_log.search(self.search_patterns())
+                with timer.phase("match"):
+                    matched = filter_lines(lines, ['msgid='])
+            with timer.phase("ids"):
+                # ids in order of first appearance, matched lines are joined by parts, they can be on disk;
+                # every seen id is remembered, so lines of one message can be anywhere in log
+                all_ids = SpillList()
+                seen = set()
+                for start in range(0, len(matched), SpillList.ITER_LINES):
+                    for found in re.findall(rb": (\w+):", b"\n".join(matched[start:start + SpillList.ITER_LINES])):
+                        if found not in seen:
+                            seen.add(found)
+                            all_ids.append(found.decode())
+            timer.count("lines matched", len(matched))
+            timer.count("ids found", len(all_ids))
             if not all_ids:  # empty id list
+                if self.show_timings:
+                    self.print_timings()
                 err_to_show = Warnings("No information was found.", (self.wind_height // 2, self.wind_width // 2),
                                        is_err=True)
                 err_to_show.show(self.stdscr)
@@ -1208,39 +2061,67 @@ class CliGraphInterface:
                 self.right_table.draw_on_screen()
                 return 1  # err sign
 
-            text = grep(file, list(self.patterns_to_search_for.values()) + all_ids[:1], as_list=True)
+            with timer.phase("ids"):
+                text = filter_lines(lines, all_ids[:1])
             self.__num_of_ids = len(all_ids) - 1
             self.__active_id_num = 0
 
-        # for windows grep
-        if isinstance(file, TextIOWrapper):
-            file.close()
-
+        self.__shown_id = id_ or all_ids[0]
         if not id_:
-            self.left_table.refill_elements(all_ids)
-            self.left_table.draw_on_screen()
-
-        self.right_table.refill_elements(text)
-        self.right_table.draw_on_screen()
-        self.right_table.highlight(un_do=True)
+            self.__all_ids = all_ids
+            self.__id_positions = {found: num for num, found in enumerate(all_ids)}
+            with timer.phase("refill"):
+                self.left_table.refill_elements(all_ids)
+            with timer.phase("draw"):
+                self.left_table.draw_on_screen()
+        elif self.__prefetcher and id_ in self.__id_positions:
+            self.__prefetcher.focus(self.__all_ids, self.__id_positions[id_])
+
+        # only lines to be shown are decoded
+        with timer.phase("decode"):
+            text = self.transaction_rows(text)
+        with timer.phase("refill"):
+            self.right_table.refill_elements(text)
+        with timer.phase("draw"):
+            self.right_table.draw_on_screen()
+            self.right_table.highlight(un_do=True)
 
         self.refresh_ids_ord_number()
+        if self.show_timings:
+            self.print_timings()
 
     def run(self):
         """Blocking method, handle program in working state."""
         try:
+            if self.__profiler:
+                self.__profiler.enable()
             # init starting program settings
             self.make_frame()
             self.draw_buttons()
             self.change_log_loc(by_def=True)
             self.change_date_to_search(by_def=True)
-            self.change_email(possible_to_cancel=False)
+            self.print_query()
+            self.stdscr.refresh()
+            self.stdscr.timeout(ALERT_REFRESH_MS)  # appended lines are counted in alerts
+            self.check_alerts()
+            if not self.restore_session():
+                self.change_email(possible_to_cancel=False)
 
             # update screen
             self.draw_tables()
             # main loop
             while True:
                 ch = self.stdscr.getch()
+                if self.__warm_up and not self.__warm_up[0].is_alive():
+                    self.finish_warm_up()
+                if time.monotonic() >= self.__next_alert_check:
+                    self.check_alerts()
+                if ch == -1 and self.__dashboard:  # no key was pressed until dashboard refresh
+                    self.refresh_dashboard()
+                    continue
+                if ch == -1:
+                    continue
+
                 for button in self.buttons:
 
                     if button.is_pressed(character_pressed=ch):
@@ -1269,6 +2150,18 @@ class CliGraphInterface:
                         if button:
                             button.act(button.text)
 
+                if ch == ord("/"):
+                    self.search_in_table()
+
+                if ch in (ord("n"), ord("N")):
+                    self.jump_to_found(forward=(ch == ord("n")))
+
+                if ch == ord("s"):
+                    self.toggle_summary()
+
+                if ch in (curses.KEY_ENTER, 10, 13) and self.active_table is self.right_table:
+                    self.toggle_attempts()
+
                 if ch == 9:  # TAB
                     self.active_table.is_active = False
 
@@ -1285,8 +2178,116 @@ class CliGraphInterface:
             self.shut_down(1)
 
 
+def follow_dashboard(path: str, since=None, follow=False):
+    """Function print dashboard of log at :path:, and if :follow:, print it again whenever lines are appended."""
+    stats = TrafficStats(since=since)
+    tail = LogTail(path)
+    for lines in tail.read():
+        stats.add_lines(lines)
+    print_dashboard(stats)
+    try:
+        while follow:
+            time.sleep(DASHBOARD_REFRESH_MS / 1000)
+            chunks = tail.read()
+            if tail.restarted:
+                stats = TrafficStats(since=since)
+            appended = False
+            for lines in chunks:
+                stats.add_lines(lines)
+                appended = True
+            if appended:
+                print("-" * 80)
+                print_dashboard(stats)
+    except KeyboardInterrupt:
+        pass
+
+
+def follow_alerts(path: str, monitor: AlertMonitor, follow=False, exit_status=None):
+    """
+    Function print alerts of log at :path:, and if :follow:, alerts of lines appended to it. Returns :exit_status:,
+    if it is set and alert is on after log is read, or when alert is raised while following.
+    """
+    tail = LogTail(path)
+    for lines in tail.read():
+        monitor.add_lines(lines)
+    print_alert_changes(monitor)
+    if exit_status is not None and monitor.alerts:
+        return exit_status
+    try:
+        while follow:
+            time.sleep(DASHBOARD_REFRESH_MS / 1000)
+            chunks = tail.read()
+            if tail.restarted:
+                monitor = AlertMonitor(monitor.window, monitor.baseline, monitor.min_events)
+            for lines in chunks:
+                monitor.add_lines(lines)
+            print_alert_changes(monitor)
+            sys.stdout.flush()
+            if exit_status is not None and monitor.alerts:
+                return exit_status
+    except KeyboardInterrupt:
+        pass
+    return None
+
+
+def run_headless(parser_arg: argparse.Namespace):
+    """
+    Function print report asked by :parser_arg: (batch lookup, export, stats) without interactive interface.
+    Returns exit status or None.
+    """
+    status = None
+    profiler = cProfile.Profile() if parser_arg.profile else None
+    timer = PhaseTimer() if profiler else NULL_TIMER  # phases are reported with profile
+    if profiler:
+        profiler.enable()
+    if parser_arg.batch:
+        with open(parser_arg.batch) as file:
+            print_batch_report(batch_lookup(parser_arg.path_to_log, file, timer=timer))
+    if parser_arg.export:
+        with MailLog(parser_arg.path_to_log, indexer_socket=parser_arg.indexer_socket, timer=timer) as log, \
+                (open(parser_arg.export, "w", newline="") if parser_arg.export != "-" else
+                 contextlib.nullcontext(sys.stdout)) as out:
+            export_transactions(log.query(email=parser_arg.email, since=parser_arg.since, until=parser_arg.until,
+                                          query=parser_arg.query), out, parser_arg.export_format)
+    if parser_arg.find:
+        print_found(find_in_archive(rotated_log_set(parser_arg.path_to_log), parser_arg.find), parser_arg.find)
+    if parser_arg.timeline or parser_arg.trace:
+        host_logs = [HostLog(parser_arg.path_to_log)] + [HostLog(path, host) for host, path in
+                                                         map(parse_host_source, parser_arg.hosts)]
+        if parser_arg.timeline:
+            print_timeline(merge_hosts(host_logs, since=parser_arg.since, until=parser_arg.until))
+        if parser_arg.trace:
+            print_timeline(trace_message(host_logs, parser_arg.trace))
+    if parser_arg.stats:
+        print_latency_report(latency_stats(rotated_log_set(parser_arg.path_to_log)))
+    if parser_arg.distinct is not None:
+        print_distinct_report(distinct_stats(rotated_log_set(parser_arg.path_to_log), error=parser_arg.error,
+                                             since=parser_arg.since, until=parser_arg.until),
+                              whose=parser_arg.distinct or None)
+    if parser_arg.stuck:
+        with track_queue(rotated_log_set(parser_arg.path_to_log)) as tracker:
+            print_stuck_report(tracker.open_messages(min_age=parser_arg.min_age))
+    if parser_arg.dashboard:
+        follow_dashboard(parser_arg.path_to_log, since=parser_arg.since, follow=parser_arg.follow)
+    if parser_arg.alerts:
+        status = follow_alerts(parser_arg.path_to_log, AlertMonitor(parser_arg.alert_window, parser_arg.alert_rate,
+                                                                    parser_arg.alert_min),
+                               follow=parser_arg.follow, exit_status=parser_arg.alert_exit)
+    if profiler:
+        profiler.disable()
+        write_profile(parser_arg.profile, profiler, timer)
+    return status
+
+
 def main():
-    program = CliGraphInterface()
+    parser_arg = conf_args_parser()
+    SpillList.MAX_MEMORY = parser_arg.memory_limit * 1024 * 1024
+    if parser_arg.batch or parser_arg.export or parser_arg.find or parser_arg.timeline or parser_arg.trace or \
+            parser_arg.stats or parser_arg.dashboard or parser_arg.alerts or parser_arg.stuck or \
+            parser_arg.distinct is not None:
+        sys.exit(run_headless(parser_arg))
+
+    program = CliGraphInterface(parser_arg)
     program.run()
 
 
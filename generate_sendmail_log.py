@@ -0,0 +1,254 @@
+#!/usr/bin/python3
+"""
+Program generates synthetic sendmail log of given size (plain or compressed with gzip) to test and benchmark on.
+Log has local submissions relayed to MTA, inbound and outbound messages, multi-recipient messages,
+deferrals with retries, bounces, connection noise, and few senders and recipients make most of the mail.
+"""  # Generation is deterministic for given seed.
+
+import os
+import sys
+import gzip
+import heapq
+import random
+import argparse
+import datetime
+import itertools
+
+# characters sendmail uses to encode time in queue ids
+BASE60 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwx"
+SIZE_SUFFIXES = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+LOCAL_DOMAIN = "mail.example.net"
+REMOTE_DOMAINS = ["gmail.com", "ukr.net", "example.org", "kdd.ua", "globusbank.com.ua", "s1.ua", "yahoo.com",
+                  "outlook.com", "mail.ru", "i.ua", "meta.ua", "corp.example.com"]
+DEFER_REASONS = ["451 4.7.1 Try again later", "421 4.7.0 Temporary System Problem. Try again later",
+                 "451-4.3.0 Multiple destination domains per transaction is unsupported.  Please",
+                 "Connection timed out with mx.{domain}."]
+BOUNCE_REASONS = [("5.1.1", "User unknown"), ("5.2.2", "Mailbox full"),
+                  ("5.7.1", "Service unavailable"), ("5.0.0", "Service unavailable")]
+
+
+def parse_size(text: str) -> int:
+    """Function convert size like `50G`, `1M` or `4096` to number of bytes."""
+    text = text.strip().upper().rstrip("B")
+    suffix = text[-1] if text and text[-1] in SIZE_SUFFIXES else ""
+    return int(float(text[:len(text) - len(suffix)]) * SIZE_SUFFIXES[suffix])
+
+
+def conf_args_parser() -> argparse.Namespace:
+    """
+    Function config program cli interface.
+
+    Returns
+    -------
+    :return: argparse.Namespace
+        Namespace of program arguments
+    """
+    parser = argparse.ArgumentParser(description=__doc__, prog='generate_sendmail_log',
+                                     formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--version', action='version', version='%(prog)s 1.0')
+    parser.add_argument('--size', '-s', default="1M", dest="size", type=parse_size,
+                        help='size of uncompressed log, e.g. 1M, 500M, 50G (default 1M)')
+    parser.add_argument('--output', '-o', default="-", dest="output",
+                        help='file to write log to, `-` - standard output (default)')
+    parser.add_argument('--gzip', '-z', default=False, dest="gzip", action='store_true',
+                        help='compress log with gzip')
+    parser.add_argument('--seed', default=0, dest="seed", type=int, help='seed of random generator')
+    parser.add_argument('--host', default="mail", dest="host", help='host name in log lines')
+    parser.add_argument('--start', default="2020-07-19T04:00:00", dest="start", type=datetime.datetime.fromisoformat,
+                        help='time of the first line (default 2020-07-19T04:00:00)')
+    parser.add_argument('--rate', default=2.0, dest="rate", type=float,
+                        help='average number of messages per minute')
+    return parser.parse_args()
+
+
+class SkewedChoice:
+    """Class choose items from pool, so that item number k is chosen with probability ~ 1 / (k + 1) ** skew."""
+
+    def __init__(self, pool: list, rnd: random.Random, skew=1.1):
+        self.pool = pool
+        self.__random = rnd
+        self.__cum_weights = list(itertools.accumulate(1 / (num + 1) ** skew for num in range(len(pool))))
+
+    def __call__(self, k=1) -> list:
+        return self.__random.choices(self.pool, cum_weights=self.__cum_weights, k=k)
+
+
+class LogGenerator:
+    """Class generate lines of sendmail log in order of time."""
+
+    def __init__(self, seed=0, host="mail", start=datetime.datetime(2020, 7, 19, 4), rate=2.0):
+        self.__random = random.Random(seed)
+        self.host = host
+        self.now = start
+        self.rate = rate
+        self.__pid = itertools.cycle(range(1000, 32768))
+        self.__seq = itertools.count()
+        self.__pending = []  # (time, order, line) of lines of messages to be written later
+        self.__order = itertools.count()
+
+        rnd = self.__random
+        local_users = ["user{}".format(num) for num in range(1, 301)]
+        self.local_user = SkewedChoice(local_users, rnd)
+        self.local_address = SkewedChoice(["{}@{}".format(user, LOCAL_DOMAIN) for user in local_users], rnd)
+        self.remote_address = SkewedChoice(
+            ["{}{}@{}".format(rnd.choice(["info", "a.", "o.", "sales", "noreply", "m.", "k."]), num,
+                              REMOTE_DOMAINS[int(rnd.paretovariate(1.3)) % len(REMOTE_DOMAINS)])
+             for num in range(5000)], rnd)
+        self.remote_ip = SkewedChoice(["{}.{}.{}.{}".format(rnd.randint(2, 223), rnd.randint(0, 255),
+                                                            rnd.randint(0, 255), rnd.randint(1, 254))
+                                       for _ in range(2000)], rnd, skew=0.8)
+
+    def __queue_id(self, moment: datetime.datetime, pid: int) -> str:
+        """Method build queue id as sendmail does: encoded time, sequence number and pid."""
+        seq = next(self.__seq)
+        return "{}{}{}{}{}{}{}{}{:06d}".format(
+            BASE60[(moment.year - 1900) % 60], BASE60[moment.month - 1], BASE60[moment.day], BASE60[moment.hour],
+            BASE60[moment.minute], BASE60[moment.second], BASE60[seq // 60 % 60], BASE60[seq % 60], pid % 1000000)
+
+    def __schedule(self, moment: datetime.datetime, program: str, pid: int, message: str):
+        line = "{} {} {}[{}]: {}\n".format(moment.strftime("%b %d %H:%M:%S"), self.host, program, pid, message)
+        heapq.heappush(self.__pending, (moment, next(self.__order), line))
+
+    @staticmethod
+    def __delay(start: datetime.datetime, end: datetime.datetime) -> str:
+        seconds = int((end - start).total_seconds())
+        days, seconds = divmod(seconds, 86400)
+        text = "{:02d}:{:02d}:{:02d}".format(seconds // 3600, seconds // 60 % 60, seconds % 60)
+        return "{}+{}".format(days, text) if days else text
+
+    def __deliver(self, qid, pid, start, moment, recipients, size, mailer="esmtp"):
+        """Method schedule delivery attempts of one recipient group: deferrals, then success or bounce."""
+        rnd = self.__random
+        domain = recipients[0].split("@")[-1]
+        relay = "mx.{}. [{}]".format(domain, self.remote_ip()[0]) if mailer == "esmtp" else None
+        to = ",".join("<{}>".format(address) for address in recipients)
+
+        fate = rnd.random()
+        deferrals = 1 + int(rnd.expovariate(0.4)) if fate < 0.06 else 0
+        bounced = fate < 0.015 or 0.06 <= fate < 0.1
+
+        for attempt in range(deferrals + 1):
+            pid_ = next(self.__pid)
+            done = moment + datetime.timedelta(seconds=rnd.randint(0, 3))
+            fields = ["to={}".format(to), "delay={}".format(self.__delay(start, done)),
+                      "xdelay={}".format(self.__delay(moment, done)), "mailer={}".format(mailer),
+                      "pri={}".format(30000 + size + attempt * 90000)]
+            if relay:
+                fields.append("relay={}".format(relay))
+
+            if attempt < deferrals:
+                fields += ["dsn=4.{}.{}".format(rnd.choice([0, 3, 4, 7]), rnd.choice([0, 1, 2])),
+                           "stat=Deferred: {}".format(rnd.choice(DEFER_REASONS).format(domain=domain))]
+            elif bounced:
+                code, reason = rnd.choice(BOUNCE_REASONS)
+                fields += ["dsn={}".format(code), "stat={}".format(reason)]
+            else:
+                fields += ["dsn=2.0.0", "stat=Sent (Ok: queued as {:X})".format(rnd.getrandbits(40))]
+            self.__schedule(done, "sm-mta", pid_, "{}: {}".format(qid, ", ".join(fields)))
+
+            if attempt == deferrals and bounced:
+                # bounce message back to sender
+                self.__schedule(done, "sm-mta", pid_, "{}: {}: DSN: {}".format(
+                    self.__queue_id(done, pid_), qid, fields[-1][len("stat="):]))
+            moment = done + datetime.timedelta(minutes=rnd.choice([5, 10, 15, 30, 60]) * (attempt + 1))
+
+    def __message(self):
+        """Method schedule all lines of one message, arriving at current time."""
+        rnd = self.__random
+        start = self.now
+        size = int(rnd.lognormvariate(8.5, 1.5)) + 300
+        kind = rnd.random()
+
+        if kind < 0.1:  # connection without message
+            pid = next(self.__pid)
+            self.__schedule(start, "sm-mta", pid, "{}: [{}] did not issue MAIL/EXPN/VRFY/ETRN during connection to MTA"
+                            .format(self.__queue_id(start, pid), self.remote_ip()[0]))
+            return
+
+        recipients = list(dict.fromkeys(self.remote_address(k=1 + int(rnd.expovariate(1.5)))))
+        if kind < 0.55:  # local submission, relayed by sendmail to sm-mta, then delivered out
+            user = self.local_user()[0]
+            pid, mta_pid = next(self.__pid), next(self.__pid)
+            qid = self.__queue_id(start, pid)
+            relayed = start + datetime.timedelta(seconds=rnd.randint(1, 6))
+            mta_qid = self.__queue_id(relayed, mta_pid)
+            msgid = "<{}.{}@{}>".format(start.strftime("%Y%m%d%H%M"), qid, LOCAL_DOMAIN)
+            self.__schedule(start, "sendmail", pid,
+                            "{}: from={}, size={}, class=0, nrcpts={}, msgid={}, relay={}@localhost".format(
+                                qid, user, size, len(recipients), msgid, user))
+            self.__schedule(relayed, "sm-mta", mta_pid,
+                            "{}: from=<{}@{}>, size={}, class=0, nrcpts={}, msgid={}, proto=ESMTP, daemon=MTA, "
+                            "relay=localhost [127.0.0.1]".format(mta_qid, user, LOCAL_DOMAIN, size + 260,
+                                                                 len(recipients), msgid))
+            self.__schedule(relayed, "sendmail", pid,
+                            "{}: to={}, ctladdr={} (1003/100), delay={}, xdelay={}, mailer=relay, pri={}, "
+                            "relay=[127.0.0.1] [127.0.0.1], dsn=2.0.0, stat=Sent ({} Message accepted for delivery)"
+                            .format(qid, ",".join(recipients), user, self.__delay(start, relayed),
+                                    self.__delay(start, relayed), 30000 + size, mta_qid))
+            qid, start, size = mta_qid, relayed, size + 260
+        else:  # inbound message from internet to local users
+            sender = self.remote_address()[0]
+            recipients = list(dict.fromkeys(self.local_address(k=len(recipients))))
+            pid = next(self.__pid)
+            qid = self.__queue_id(start, pid)
+            self.__schedule(start, "sm-mta", pid,
+                            "{}: from=<{}>, size={}, class=0, nrcpts={}, msgid=<{:x}@{}>, proto=ESMTP, daemon=MTA, "
+                            "relay=mail.{} [{}]".format(qid, sender, size, len(recipients), rnd.getrandbits(64),
+                                                        sender.split("@")[-1], sender.split("@")[-1],
+                                                        self.remote_ip()[0]))
+            for address in recipients:
+                self.__deliver(qid, pid, start, start + datetime.timedelta(seconds=rnd.randint(0, 2)), [address],
+                               size, mailer="local")
+            return
+
+        # outbound recipients are grouped by domain, as sendmail does
+        by_domain = {}
+        for address in recipients:
+            by_domain.setdefault(address.split("@")[-1], []).append(address)
+        moment = start + datetime.timedelta(seconds=rnd.randint(1, 4))
+        for group in by_domain.values():
+            self.__deliver(qid, pid, start, moment, group, size)
+
+    def lines(self):
+        """Method returns endless iterator of log lines (str) in order of time."""
+        while True:
+            self.__message()
+            self.now += datetime.timedelta(seconds=self.__random.expovariate(self.rate / 60))
+            while self.__pending and self.__pending[0][0] <= self.now:
+                yield heapq.heappop(self.__pending)[2]
+
+
+def generate(out, size: int, **kwargs) -> int:
+    """Function write lines of :LogGenerator: to binary stream :out: until :size: bytes are written."""
+    written = 0
+    for line in LogGenerator(**kwargs).lines():
+        data = line.encode()
+        out.write(data)
+        written += len(data)
+        if written >= size:
+            return written
+
+
+def main():
+    parser_arg = conf_args_parser()
+    kwargs = dict(seed=parser_arg.seed, host=parser_arg.host, start=parser_arg.start, rate=parser_arg.rate)
+    if parser_arg.output == "-":
+        out = sys.stdout.buffer
+    else:
+        out = open(parser_arg.output, "wb")
+    try:
+        if parser_arg.gzip:
+            with gzip.GzipFile(fileobj=out, mode="wb", compresslevel=6,
+                               filename=os.path.basename(parser_arg.output.rstrip("-"))) as compressed:
+                generate(compressed, parser_arg.size, **kwargs)
+        else:
+            generate(out, parser_arg.size, **kwargs)
+    except BrokenPipeError:  # output is piped to `head` or alike
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,2213 @@
+"""
+Library to search sendmail logs (plain or compressed with gzip) without interactive interface:
+
+    with MailLog('/var/log/maillog') as log:
+        for transaction in log.query(email='sergey@mail.kibr.net', since='Jul 19', until='Jul 20'):
+            print(transaction.id, transaction.sender, transaction.recipients)
+
+Lines are searched as bytes, and decoded only when asked.
+"""  # Module does not import curses, it is used by cli interface, indexer daemon and other tools.
+
+import re
+import os
+import collections
+import collections.abc
+import subprocess
+import io
+import datetime
+import gzip
+import sys
+import json
+import socket
+import tempfile
+import threading
+import time
+import contextlib
+import math
+import shutil
+import mmap
+import hashlib
+import base64
+import heapq
+import struct
+import zlib
+import concurrent.futures
+import array
+import bisect
+import csv
+
+# one indexer daemon serves sessions of all users of host, it`s directory can be changed only by root or it`s group
+DEFAULT_INDEXER_SOCKET = "/run/sendmail_log_indexer/sendmail_log_indexer.sock"
+# directory to keep results of calibration and other data computed once per machine or file
+CACHE_VERSION = 1  # version of format of cached results, results of other versions are computed anew
+DEFAULT_CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+                                 "sendmail_log_reader")
+DEFAULT_BLOCK_SIZE = 16 * 1024 * 1024  # bytes of plain log file covered by one Bloom filter
+GZIP_BLOCK_SIZE = 1024 * 1024  # bytes of lines compressed into one member of block gzip file
+GZIP_BLOCK_FIELD = b"SL"  # id of gzip extra subfield with sizes of member (see :write_block_gzip:)
+# patterns of only plain characters and `.`(any character), substring of such pattern is matched by less strict query
+SIMPLE_PATTERN = re.compile(r"[\w@.\-<>=:, ]*")
+# "Jul 19 04:40:04 kibr sendmail[12711]: 06J1e4G4012711: from=sergey, size=17080, ..."
+LOG_LINE = re.compile(r"^(?P<time>\w{3} +\d+ \d\d:\d\d:\d\d) (?P<host>\S+) "
+                      r"(?P<program>[^\s\[:]+)(?:\[(?P<pid>\d+)\])?: (?:(?P<qid>\w+): )?(?P<message>.*?)\r?$")
+LOG_FIELD = re.compile(r"(?:^|, )(\w+)=(.*?)(?=, \w+=|$)")
+LOG_LINE_BYTES = re.compile(LOG_LINE.pattern.encode())
+LOG_FIELD_BYTES = re.compile(LOG_FIELD.pattern.encode())
+MONTHS = {name: num for num, name in enumerate(
+    ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'), start=1)}
+
+
+class SpillList(collections.abc.Sequence):
+    """
+    Class of list of lines (bytes or str), which is kept in memory while lines take less than :MAX_MEMORY:
+    bytes, then is moved to temporary file with array of offsets of lines, so results of any size
+    take little memory. Lines are read back by index, slice or in order (by big reads), as from list.
+    """
+    MAX_MEMORY = 64 * 1024 * 1024
+    ITER_LINES = 4096  # lines read from file at once, when list is iterated
+
+    def __init__(self, lines=(), max_memory=None, spool_dir=None):
+        self.max_memory = self.MAX_MEMORY if max_memory is None else max_memory
+        self.__spool_dir = spool_dir
+        self.__lines = []  # lines in memory, before list is moved to file
+        self.__size = 0
+        self.__file = None
+        self.__offsets = None  # start of every line in file, and end of the last one
+        self.__is_str = None
+        self.__lock = threading.Lock()  # lines may be read in background thread (see :TrigramIndex:)
+        self.extend(lines)
+
+    def __repr__(self):
+        return "SpillList({} lines{})".format(len(self), ", spilled" if self.spilled else "")
+
+    @property
+    def spilled(self) -> bool:
+        """True if lines are kept in file."""
+        return self.__file is not None
+
+    def __spill(self):
+        self.__file = tempfile.TemporaryFile(dir=self.__spool_dir)
+        self.__offsets = array.array("Q", [0])
+        lines, self.__lines = self.__lines, []
+        for line in lines:
+            self.append(line)
+
+    def append(self, line: (bytes, str)):
+        if self.__is_str is None:
+            self.__is_str = isinstance(line, str)
+        if self.__file is None:
+            self.__lines.append(line)
+            self.__size += len(line) + 50  # with size of object itself
+            if self.__size > self.max_memory:
+                self.__spill()
+            return
+        data = line.encode("utf-8", "surrogateescape") if self.__is_str else line
+        self.__file.seek(self.__offsets[-1])
+        self.__file.write(data)
+        self.__offsets.append(self.__offsets[-1] + len(data))
+
+    def extend(self, lines: collections.abc.Iterable):
+        for line in lines:
+            self.append(line)
+
+    def __len__(self):
+        return len(self.__offsets) - 1 if self.__file is not None else len(self.__lines)
+
+    def __read(self, start: int, stop: int) -> list:
+        """Method read lines from :start: to :stop: from file with one read."""
+        if start >= stop:
+            return []
+        offsets = self.__offsets
+        with self.__lock:
+            self.__file.seek(offsets[start])
+            data = self.__file.read(offsets[stop] - offsets[start])
+        base = offsets[start]
+        lines = [data[offsets[num] - base:offsets[num + 1] - base] for num in range(start, stop)]
+        if self.__is_str:
+            lines = [line.decode("utf-8", "surrogateescape") for line in lines]
+        return lines
+
+    def __getitem__(self, index):
+        if self.__file is None:
+            return self.__lines[index]
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return [self[num] for num in range(start, stop, step)]
+            return self.__read(start, stop)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("SpillList index out of range")
+        return self.__read(index, index + 1)[0]
+
+    def __iter__(self):
+        if self.__file is None:
+            yield from self.__lines
+            return
+        for start in range(0, len(self), self.ITER_LINES):
+            yield from self.__read(start, min(start + self.ITER_LINES, len(self)))
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def close(self):
+        """Method remove file with lines, list becomes empty."""
+        if self.__file is not None:
+            self.__file.close()
+        self.__file = self.__offsets = None
+        self.__lines = []
+        self.__size = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class TrigramIndex:
+    """
+    Class of case insensitive substring search over lines (list or :SpillList:), which are already loaded.
+    Index keeps for every trigram of words (runs of 3 and more word characters) numbers of blocks of
+    :BLOCK_LINES: lines, which contain it. It is built in background thread started by :start:, blocks, which
+    are not indexed yet, are looked through. Text is checked only in blocks with all trigrams of words of text,
+    from given line and up to given number of found lines, so lookup does not depend on number of lines.
+    """
+    BLOCK_LINES = 64
+    MIN_TEXT = 3  # shorter text has no trigram, it is not looked for
+    WORD = re.compile(r"\w{3,}")
+
+    def __init__(self, lines: collections.abc.Sequence):
+        self.lines = lines
+        self.__postings = collections.defaultdict(lambda: array.array("I"))  # trigram - numbers of blocks with it
+        self.__indexed = 0  # blocks are indexed in order, it is number of already indexed ones
+        self.__thread = None
+        self.__stopped = False
+        self.__candidates = (None, 0, [])  # (text, indexed blocks, blocks to check) of the last lookup
+
+    def __len__(self):
+        return len(self.lines)
+
+    @property
+    def blocks(self) -> int:
+        return (len(self.lines) + self.BLOCK_LINES - 1) // self.BLOCK_LINES
+
+    @property
+    def is_built(self) -> bool:
+        return self.__indexed == self.blocks
+
+    @staticmethod
+    def trigrams(word: str) -> set:
+        return {word[num:num + 3] for num in range(len(word) - 2)}
+
+    @staticmethod
+    def in_sorted(values: collections.abc.Sequence, value) -> bool:
+        pos = bisect.bisect_left(values, value)
+        return pos < len(values) and values[pos] == value
+
+    def __lower(self, line: (bytes, str)) -> str:
+        return (line.decode("utf-8", "replace") if isinstance(line, bytes) else line).lower()
+
+    def start(self):
+        """Method start building index in background thread, lines must not change after that."""
+        if self.__thread is None:
+            self.__thread = threading.Thread(target=self.build, name="trigram-index", daemon=True)
+            self.__thread.start()
+
+    def stop(self):
+        """Method stop building index, it is called when lines are not searched anymore."""
+        self.__stopped = True
+
+    def build(self):
+        """Method index blocks, which were not indexed yet, lookup can go on meanwhile."""
+        word_grams = {}  # trigrams of words, that were already seen (words repeat in log much)
+        for block in range(self.__indexed, self.blocks):
+            if self.__stopped:
+                return
+            start = block * self.BLOCK_LINES
+            text = "\n".join(self.__lower(line) for line in self.lines[start:start + self.BLOCK_LINES])
+            grams = set()
+            for word in set(self.WORD.findall(text)):
+                if word not in word_grams:
+                    word_grams[word] = self.trigrams(word)
+                grams |= word_grams[word]
+            for gram in grams:
+                self.__postings[gram].append(block)
+            self.__indexed = block + 1
+
+    def __blocks(self, text: str) -> list:
+        """Method returns numbers of blocks, which may contain :text:, in order."""
+        indexed = self.__indexed
+        if self.__candidates[:2] == (text, indexed):
+            return self.__candidates[2]
+        grams = set()
+        for word in self.WORD.findall(text):
+            grams |= self.trigrams(word)
+        if not grams:
+            blocks = range(indexed)
+        else:
+            lists = sorted((self.__postings.get(gram, ()) for gram in grams), key=len)
+            blocks = {block for block in lists[0] if block < indexed}  # index may be built further meanwhile
+            for blocks_with in lists[1:]:
+                if not blocks:
+                    break
+                if len(blocks) * 16 < len(blocks_with):  # few blocks are looked for in long list, it is sorted
+                    blocks = {block for block in blocks if self.in_sorted(blocks_with, block)}
+                else:
+                    blocks.intersection_update(blocks_with)
+        blocks = sorted(blocks) + list(range(indexed, self.blocks))
+        self.__candidates = (text, indexed, blocks)
+        return blocks
+
+    def find(self, text: str, start=0, limit=None, backward=False) -> list:
+        """
+        Method returns numbers of lines from :start: one to the end (or to the beginning, if :backward:),
+        which contain :text: (case insensitive), in the order they were looked through. Lines are checked
+        only until :limit: of them are found. Text shorter than :MIN_TEXT: is not looked for.
+        """
+        text = text.lower()
+        if len(text) < self.MIN_TEXT:
+            return []
+        blocks = self.__blocks(text)
+        first = start // self.BLOCK_LINES
+        if backward:
+            blocks = reversed(blocks[:bisect.bisect_right(blocks, first)])
+        else:
+            blocks = blocks[bisect.bisect_left(blocks, first):]
+        found = []
+        for block in blocks:
+            first = block * self.BLOCK_LINES
+            nums = range(first, min(first + self.BLOCK_LINES, len(self.lines)))
+            lines = zip(nums, self.lines[first:first + self.BLOCK_LINES])
+            for num, line in (reversed(list(lines)) if backward else lines):
+                if (num <= start if backward else num >= start) and text in self.__lower(line):
+                    found.append(num)
+                    if limit is not None and len(found) >= limit:
+                        return found
+        return found
+
+
+def universal_grep(file: (io.IOBase, bytes, memoryview), patterns: (str, list), as_list=False) -> (list, bytes):
+    """
+    Function imitate linux grep, and returns list of lines from :file: that matches :pattern:
+    Lines are searched and returned as bytes, so they are decoded only when shown (see :decode_line:).
+
+    Parameters
+    ----------
+    :param file: binary file object(opened file), bytes or memoryview
+        File object or bytes where to search for :pattern:
+    :param patterns: str, list
+        Pattern is one or patterns separated by newline characters for grep to search for in :file:
+    :param as_list: bool
+        If is True, return list of lines that matches :pattern:, instead of gathering them in one bytes obj.
+
+    Returns
+    -------
+    :return: list or bytes
+        List of bytes lines or gathered in bytes obj, each line of which matches :pattern:
+    """
+
+    assert isinstance(file, (io.IOBase, bytes, memoryview)), ValueError(
+        ":file: param must be bytes or link to file opened in binary mode.")
+    assert isinstance(patterns, (str, bytes, list, tuple, set)), ValueError(":pattern: must be string.")
+
+    if isinstance(file, io.IOBase):
+        # it`s unnecessary to load all file in memory, it`s enough to be able to iter by lines
+        iterable_obj = file
+
+    else:
+        # split bytes object by liens, to be able to iter though it similar as though file
+        iterable_obj = bytes(file).splitlines()
+
+    if isinstance(patterns, (str, bytes)):
+        patterns = [patterns]
+    compiled = [compile_pattern(pattern, as_bytes=True) for pattern in patterns]
+
+    result = SpillList()
+    for line in iterable_obj:
+        if all(pattern.search(line) for pattern in compiled):
+            result.append(line.strip(b" ").rstrip(b"\r\n"))
+
+    if not as_list:
+        # gathering list of lines to one bytes object
+        result = os.linesep.encode().join(result)
+
+    if isinstance(file, io.IOBase):
+        # Change the stream position to the start of stream
+        file.seek(0, 0)
+
+    return result
+
+
+def linux_zgrep(file, patterns: (list, str), as_list=False, check=False):
+    """
+    Function use linux zgrep, and returns list of lines from :file:(even if :file: is compessed) that matches :pattern:
+    Lines are searched and returned as bytes, so they are decoded only when shown (see :decode_line:).
+
+    Parameters
+    ----------
+    :param file: str
+        path to file or text in which to search for :pattern:
+    :param patterns: str, list
+        Pattern is one or patterns separated by newline characters for grep to search for in :file:
+    :param as_list: bool
+        If is True, return list of lines that matches :pattern:, instead of gathering them in one bytes obj.
+    :param check: bool
+        If is True, raise :GrepBackendError: when zgrep fails (no file, grep without -P), instead of returning nothing.
+
+    Returns
+    -------
+    :return: list or bytes
+        List of bytes lines or gathered in bytes obj, each line of which matches :pattern:
+        """
+    if isinstance(patterns, (list, tuple, set)):
+        pattern = "".join(("(?=.*{})".format(i) for i in patterns))
+    else:
+        pattern = "(?=.*{})".format(patterns)
+
+    # C locale and -a make grep match bytes, not failing on lines, which are not valid utf-8
+    out = subprocess.Popen(["zgrep", "-s", "-a", "-P", pattern, file],
+                           stdout=subprocess.PIPE,
+                           stderr=subprocess.DEVNULL,
+                           env=dict(os.environ, LC_ALL="C"))
+    # lines are read as they come, large results are moved to disk (see :SpillList:)
+    res = SpillList(line.rstrip(b"\n") for line in out.stdout)
+    out.stdout.close()
+    out.wait()
+    if check and out.returncode > 1:
+        raise GrepBackendError("zgrep exited with status {}".format(out.returncode))
+    if not as_list:
+        res = b"\n".join(res)
+
+    return res
+
+
+def compile_pattern(pattern: (str, bytes), as_bytes=False):
+    """Function compile grep pattern to str or bytes regular expression (to search in bytes lines)."""
+    if as_bytes and isinstance(pattern, str):
+        pattern = pattern.encode()
+    elif not as_bytes and isinstance(pattern, bytes):
+        pattern = pattern.decode(errors="replace")
+    return re.compile(pattern)
+
+
+def decode_line(line: (bytes, str)) -> str:
+    """Function decode line just before it is shown, characters which are not utf-8 are replaced."""
+    if isinstance(line, str):
+        return line
+    return bytes(line).decode("utf-8", errors="replace")
+
+
+def filter_lines(lines: collections.abc.Iterable, patterns: (list, tuple, set)) -> "SpillList":
+    """
+    Function filter already loaded lines in memory, keeping only ones that match every pattern of :patterns:,
+    the same way as grep functions do it with a file.
+
+    Parameters
+    ----------
+    :param lines: iterable
+        Lines (bytes or str), previously returned by one of grep functions.
+    :param patterns: list, tuple, set
+        Patterns every returned line must match.
+
+    Returns
+    -------
+    :return: SpillList
+        List of non empty lines, each of which matches all :patterns:
+    """
+    compiled = {}  # patterns compiled for type of lines
+    result = SpillList()
+    for line in lines:
+        if not line:
+            continue
+        as_bytes = isinstance(line, (bytes, bytearray))
+        if as_bytes not in compiled:
+            compiled[as_bytes] = [compile_pattern(pattern, as_bytes=as_bytes) for pattern in patterns]
+        if all(pattern.search(line) for pattern in compiled[as_bytes]):
+            result.append(line)
+    return result
+
+
+def is_narrowing(old_patterns: collections.abc.Iterable, new_patterns: collections.abc.Iterable) -> bool:
+    """
+    Function define whether query with :new_patterns: is stricter than query with :old_patterns:,
+    so it`s result is always a subset of the old one.
+
+    It is so, if each old pattern is implied by one of new patterns: equal to it, or (for plain text patterns,
+    such as e-mails or dates) contains it. For example "sergey@mail.kibr.net" narrows "sergey".
+    """
+    new_patterns = set(new_patterns)
+    for old in old_patterns:
+        if old in new_patterns:
+            continue
+        if not SIMPLE_PATTERN.fullmatch(old) or \
+                not any(SIMPLE_PATTERN.fullmatch(new) and old in new for new in new_patterns):
+            return False
+    return True
+
+
+def parse_log_line(line: (str, bytes)):
+    """
+    Function split sendmail log line into fields. Values are of the same type as :line: (str or bytes).
+
+    Returns
+    -------
+    :return: dict or None
+        Fields `time`, `host`, `program`, `pid`, `qid`, `message` and all `key=value` pairs of the message,
+        or None if line is not a syslog line.
+    """
+    if isinstance(line, str):
+        match = LOG_LINE.match(line)
+        if not match:
+            return None
+        record = match.groupdict()
+        for key, value in LOG_FIELD.findall(record["message"]):
+            record.setdefault(key, value)
+    else:
+        match = LOG_LINE_BYTES.match(line)
+        if not match:
+            return None
+        record = match.groupdict()
+        for key, value in LOG_FIELD_BYTES.findall(record["message"]):
+            record.setdefault(key.decode(), value)
+    return record
+
+
+def parse_syslog_time(text: str) -> tuple:
+    """
+    Function convert syslog time ("Jul 19 04:40:04", "Jul 19 04:40" or "Jul 19") to comparable
+    (month, day, seconds) tuple. Missing time of day is treated as midnight.
+    """
+    match = re.fullmatch(r"\s*(\w{3})\s+(\d{1,2})(?:\s+(\d{1,2}):(\d\d)(?::(\d\d))?)?\s*", text)
+    if not match or match.group(1).capitalize() not in MONTHS:
+        raise ValueError("Wrong time `{}`".format(text))
+    month, day, hours, minutes, seconds = match.groups()
+    return MONTHS[month.capitalize()], int(day), int(hours or 0) * 3600 + int(minutes or 0) * 60 + int(seconds or 0)
+
+
+def parse_duration(text: str) -> int:
+    """Function convert sendmail duration ("00:30:00", "1+02:00:00" or seconds) to seconds."""
+    match = re.fullmatch(r"\s*(?:(\d+)\+)?(\d+):(\d\d)(?::(\d\d))?\s*", text)
+    if not match:
+        if text.strip().isdigit():
+            return int(text)
+        raise ValueError("Wrong duration `{}`".format(text))
+    days, hours, minutes, seconds = match.groups()
+    return ((int(days or 0) * 24 + int(hours)) * 60 + int(minutes)) * 60 + int(seconds or 0)
+
+
+class Query:
+    """
+    Class of query over parsed sendmail fields, such as "to=@gmail.com AND stat=Deferred AND delay>00:30:00".
+
+    Clauses are joined by AND, each clause is `field operator value`, value may be quoted. Operators:
+    `==` equal, `!=` not equal, `=` contains, `~` matches regex, `!~` does not match regex,
+    `>`, `>=`, `<`, `<=` numeric comparison (duration for delay, xdelay and syslog time for time).
+    Fields are `time`, `host`, `program`, `pid`, `qid`, `key=value` fields of a line (from, to, stat, relay, ...),
+    `address` (any of from, to, ctladdr, arg1) and `line` (whole line).
+    All clauses are checked against one log line, which is parsed only once and is not decoded.
+    """
+    CLAUSE = re.compile(r"\s*(\w+)\s*(==|!=|!~|>=|<=|=|~|>|<)\s*(.*?)\s*")
+    ADDRESS_FIELDS = ("from", "to", "ctladdr", "arg1")
+
+    def __init__(self, text: str):
+        self.text = text.strip()
+        self.clauses = []  # (field, operator, value)
+        self.prefilter = []  # patterns every matching line contains, to be passed to grep
+        self.__predicates = []
+
+        for clause in re.split(r"\s+AND\s+", self.text, flags=re.IGNORECASE):
+            match = self.CLAUSE.fullmatch(clause)
+            if not match:
+                raise ValueError("Wrong query clause `{}`".format(clause))
+            field, operator, value = match.groups()
+            if len(value) > 1 and value[0] == value[-1] and value[0] in "\"'":
+                value = value[1:-1]
+            self.clauses.append((field, operator, value))
+            self.__predicates.append(self.__compile(field, operator, value))
+
+            if operator in ("=", "==") and value:
+                self.prefilter.append(re.escape(value))
+
+    def __repr__(self):
+        return "Query({!r})".format(self.text)
+
+    @classmethod
+    def __compile(cls, field, operator, value):
+        """Method build function, which checks one clause against line parsed as bytes."""
+        value_bytes = value.encode()
+        if operator in ("==", "!="):
+            def test(field_value):
+                return field_value == value_bytes
+        elif operator == "=":
+            def test(field_value):
+                return value_bytes in field_value
+        elif operator in ("~", "!~"):
+            try:
+                regex = re.compile(value_bytes)
+            except re.error as err:
+                raise ValueError("Wrong regular expression `{}`: {}".format(value, err))
+
+            def test(field_value):
+                return regex.search(field_value) is not None
+        else:
+            if field == "time":
+                convert = parse_syslog_time
+            elif field in ("delay", "xdelay"):
+                convert = parse_duration
+            else:
+                convert = float
+            try:
+                bound = convert(value)
+            except ValueError:
+                raise ValueError("Wrong value `{}` to compare with `{}`".format(value, field))
+            compare = {">": lambda a, b: a > b, ">=": lambda a, b: a >= b,
+                       "<": lambda a, b: a < b, "<=": lambda a, b: a <= b}[operator]
+
+            def test(field_value):
+                try:
+                    return compare(convert(field_value.decode("ascii", errors="replace")), bound)
+                except ValueError:
+                    return False
+
+        if field == "address":
+            def get(record):
+                return [record[key] for key in cls.ADDRESS_FIELDS if key in record]
+        elif field == "line":
+            def get(record):
+                return [record["line"]]
+        else:
+            def get(record):
+                return [record[field]] if record.get(field) is not None else []
+
+        if operator.startswith("!"):
+            return lambda record: not any(test(field_value) for field_value in get(record))
+        return lambda record: any(test(field_value) for field_value in get(record))
+
+    def match(self, line: (bytes, str)) -> bool:
+        """Method check whether log line satisfies all clauses of query. Line is checked as bytes, without decoding."""
+        if isinstance(line, str):
+            line = line.encode()
+        record = parse_log_line(line)
+        if record is None:
+            return False
+        record["line"] = line
+        return all(predicate(record) for predicate in self.__predicates)
+
+
+def file_stamp(file_path: str):
+    """Function returns (size, modification time, inode) of file, to detect it`s changes, or None."""
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns, stat.st_ino
+
+
+def is_gzip(file_path: str) -> bool:
+    """Function check by magic bytes, if file is compressed with gzip."""
+    with open(file_path, "rb") as file:
+        return file.read(2) == b"\x1f\x8b"
+
+
+def open_log(file_path: str):
+    """Function open log file for reading by bytes lines, whether it is compressed with gzip or not."""
+    if is_gzip(file_path):
+        return gzip.open(file_path, "rb")
+    return open(file_path, "rb")
+
+
+class LogTail:
+    """
+    Class read lines appended to log file since previous read, as `tail -F` does.
+    If file was rotated or truncated, it is read from start and :restarted: is set, so results
+    computed over old lines should be dropped. Compressed file is read anew whenever it changes.
+    Lines are read by chunks of about :CHUNK_SIZE: bytes, so any number of appended lines takes bounded memory.
+    """
+    CHUNK_SIZE = 4 * 1024 * 1024
+
+    def __init__(self, path: str, from_end=False):
+        """
+        :param from_end: bool
+            If is True, lines which are in file already are skipped, only appended ones are read.
+        """
+        self.path = path
+        self.restarted = False  # file was read from start by the last :read:
+        self.__offset = 0  # bytes of plain file already read
+        self.__stamp = None  # (size, modification time, inode) of file at previous read
+        if from_end:
+            self.__stamp = file_stamp(path)
+            if self.__stamp is not None and not is_gzip(path):
+                self.__offset = self.__last_line_end(self.__stamp[0])
+
+    def __last_line_end(self, size):
+        """Method returns offset after the last complete line among first :size: bytes of plain file."""
+        with open(self.path, "rb") as file:
+            start = max(size - 65536, 0)
+            while True:
+                file.seek(start)
+                end = file.read(size - start).rfind(b"\n")
+                if end != -1 or start == 0:
+                    return start + end + 1
+                start = max(start - 65536, 0)
+
+    def read(self):
+        """
+        Method returns lazy iterator of lists of bytes lines appended since previous read (all lines, when file
+        is read from start), by chunks. :restarted: is set at once, read offset is moved as chunks are taken,
+        so lines of chunks, which were not taken, are read next time (compressed file is read only once).
+        """
+        stamp = file_stamp(self.path)
+        self.restarted = False
+        if stamp is None:
+            return iter(())  # file is being rotated
+        old_stamp, self.__stamp = self.__stamp, stamp
+
+        if is_gzip(self.path):
+            if stamp == old_stamp:
+                return iter(())
+            self.restarted = old_stamp is not None
+            return self.__read_gzip()
+
+        if old_stamp is not None and (stamp[2] != old_stamp[2] or stamp[0] < self.__offset):
+            self.__offset = 0  # log was rotated or truncated
+            self.restarted = True
+        if stamp[0] <= self.__offset:
+            return iter(())
+        return self.__read_plain(stamp[0])
+
+    def __read_gzip(self):
+        with open_log(self.path) as file:
+            lines, size = [], 0
+            for line in file:
+                lines.append(line.rstrip(b"\r\n"))
+                size += len(line)
+                if size >= self.CHUNK_SIZE:
+                    yield lines
+                    lines, size = [], 0
+            if lines:
+                yield lines
+
+    def __read_plain(self, size: int):
+        """Method read lines from offset up to :size: bytes of file, last line could be not written completely yet."""
+        with open(self.path, "rb") as file:
+            file.seek(self.__offset)
+            data = b""
+            left = size - self.__offset
+            while left > 0:
+                block = file.read(min(self.CHUNK_SIZE, left))
+                if not block:
+                    return
+                left -= len(block)
+                data += block
+                complete = data.rfind(b"\n") + 1
+                if complete:
+                    lines = [line.rstrip(b"\r") for line in data[:complete].split(b"\n")[:-1]]
+                    data = data[complete:]
+                    self.__offset += complete
+                    yield lines
+
+
+def cache_path(file_path: str, kind: str, cache_dir=DEFAULT_CACHE_DIR) -> str:
+    """Function returns path of file, where result of :kind: computed over :file_path: is cached."""
+    digest = hashlib.sha1(os.path.abspath(file_path).encode()).hexdigest()
+    return os.path.join(cache_dir, kind, digest + ".json")
+
+
+def load_cached(file_path: str, kind: str, params: dict, cache_dir=DEFAULT_CACHE_DIR, stamp_check=True):
+    """
+    Function returns cached result of :kind: over :file_path:, if file and :params: did not change, or None.
+    Without :stamp_check: returns (stamp of file, when result was computed, result), even if file changed since.
+    """
+    try:
+        with open(cache_path(file_path, kind, cache_dir)) as file:
+            cached = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if cached.get("version") != CACHE_VERSION or cached.get("params") != params:
+        return None
+    if not stamp_check:
+        return cached["stamp"], cached["data"]
+    stamp = file_stamp(file_path)
+    if stamp is None or cached.get("stamp") != list(stamp):
+        return None
+    return cached["data"]
+
+
+def store_cached(file_path: str, kind: str, params: dict, data, stamp, cache_dir=DEFAULT_CACHE_DIR):
+    """Function cache result of :kind: over :file_path:, :stamp: is taken before file was read."""
+    if stamp is None:
+        return
+    path = cache_path(file_path, kind, cache_dir)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "w") as file:
+            json.dump({"version": CACHE_VERSION, "path": os.path.abspath(file_path), "stamp": list(stamp),
+                       "params": params, "data": data}, file)
+        os.replace(path + ".tmp", path)
+    except OSError:
+        pass  # result is just not cached
+
+
+def rotated_log_set(file_path: str) -> list:
+    """
+    Function returns rotated files of log (`maillog.1`, `maillog.2.gz`, `maillog-20200719.gz`)
+    and log itself, oldest first, so they can be read as one log.
+    """
+    directory, name = os.path.split(os.path.abspath(file_path))
+    pattern = re.compile(re.escape(name) + r"[.\-](\d+)(?:\.gz)?")
+    rotated = []
+    for entry in os.listdir(directory or "."):
+        match = pattern.fullmatch(entry)
+        if match:
+            suffix = match.group(1)
+            # dated files are older with smaller date, numbered ones with larger number
+            rotated.append((int(suffix) if len(suffix) >= 8 else -int(suffix), os.path.join(directory, entry)))
+    files = [path for _, path in sorted(rotated)]
+    if os.path.exists(file_path):
+        files.append(os.path.abspath(file_path))
+    return files
+
+
+class BloomFilter:
+    """
+    Class of compact set, which answers if key was added with no false negatives and with
+    false positives rate about :error_rate:, when not more than :capacity: keys were added.
+    """
+
+    def __init__(self, capacity: int, error_rate=0.01):
+        capacity = max(capacity, 1)
+        self.size = max(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)  # bits
+        self.hashes = max(round(self.size / capacity * math.log(2)), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def __positions(self, key: bytes):
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        first, step = int.from_bytes(digest[:8], "big"), int.from_bytes(digest[8:], "big") | 1
+        return ((first + num * step) % self.size for num in range(self.hashes))
+
+    def add(self, key: bytes):
+        for position in self.__positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: bytes) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.__positions(key))
+
+    def to_dict(self) -> dict:
+        return {"size": self.size, "hashes": self.hashes, "bits": base64.b64encode(bytes(self.bits)).decode()}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "BloomFilter":
+        bloom = cls.__new__(cls)
+        bloom.size, bloom.hashes = data["size"], data["hashes"]
+        bloom.bits = bytearray(base64.b64decode(data["bits"]))
+        return bloom
+
+
+def normalize_key(key: (str, bytes)) -> bytes:
+    """Function returns key (queue id, message id or address) as it is kept in :SegmentFilters:."""
+    if isinstance(key, str):
+        key = key.encode()
+    key = key.strip(b"<> ")
+    return key.lower() if b"@" in key else key
+
+
+def line_keys(line: bytes) -> set:
+    """Function returns keys of line: queue id, message id and addresses of `from=`, `to=` and `ctladdr=`."""
+    record = parse_log_line(line)
+    if record is None:
+        return set()
+    keys = {record["qid"]} if record["qid"] else set()
+    for field in ("msgid", "from", "to", "ctladdr"):
+        for value in record.get(field, b"").split(b","):
+            value = normalize_key(value.split(b" ")[0])
+            if value:
+                keys.add(value)
+    return keys
+
+
+class SegmentFilters:
+    """
+    Class of Bloom filters of keys (see :line_keys:) of log file: one per block of :block_size: bytes
+    of plain file, or one for whole compressed file. Lookups read only blocks, which may contain key,
+    and skip files, which certainly do not contain it.
+    """
+
+    def __init__(self, path: str, blocks=(), error_rate=0.01, block_size=DEFAULT_BLOCK_SIZE):
+        self.path = path
+        self.blocks = list(blocks)  # (start offset, end offset or None for compressed file, BloomFilter)
+        self.error_rate = error_rate
+        self.block_size = block_size
+
+    def __repr__(self):
+        return "SegmentFilters({!r}, {} blocks)".format(self.path, len(self.blocks))
+
+    @property
+    def end(self) -> int:
+        """Offset of plain file, up to which it is covered by filters."""
+        return self.blocks[-1][1] if self.blocks and self.blocks[-1][1] is not None else 0
+
+    def __add_block(self, start, end, lines):
+        keys = set()
+        for line in lines:
+            keys.update(line_keys(line))
+        bloom = BloomFilter(len(keys), self.error_rate)
+        for key in keys:
+            bloom.add(key)
+        self.blocks.append((start, end, bloom))
+
+    def update(self):
+        """Method build filters of blocks of file, which are not covered yet (all, if file was replaced)."""
+        if is_gzip(self.path):
+            if not self.blocks:
+                with open_log(self.path) as file:
+                    self.__add_block(0, None, file)
+            return
+
+        size = os.path.getsize(self.path)
+        if self.blocks and self.blocks[-1][1] - self.blocks[-1][0] < self.block_size:
+            self.blocks.pop()  # the last block was not full, it is built anew with appended lines
+        with open(self.path, "rb") as file:
+            start = self.end
+            while start < size:
+                file.seek(start)
+                data = file.read(self.block_size)
+                data += file.readline()  # block ends with whole line
+                if not data.endswith(b"\n"):
+                    data = data[:data.rfind(b"\n") + 1]  # last line is not written completely yet
+                    if not data:
+                        break
+                self.__add_block(start, start + len(data), data.splitlines())
+                start += len(data)
+
+    def blocks_with(self, key: (str, bytes)) -> list:
+        """Method returns (start, end) of blocks, which may contain :key:, end is None for compressed file."""
+        key = normalize_key(key)
+        return [(start, end) for start, end, bloom in self.blocks if key in bloom]
+
+    def lines_with(self, key: (str, bytes)) -> list:
+        """Method returns lines of file, which contain :key:, reading only blocks, which may contain it."""
+        key = normalize_key(key)
+        lower = b"@" in key
+        lines = []
+        for start, end in self.blocks_with(key):
+            if end is None:
+                with open_log(self.path) as file:
+                    block = file.read()
+            else:
+                with open(self.path, "rb") as file:
+                    file.seek(start)
+                    block = file.read(end - start)
+            lines += [line.rstrip(b"\r") for line in block.split(b"\n")
+                      if key in (line.lower() if lower else line)]
+        return lines
+
+    def to_dict(self) -> dict:
+        return {"error_rate": self.error_rate, "block_size": self.block_size,
+                "blocks": [[start, end, bloom.to_dict()] for start, end, bloom in self.blocks]}
+
+    @classmethod
+    def from_dict(cls, path: str, data: dict) -> "SegmentFilters":
+        return cls(path, [(start, end, BloomFilter.from_dict(bloom)) for start, end, bloom in data["blocks"]],
+                   data["error_rate"], data["block_size"])
+
+
+def segment_filters(file_path: str, error_rate=0.01, block_size=DEFAULT_BLOCK_SIZE,
+                    cache_dir=DEFAULT_CACHE_DIR) -> SegmentFilters:
+    """
+    Function returns :SegmentFilters: of file, kept in cache. Filters of plain file, to which lines were
+    appended, are completed with new blocks, and are built anew only if file was rotated or truncated.
+    """
+    params = {"error_rate": error_rate, "block_size": block_size}
+    stamp = file_stamp(file_path)
+    cached = load_cached(file_path, "bloom", params, cache_dir, stamp_check=False) if cache_dir else None
+    filters = None
+    if cached is not None:
+        old_stamp, data = cached
+        if old_stamp == list(stamp):
+            return SegmentFilters.from_dict(file_path, data)
+        filters = SegmentFilters.from_dict(file_path, data)
+        # appended plain file is the same file of larger size, other changes make filters useless
+        if old_stamp[2] != stamp[2] or old_stamp[0] > stamp[0] or filters.blocks and filters.blocks[0][1] is None:
+            filters = None
+    if filters is None:
+        filters = SegmentFilters(file_path, error_rate=error_rate, block_size=block_size)
+    filters.update()
+    if cache_dir:
+        store_cached(file_path, "bloom", params, filters.to_dict(), stamp, cache_dir)
+    return filters
+
+
+def find_in_archive(file_paths: list, key: (str, bytes), cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Function returns lazy iterator of (path, lines) of files (see :rotated_log_set:), which contain :key:
+    (queue id, message id or address). Files and blocks, which certainly do not contain it, are not read.
+    """
+    for file_path in file_paths:
+        filters = segment_filters(file_path, cache_dir=cache_dir)
+        if filters.blocks_with(key):
+            lines = filters.lines_with(key)
+            if lines:
+                yield file_path, lines
+
+
+def print_found(found, key: str, out=sys.stdout):
+    """Function print result of :find_in_archive: grouped by file."""
+    empty = True
+    for file_path, lines in found:
+        empty = False
+        out.write("{}{}".format(file_path, os.linesep))
+        for line in lines:
+            out.write("\t{}{}".format(decode_line(line), os.linesep))
+    if empty:
+        out.write("No information about `{}` was found.{}".format(key, os.linesep))
+
+
+class AhoCorasick:
+    """
+    Class of multi-pattern automaton, which finds all occurrences of many words in text in one pass,
+    so search time depends only on text length, not on number of words.
+    """
+
+    def __init__(self, words: collections.abc.Iterable):
+        self._goto = [{}]  # state - {character: next state}
+        self._fail = [0]
+        self._output = [[]]  # state - words, that end in this state
+        for word in words:
+            self.__add_word(word)
+        self.__build_fail_links()
+
+    def __add_word(self, word):
+        """Method add word to trie of automaton."""
+        if not word:
+            return
+        state = 0
+        for character in word:
+            if character not in self._goto[state]:
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._goto[state][character] = len(self._goto) - 1
+            state = self._goto[state][character]
+        if word not in self._output[state]:
+            self._output[state].append(word)
+
+    def __build_fail_links(self):
+        """Method link each state to the longest proper suffix, which is also in trie (breadth-first)."""
+        queue = collections.deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for character, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and character not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(character, 0)
+                self._output[next_state] += self._output[self._fail[next_state]]
+
+    def find_all(self, text: str) -> set:
+        """Method returns set of words, which occur in :text:."""
+        goto, fail, output = self._goto, self._fail, self._output
+        found = set()
+        state = 0
+        for character in text:
+            while state and character not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(character, 0)
+            if output[state]:
+                found.update(output[state])
+        return found
+
+
+def record_addresses(record: dict) -> set:
+    """
+    Function returns lowercased addresses of address fields (`from=`, `to=`, `ctladdr=`, `arg1=`)
+    of bytes line split by :parse_log_line:, without angle brackets and user ids of ctladdr.
+    """
+    addresses = set()
+    for key in Query.ADDRESS_FIELDS:
+        for address in record.get(key, b"").split(b","):
+            address = address.strip().split(b" ")[0].strip(b"<>").lower()
+            if address:
+                addresses.add(address)
+    return addresses
+
+
+def batch_lookup(file_path: str, addresses: collections.abc.Iterable, timer=None) -> dict:
+    """
+    Function find transactions of many addresses at once.
+    First pass finds ids of lines, mentioning any of addresses (case insensitive), second one gathers
+    all lines of these ids, both with one automaton, so it takes two reads of file for any number of addresses.
+    Lines found by automaton are taken only if address is the whole value of address field (see :record_addresses:),
+    so `ann@mail.net` does not find `joann@mail.net`. Passes are measured by :timer: (see :PhaseTimer:).
+
+    Returns
+    -------
+    :return: dict
+        {address: {id: [bytes lines]}}
+    """
+    timer = timer or NULL_TIMER
+    addresses = {address.strip().lower().encode() for address in addresses if address.strip()}
+    address_ids = {address: {} for address in addresses}  # ids are keys of dict, so they are unique and in order
+
+    automaton = AhoCorasick(addresses)
+    size = 0
+    with timer.phase("batch find ids"), open_log(file_path) as file:
+        for line in file:
+            size += len(line)
+            found = automaton.find_all(line.lower())
+            if found:
+                record = parse_log_line(line.rstrip(b"\r\n"))
+                if record is not None and record["qid"]:
+                    for address in found & record_addresses(record):
+                        address_ids[address][record["qid"]] = None
+
+    id_lines = {id_: [] for ids in address_ids.values() for id_ in ids}
+    automaton = AhoCorasick(id_lines)
+    matched = 0
+    with timer.phase("batch read ids"), open_log(file_path) as file:
+        for line in file:
+            for id_ in automaton.find_all(line):
+                id_lines[id_].append(line.rstrip(b"\r\n"))
+                matched += 1
+    timer.count("bytes read", size * 2)  # file is read twice
+    timer.count("lines matched", matched)
+    timer.count("ids found", len(id_lines))
+
+    return {address.decode(errors="replace"): {id_.decode(): id_lines[id_] for id_ in ids}
+            for address, ids in address_ids.items()}
+
+
+def print_batch_report(result: dict, out=sys.stdout):
+    """Function print result of :batch_lookup: grouped by address and id."""
+    for address in sorted(result):
+        out.write("{}{}".format(address, os.linesep))
+        if not result[address]:
+            out.write("\tNo information was found.{}".format(os.linesep))
+        for id_, lines in result[address].items():
+            out.write("\t{}{}".format(id_, os.linesep))
+            for line in lines:
+                out.write("\t\t{}{}".format(decode_line(line), os.linesep))
+
+
+EXPORT_FORMATS = ("jsonl", "csv", "report")
+# fields of lines, which get own columns in csv export, others are left in message
+EXPORT_FIELDS = ("from", "to", "ctladdr", "msgid", "size", "nrcpts", "mailer", "relay", "delay", "xdelay", "dsn",
+                 "stat")
+
+
+def export_transactions(transactions: collections.abc.Iterable, out, export_format="jsonl") -> int:
+    """
+    Function write :transactions: (e.g. lazy iterator of :MailLog.transactions:) to text stream :out: one by one,
+    so any number of them can be exported. Returns number of written transactions.
+
+    Parameters
+    ----------
+    :param export_format: str
+        `jsonl` - json object with id, sender, recipients and parsed lines per transaction,
+        `csv` - row per line with id, syslog fields and :EXPORT_FIELDS:,
+        `report` - lines grouped by id, as they are in log.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError("Unknown export format `{}`.".format(export_format))
+    writer = None
+    if export_format == "csv":
+        writer = csv.writer(out)
+        writer.writerow(("id", "time", "host", "program", "pid", "qid") + EXPORT_FIELDS + ("message",))
+
+    count = 0
+    for transaction in transactions:
+        count += 1
+        if export_format == "report":
+            out.write("{}{}".format(transaction.id, os.linesep))
+            for line in transaction.lines:
+                out.write("\t{}{}".format(line, os.linesep))
+            continue
+
+        lines = transaction.lines
+        records = [parse_log_line(line) or {} for line in lines]
+        if export_format == "jsonl":
+            json.dump({"id": transaction.id, "sender": transaction.sender, "recipients": transaction.recipients,
+                       "lines": [dict(record, line=line) for line, record in zip(lines, records)]}, out)
+            out.write("\n")
+        else:
+            for line, record in zip(lines, records):
+                writer.writerow([transaction.id] + [record.get(field) or "" for field in
+                                                    ("time", "host", "program", "pid", "qid") + EXPORT_FIELDS] +
+                                [record.get("message", line)])
+    return count
+
+
+def linux_if_file_exist(file_path: str):
+    """Function gives information if file at :file_path: exist."""
+    out = subprocess.Popen(["file", file_path],
+                           stdout=subprocess.PIPE)
+    std = "".join([i.decode("utf-8") for i in out.communicate() if i])
+    returncode = 1
+
+    if "(No such file or directory)" in std:
+        returncode = 0
+    return returncode
+
+
+def universal_if_file_exist(file_path: str):
+    """Function gives information if file at :file_path: exist."""
+    out = os.path.isfile(file_path)
+    return out
+
+
+def gzip_block(data: bytes, level=6) -> bytes:
+    """
+    Function compress :data: into one gzip member, which has extra subfield :GZIP_BLOCK_FIELD: with sizes
+    of the member and of :data: (as BGZF does), so members can be found without decompressing file.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    body = compressor.compress(data) + compressor.flush()
+    trailer = struct.pack("<II", zlib.crc32(data), len(data) & 0xffffffff)
+    header_size = 10 + 2 + 4 + 8
+    extra = GZIP_BLOCK_FIELD + struct.pack("<HII", 8, header_size + len(body) + len(trailer), len(data))
+    header = b"\x1f\x8b\x08\x04" + struct.pack("<I", 0) + b"\x00\xff" + struct.pack("<H", len(extra)) + extra
+    return header + body + trailer
+
+
+def write_block_gzip(source_path: str, target_path: str, block_size=GZIP_BLOCK_SIZE, level=6) -> int:
+    """
+    Function write lines of log :source_path: (plain or gzip) to :target_path: as block gzip file: every member
+    holds whole lines of about :block_size: bytes. File is read by `zcat` as usual and can be searched
+    by blocks in parallel (see :block_gzip_grep:). Returns number of blocks.
+    """
+    count = 0
+    with open_log(source_path) as source, open(target_path, "wb") as target:
+        block = []
+        size = 0
+        for line in source:
+            block.append(line)
+            size += len(line)
+            if size >= block_size:
+                target.write(gzip_block(b"".join(block), level))
+                count += 1
+                block, size = [], 0
+        if block or not count:
+            target.write(gzip_block(b"".join(block), level))
+            count += 1
+    return count
+
+
+def read_block_header(file) -> tuple:
+    """
+    Function read header of gzip member at current position of binary :file: and returns (size of member,
+    size of lines) from it`s :GZIP_BLOCK_FIELD: subfield, or None if member has no such subfield.
+    """
+    header = file.read(12)
+    if len(header) < 12 or header[:3] != b"\x1f\x8b\x08" or not header[3] & 4:
+        return None
+    extra = file.read(struct.unpack("<H", header[10:12])[0])
+    pos = 0
+    while pos + 4 <= len(extra):
+        field, length = extra[pos:pos + 2], struct.unpack("<H", extra[pos + 2:pos + 4])[0]
+        if field == GZIP_BLOCK_FIELD and length == 8:
+            sizes = struct.unpack("<II", extra[pos + 4:pos + 12])
+            return sizes if sizes[0] else None
+        pos += 4 + length
+    return None
+
+
+def log_kind(file_path: str) -> str:
+    """Function returns kind of log file: `plain`, `gzip` or `blocks` (block gzip, see :write_block_gzip:)."""
+    with open(file_path, "rb") as file:
+        if file.read(2) != b"\x1f\x8b":
+            return "plain"
+        file.seek(0)
+        return "blocks" if read_block_header(file) else "gzip"
+
+
+def block_gzip_index(file_path: str):
+    """
+    Function returns [(offset, size of member, size of lines)] of members of block gzip file (see
+    :write_block_gzip:), reading only their headers, or None if file is not such file.
+    """
+    index = []
+    with open(file_path, "rb") as file:
+        end = os.fstat(file.fileno()).st_size
+        offset = 0
+        while offset < end:
+            file.seek(offset)
+            sizes = read_block_header(file)
+            if sizes is None:
+                return None
+            index.append((offset,) + sizes)
+            offset += sizes[0]
+    return index or None
+
+
+def grep_gzip_blocks(file_path: str, blocks: list, patterns: (str, list)) -> list:
+    """Function returns lines of :blocks: (offset, size of member) of block gzip file, which match :patterns:."""
+    lines = []
+    with open(file_path, "rb") as file:
+        for offset, size in blocks:
+            file.seek(offset)
+            data = zlib.decompress(file.read(size), 16 + zlib.MAX_WBITS)
+            lines += universal_grep(data, patterns, as_list=True)
+    return lines
+
+
+def block_gzip_grep(file: str, patterns: (str, list), as_list=False, workers=None):
+    """
+    Function search block gzip :file: (see :write_block_gzip:) by blocks in parallel processes, lines are
+    returned in order of file. Other files are searched by :universal_grep:.
+    """
+    index = block_gzip_index(file)
+    if index is None:
+        with open_log(file) as log:
+            return universal_grep(log, patterns, as_list=as_list)
+    workers = min(workers or os.cpu_count() or 1, len(index))
+    # every process gets several runs of blocks, so slow blocks are shared out
+    runs = max(workers * 4, 1)
+    step = math.ceil(len(index) / runs)
+    chunks = [[(offset, size) for offset, size, _ in index[start:start + step]]
+              for start in range(0, len(index), step)]
+    lines = SpillList()
+    if workers <= 1:
+        for chunk in chunks:
+            lines.extend(grep_gzip_blocks(file, chunk, patterns))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            for found in executor.map(grep_gzip_blocks, [file] * len(chunks), chunks, [patterns] * len(chunks)):
+                lines.extend(found)
+    return lines if as_list else os.linesep.encode().join(lines)
+
+
+class GrepBackendError(OSError):
+    """Exception of grep backend, which could not search file, other backend should be used instead."""
+
+
+def literal_fragment(patterns: (str, list)) -> bytes:
+    """
+    Function returns the longest text, which every line matching grep :patterns: must contain,
+    so lines can be found by fast fixed string search first and checked by :patterns: afterwards.
+    Returns b"" if there is no such text (alternations, groups, only special characters).
+    """
+    if isinstance(patterns, (str, bytes)):
+        patterns = [patterns]
+    best = b""
+    for pattern in patterns:
+        if isinstance(pattern, bytes):
+            pattern = pattern.decode("latin-1")
+            encoding = "latin-1"
+        else:
+            encoding = "utf-8"
+        if re.search(r"(?<!\\)[|(\[]", pattern):
+            continue  # text in alternations and groups can be optional
+        runs = [""]
+        pos = 0
+        while pos < len(pattern):
+            char = pattern[pos]
+            if char == "\\":
+                if pos + 1 < len(pattern) and not pattern[pos + 1].isalnum():
+                    runs[-1] += pattern[pos + 1]  # escaped special character is plain one
+                else:
+                    runs.append("")  # class of characters (\w, \d...)
+                pos += 2
+            elif char in "*?+{":
+                if char != "+":
+                    runs[-1] = runs[-1][:-1]  # previous character can be absent
+                runs.append("")
+                pos = pattern.find("}", pos) + 1 if char == "{" else pos + 1
+                if not pos:
+                    break
+            elif char != "." and SIMPLE_PATTERN.fullmatch(char):
+                runs[-1] += char
+                pos += 1
+            else:
+                runs.append("")  # any character, anchors
+                pos += 1
+        best = max([best] + [run.encode(encoding) for run in runs], key=len)
+    return best
+
+
+def fixed_string_grep(command: list, file: str, patterns: (str, list), as_list=False):
+    """
+    Function find lines of :file: with external :command: (grep -F like, which is followed by fixed string
+    and file path), by the longest literal fragment of :patterns:, and check lines by all :patterns: itself.
+    """
+    if isinstance(patterns, (str, bytes)):
+        patterns = [patterns]
+    fragment = literal_fragment(patterns)
+    out = subprocess.Popen(list(command) + [fragment, file], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                           env=dict(os.environ, LC_ALL="C"))
+    compiled = [compile_pattern(pattern, as_bytes=True) for pattern in patterns]
+    lines = SpillList()
+    for line in out.stdout:
+        line = line.rstrip(b"\r\n")
+        if line and all(pattern.search(line) for pattern in compiled):
+            lines.append(line)
+    out.stdout.close()
+    if out.wait() > 1:
+        raise GrepBackendError("{} exited with status {}".format(command[0], out.returncode))
+    return lines if as_list else b"\n".join(lines)
+
+
+def mmap_grep(file: str, patterns: (str, list), as_list=False):
+    """
+    Function search lines of plain :file: mapped in memory: the longest literal fragment of :patterns: is found
+    with bytes search, only lines around it are checked by regular expressions. Compressed files are read by lines.
+    """
+    if isinstance(patterns, (str, bytes)):
+        patterns = [patterns]
+    fragment = literal_fragment(patterns)
+    if is_gzip(file) or not fragment or not os.path.getsize(file):
+        with open_log(file) as log:
+            return universal_grep(log, patterns, as_list=as_list)
+
+    compiled = [compile_pattern(pattern, as_bytes=True) for pattern in patterns]
+    lines = SpillList()
+    with open(file, "rb") as log, mmap.mmap(log.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        pos = data.find(fragment)
+        while pos != -1:
+            start = data.rfind(b"\n", 0, pos) + 1
+            end = data.find(b"\n", pos)
+            if end == -1:
+                end = len(data)
+            line = data[start:end].rstrip(b"\r")
+            if all(pattern.search(line) for pattern in compiled):
+                lines.append(line)
+            pos = data.find(fragment, end + 1)
+    return lines if as_list else b"\n".join(lines)
+
+
+class GrepBackend:
+    """
+    Class of one way to grep log file: function, external commands it needs and kinds of files it can search.
+    Backends, which search by literal fragment (see :literal_fragment:), can`t be used for patterns without it.
+    """
+
+    def __init__(self, name: str, function, commands=(), plain=True, compressed=True, needs_fragment=False,
+                 needs_blocks=False):
+        self.name = name
+        self.function = function  # function(path, patterns, as_list)
+        self.commands = tuple(commands)
+        self.plain = plain
+        self.compressed = compressed
+        self.needs_fragment = needs_fragment
+        self.needs_blocks = needs_blocks  # searches only block gzip files (see :write_block_gzip:)
+
+    def __repr__(self):
+        return "GrepBackend({!r})".format(self.name)
+
+    def __call__(self, file: str, patterns: (str, list), as_list=False):
+        return self.function(file, patterns, as_list=as_list)
+
+    def tools(self) -> dict:
+        """Method returns {command: it`s path or None}, backend is available if all commands are found."""
+        return {command: shutil.which(command) for command in self.commands}
+
+    def can_search(self, patterns: (str, list), compressed: bool, blocks=False) -> bool:
+        """Method check if backend can search file of such kind by :patterns:."""
+        if not (self.compressed if compressed else self.plain) or self.needs_blocks and not blocks:
+            return False
+        return not self.needs_fragment or bool(literal_fragment(patterns))
+
+
+class BackendRegistry:
+    """
+    Class of grep backends, which chooses the fastest one for every file and query.
+    Backends are checked and timed on small generated logs once (calibration), results are kept in :cache_path:,
+    and are measured again, when tools change. Time of search is estimated as start time plus time per byte of file.
+    Lines of files, indexed by running indexer daemon, are asked from it before any backend (see :MailLog:).
+    """
+    CALIBRATION_LINES = 5000
+    # searches are timed separately for patterns with literal text (see :literal_fragment:) and without it
+    CALIBRATION_PATTERNS = {"literal": ["user7@", "msgid="], "regex": ["(?:user7@|nobody@)"]}
+
+    def __init__(self, backends=(), cache_path=os.path.join(DEFAULT_CACHE_DIR, "backends.json")):
+        self.backends = collections.OrderedDict()
+        self.cache_path = cache_path
+        self.__calibration = None  # backend - kind of file - kind of patterns - [start seconds, seconds per byte]
+        self.__lock = threading.Lock()
+        for backend in backends:
+            self.register(backend)
+
+    def register(self, backend: GrepBackend):
+        """Method add backend, it is calibrated with others next time backend is chosen."""
+        with self.__lock:
+            self.backends[backend.name] = backend
+            self.__calibration = None
+
+    def __getitem__(self, name: str) -> GrepBackend:
+        return self.backends[name]
+
+    @property
+    def names(self) -> list:
+        return list(self.backends)
+
+    @property
+    def fallback(self) -> GrepBackend:
+        """Backend without external tools, which can search any file."""
+        return next(backend for backend in self.backends.values() if not backend.commands and backend.plain and
+                    backend.compressed and not backend.needs_fragment and not backend.needs_blocks)
+
+    def available(self) -> list:
+        """Method returns backends, which were found working on this machine."""
+        calibration = self.calibrate()
+        return [backend for name, backend in self.backends.items() if calibration.get(name)]
+
+    def __tools(self) -> dict:
+        return {name: backend.tools() for name, backend in self.backends.items()}
+
+    def calibrate(self, force=False) -> dict:
+        """Method returns calibration of backends, loading it from cache or measuring it anew."""
+        with self.__lock:
+            if self.__calibration is not None and not force:
+                return self.__calibration
+            tools = self.__tools()
+            if not force:
+                try:
+                    with open(self.cache_path) as file:
+                        cached = json.load(file)
+                    if cached.get("tools") == tools and set(cached.get("backends", ())) == set(self.backends):
+                        self.__calibration = cached["backends"]
+                        return self.__calibration
+                except (OSError, ValueError):
+                    pass  # no cache yet
+
+            self.__calibration = self.__measure(tools)
+            try:
+                os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+                with open(self.cache_path, "w") as file:
+                    json.dump({"tools": tools, "backends": self.__calibration}, file, indent=1)
+            except OSError:
+                pass  # calibration is kept in memory only
+            return self.__calibration
+
+    def __measure(self, tools: dict) -> dict:
+        """Method check and time every backend with found tools on small and large generated logs."""
+        lines = [("Jul 19 04:{:02d}:{:02d} mail sendmail[{}]: 06J4{:06d}{:04d}: from=<user{}@mail.example.net>, "
+                  "size={}, class=0, nrcpts=1, msgid=<{}.{}@mail.example.net>, relay=localhost\n"
+                  .format(num // 60 % 60, num % 60, num, num, num % 10000, num % 97, num * 7 % 50000, num, num % 13))
+                 for num in range(self.CALIBRATION_LINES)]
+        expected = sum(1 for line in lines if "user7@" in line)  # and all lines have msgid=
+        calibration = {}
+        with tempfile.TemporaryDirectory() as temp_dir:
+            samples = {}
+            for kind in ("plain", "gzip", "blocks"):
+                for size, sample in (("small", lines[7:8]), ("large", lines)):
+                    path = os.path.join(temp_dir, "{}_{}.log".format(kind, size))
+                    with (gzip.open(path, "wb") if kind == "gzip" else open(path, "wb")) as file:
+                        if kind == "blocks":
+                            # even the small file has two blocks, to time start of parallel search
+                            blocks = [lines[:1], sample] if size == "small" else \
+                                [sample[start:start + 500] for start in range(0, len(sample), 500)]
+                            file.write(b"".join(gzip_block("".join(block).encode()) for block in blocks))
+                        else:
+                            file.write("".join(sample).encode())
+                    samples[kind, size] = path
+
+            for name, backend in self.backends.items():
+                if not all(tools[name].values()):
+                    calibration[name] = None  # tools are not installed
+                    continue
+                calibration[name] = {}
+                try:
+                    for kind in ("plain", "gzip", "blocks"):
+                        for mode, patterns in self.CALIBRATION_PATTERNS.items():
+                            if not backend.can_search(patterns, kind != "plain", kind == "blocks"):
+                                continue
+                            seconds = {}
+                            for size, count in (("small", 1), ("large", expected)):
+                                times = []
+                                for _ in range(2 if size == "small" else 1):  # the first start can be slow
+                                    start = time.perf_counter()
+                                    found = backend(samples[kind, size], patterns, as_list=True)
+                                    times.append(time.perf_counter() - start)
+                                if len(found) != count:
+                                    raise GrepBackendError("{} found wrong lines".format(name))
+                                seconds[size] = min(times)
+                            per_byte = max(seconds["large"] - seconds["small"], 0) / \
+                                os.path.getsize(samples[kind, "large"])
+                            calibration[name].setdefault(kind, {})[mode] = [seconds["small"], per_byte]
+                except (OSError, ValueError, re.error):
+                    calibration[name] = None  # backend does not work here (e.g. grep without -P)
+        return calibration
+
+    def choose(self, path: str, patterns: (str, list)) -> GrepBackend:
+        """Method returns the backend, which is expected to search :path: by :patterns: the fastest."""
+        calibration = self.calibrate()
+        try:
+            kind = log_kind(path)
+            size = os.path.getsize(path)
+        except OSError:
+            return self.fallback
+        mode = "literal" if literal_fragment(patterns) else "regex"
+        best, best_cost = self.fallback, None
+        for name, backend in self.backends.items():
+            measured = ((calibration.get(name) or {}).get(kind) or {}).get(mode)
+            if measured is None or not backend.can_search(patterns, kind != "plain", kind == "blocks"):
+                continue
+            cost = measured[0] + measured[1] * size
+            if best_cost is None or cost < best_cost:
+                best, best_cost = backend, cost
+        return best
+
+    def grep(self, path: str, patterns: (str, list), as_list=False, backend=None):
+        """Method search :path: with chosen (or given) backend, and with fallback one, if that fails."""
+        backend = backend or self.choose(path, patterns)
+        fallback = self.fallback
+        try:
+            return backend(path, patterns, as_list=as_list)
+        except OSError:
+            if backend is fallback:
+                raise  # file can`t be read
+            return fallback(path, patterns, as_list=as_list)
+
+
+BACKENDS = BackendRegistry([
+    GrepBackend("python", mmap_grep),
+    GrepBackend("zgrep", lambda file, patterns, as_list: linux_zgrep(file, patterns, as_list=as_list, check=True),
+                commands=["zgrep", "grep"]),
+    GrepBackend("grep-F", lambda file, patterns, as_list: fixed_string_grep(["grep", "-a", "-F", "-e"], file,
+                                                                            patterns, as_list=as_list),
+                commands=["grep"], compressed=False, needs_fragment=True),
+    GrepBackend("rg", lambda file, patterns, as_list: fixed_string_grep(
+        ["rg", "--no-config", "-z", "-a", "-F", "--no-line-number", "--no-filename", "--no-messages", "-e"],
+        file, patterns, as_list=as_list), commands=["rg"], needs_fragment=True),
+    GrepBackend("parallel", block_gzip_grep, plain=False, needs_blocks=True),
+])
+
+
+class IndexerError(Exception):
+    """Exception raised when indexer daemon can`t answer a query."""
+
+
+def check_socket_dir(socket_path: str):
+    """
+    Function raise OSError, if directory of unix socket :socket_path: or socket itself belongs neither to user
+    nor to root nor to one of user`s groups, or directory can be changed by others, so the socket could be
+    replaced by somebody, who is not trusted to answer instead of indexer daemon.
+    """
+    directory = os.path.dirname(os.path.abspath(socket_path))
+    groups = set(os.getgroups()) | {os.getgid()}
+    for path in (directory, socket_path):
+        if os.path.exists(path):
+            st = os.stat(path)
+            if st.st_uid not in (os.getuid(), 0) and st.st_gid not in groups:
+                raise OSError("`{}` belongs to other user.".format(path))
+    if os.stat(directory).st_mode & 0o002:
+        raise OSError("Directory `{}` of socket can be changed by other users.".format(directory))
+
+
+class IndexerClient:
+    """
+    Class of client of indexer daemon (see sendmail_log_indexer.py), which keeps log files indexed in memory
+    and answers grep queries over unix socket. Each request is one json line, response is one or more json lines
+    (pages of lines, all but the last one have `more`), log lines are passed as latin-1 strings to keep bytes
+    unchanged. Socket is used only in private directory (see :check_socket_dir:).
+    """
+
+    def __init__(self, socket_path=DEFAULT_INDEXER_SOCKET, timeout=60):
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    def pages(self, **request):
+        """
+        Method send request to daemon and returns lazy iterator of pages of it`s response,
+        raise IndexerError if daemon refused it.
+        """
+        check_socket_dir(self.socket_path)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            sock.sendall(json.dumps(request).encode() + b"\n")
+            with sock.makefile("rb") as stream:
+                while True:
+                    response = json.loads(stream.readline() or b"{}")
+                    if not response.get("ok"):
+                        raise IndexerError(response.get("error", "no response"))
+                    yield response
+                    if not response.get("more"):
+                        return
+
+    def request(self, **request) -> dict:
+        """Method send request to daemon and returns it`s response (the first page of it)."""
+        pages = self.pages(**request)
+        try:
+            return next(pages)
+        finally:
+            pages.close()
+
+    def is_running(self) -> bool:
+        """Method check whether daemon answers on socket."""
+        try:
+            self.request(op="ping")
+        except (OSError, ValueError, IndexerError):
+            return False
+        return True
+
+    def grep(self, file: str, patterns: (str, list), as_list=False) -> (list, bytes):
+        """Method has the same interface as :linux_zgrep:, but lines are searched by daemon."""
+        if isinstance(patterns, (str, bytes)):
+            patterns = [patterns]
+        patterns = [decode_line(pattern) for pattern in patterns]
+        result = []
+        for response in self.pages(op="grep", path=os.path.abspath(file), patterns=patterns):
+            result += [line.encode("latin-1") for line in response["lines"]]
+        if not as_list:
+            result = os.linesep.encode().join(result)
+        return result
+
+
+class Transaction:
+    """Class of one message transaction: all log lines, which mention it`s queue id."""
+
+    def __init__(self, id_: str, lines: list):
+        self.id = id_
+        self.raw_lines = lines  # bytes, as they are in log
+
+    def __repr__(self):
+        return "Transaction({!r}, {} lines)".format(self.id, len(self.raw_lines))
+
+    @property
+    def lines(self) -> list:
+        """Decoded lines of transaction."""
+        return [decode_line(line) for line in self.raw_lines]
+
+    @property
+    def records(self) -> list:
+        """
+        Lines of transaction split into fields (see :parse_log_line:), lines which are not syslog ones are skipped.
+        """
+        return [record for record in map(parse_log_line, self.lines) if record is not None]
+
+    @property
+    def sender(self):
+        """Address from first `from=` of transaction own lines or None."""
+        for record in self.records:
+            if record["qid"] == self.id and "from" in record:
+                return record["from"]
+        return None
+
+    @property
+    def recipients(self) -> list:
+        """Addresses from `to=` fields of transaction own lines, in order of first appearance."""
+        recipients = []
+        for record in self.records:
+            if record["qid"] == self.id and "to" in record:
+                for address in record["to"].split(","):
+                    if address and address not in recipients:
+                        recipients.append(address)
+        return recipients
+
+
+class RecipientSummary:
+    """Class of delivery attempts (`to=` lines) of one recipient by one queue id, see :TransactionSummary:."""
+
+    def __init__(self, qid: str, address: str):
+        self.qid = qid
+        self.address = address
+        self.attempts = 0
+        self.first_time = None
+        self.last_time = None
+        self.stat = ""  # of the last attempt, as `dsn` and `delay` (delay is counted from submission)
+        self.dsn = ""
+        self.delay = ""
+        self.lines = array.array("I")  # numbers of lines of attempts in lines of transaction
+
+    def add(self, num: int, record: dict):
+        """Method count attempt of line :num: parsed into :record:."""
+        self.attempts += 1
+        self.lines.append(num)
+        self.last_time = decode_line(record["time"])
+        self.first_time = self.first_time or self.last_time
+        self.stat = decode_line(record.get("stat") or self.stat)
+        self.dsn = decode_line(record.get("dsn") or self.dsn)
+        self.delay = decode_line(record.get("delay") or self.delay)
+
+    def __str__(self):
+        return "{}: to={}, attempts={}, first={}, last={}, delay={}, dsn={}, stat={}".format(
+            self.qid, self.address, self.attempts, self.first_time, self.last_time, self.delay or "-",
+            self.dsn or "-", self.stat)
+
+
+class TransactionSummary:
+    """
+    Class of lines of transaction grouped by recipients: every recipient of every queue id gets one row with
+    number of delivery attempts, times of the first and the last ones, the last status and delay (see
+    :RecipientSummary:), other lines (`from=`, connections...) are kept as they are. It is fed line by line by the
+    loop, which reads lines (see :add_line:), and keeps only numbers of lines, the lines are kept by caller (e.g. in
+    :SpillList:) and read back by :rows:, attempts only of expanded recipients, so rows depend on recipients.
+    """
+
+    def __init__(self):
+        self.recipients = {}  # (qid, address) - RecipientSummary
+        self.entries = []  # number of line, which is not delivery, or (qid, address), in order of first appearance
+        self.lines = 0
+
+    def add_line(self, line: (bytes, str)):
+        num = self.lines
+        self.lines += 1
+        record = parse_log_line(line)
+        if record is None or not record.get("to") or not record.get("stat"):
+            self.entries.append(num)
+            return
+        qid = decode_line(record["qid"] or "")
+        for address in decode_line(record["to"]).split(","):
+            if not address:
+                continue
+            recipient = self.recipients.get((qid, address))
+            if recipient is None:
+                recipient = self.recipients[(qid, address)] = RecipientSummary(qid, address)
+                self.entries.append((qid, address))
+            recipient.add(num, record)
+
+    def add_lines(self, lines: collections.abc.Iterable):
+        for line in lines:
+            self.add_line(line)
+
+    def rows(self, lines: collections.abc.Sequence, expanded=()) -> tuple:
+        """
+        Method returns (texts, keys) of rows: lines, which are not deliveries, as they are, and a row of every
+        recipient, followed by it`s attempts from :lines:, if it`s (qid, address) is in :expanded:.
+        Key of row of recipient and of it`s attempts is (qid, address), of other rows it is None.
+        """
+        texts, keys = [], []
+        for entry in self.entries:
+            if isinstance(entry, int):
+                texts.append(decode_line(lines[entry]))
+                keys.append(None)
+                continue
+            recipient = self.recipients[entry]
+            is_expanded = entry in expanded
+            texts.append("[{}] {}".format("-" if is_expanded else "+", recipient))
+            keys.append(entry)
+            if is_expanded:
+                for num in recipient.lines:
+                    texts.append("    " + decode_line(lines[num]))
+                    keys.append(entry)
+        return texts, keys
+
+
+def time_key(value) -> tuple:
+    """
+    Function convert time to comparable with syslog time (month, day, seconds) tuple.
+    :value: is datetime.datetime, datetime.date or syslog time string (see :parse_syslog_time:).
+    """
+    if isinstance(value, datetime.datetime):
+        return value.month, value.day, value.hour * 3600 + value.minute * 60 + value.second
+    if isinstance(value, datetime.date):
+        return value.month, value.day, 0
+    return parse_syslog_time(value)
+
+
+class PhaseTimer:
+    """
+    Class accumulate time spent in named phases of searching and rendering, and counters
+    (bytes read from file, lines read by grep, lines scanned in memory, lines matched, ids found), every value
+    is counted once, where data is read or scanned. Values of the last round (one search)
+    are kept separately from totals, to show them while totals are reported at exit.
+    """
+    enabled = True
+
+    def __init__(self):
+        self.totals = collections.OrderedDict()  # phase - [calls, seconds]
+        self.counters = collections.OrderedDict()  # counter - total value
+        self.round = collections.OrderedDict()  # phase or counter - value in the last round
+        self.__lock = threading.Lock()  # phases are also measured in background threads
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        """Method returns context manager, which adds time spent in it to phase :name:."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            with self.__lock:
+                total = self.totals.setdefault(name, [0, 0.0])
+                total[0] += 1
+                total[1] += seconds
+                self.round[name] = self.round.get(name, 0.0) + seconds
+
+    def count(self, name: str, value=1):
+        """Method add :value: to counter :name:."""
+        with self.__lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+            self.round[name] = self.round.get(name, 0) + value
+
+    def start_round(self):
+        """Method forget values of previous round, totals are kept."""
+        with self.__lock:
+            self.round.clear()
+
+    def summary(self) -> str:
+        """Method returns one line with values of the last round: phases in ms, then counters."""
+        with self.__lock:
+            items = list(self.round.items())
+        return " ".join("{} {:.1f}ms".format(name, value * 1000) if name in self.totals else
+                        "{} {}".format(name, value) for name, value in items)
+
+    def report(self, out=sys.stdout):
+        """Method print totals of all phases and counters."""
+        out.write("{:<20} {:>8} {:>12} {:>12}\n".format("phase", "calls", "total, ms", "mean, ms"))
+        for name, (calls, seconds) in self.totals.items():
+            out.write("{:<20} {:>8} {:>12.3f} {:>12.3f}\n".format(name, calls, seconds * 1000,
+                                                                 seconds * 1000 / calls))
+        for name, value in self.counters.items():
+            out.write("{:<20} {:>8}\n".format(name, value))
+
+
+class NullTimer:
+    """Class of disabled :PhaseTimer:, it measures nothing, so instrumented code runs almost as fast as without it."""
+    enabled = False
+    totals = counters = round = {}
+    __null_phase = contextlib.nullcontext()
+
+    def phase(self, name: str):
+        return self.__null_phase
+
+    def count(self, name: str, value=1):
+        pass
+
+    def start_round(self):
+        pass
+
+    def summary(self) -> str:
+        return ""
+
+    def report(self, out=sys.stdout):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+class MailLog:
+    """
+    Class of sendmail log file, which can be queried many times: results of previous search and lines
+    of ids already read are kept, so stricter queries and repeated lookups do not read file again.
+    Can be used as context manager, to release caches and connections.
+    """
+
+    def __init__(self, path: str, grep=None, indexer_socket=None, id_cache_size=1024, timer=NULL_TIMER,
+                 backends=BACKENDS):
+        """
+        :param grep: callable
+            Grep function (:linux_zgrep:, :universal_grep: or :GrepBackend:), by default the fastest of :backends:
+            is chosen for every search.
+        :param indexer_socket: str
+            Unix socket of indexer daemon, it is asked first if it is running.
+        :param id_cache_size: int
+            Number of ids, lines of which are kept in memory (0 - do not keep).
+        :param timer: PhaseTimer
+            Timer to measure reading of file in, it can be replaced at any time (see :PhaseTimer:).
+        :param backends: BackendRegistry
+            Backends to choose from, when :grep: is not given.
+        """
+        self.path = path
+        self.timer = timer
+        self.__grep = grep
+        self.__backends = backends
+        self.__indexer = IndexerClient(indexer_socket) if indexer_socket else None
+        if self.__indexer and not self.__indexer.is_running():
+            self.__indexer = None
+
+        # result set of the last file scan, narrowing queries are served from it without rereading the file
+        self.__loaded_lines = None
+        self.__loaded_patterns = ()
+        self.__loaded_stamp = None
+
+        self.__id_cache = collections.OrderedDict()  # id - lines, least recently used first
+        self.__id_cache_size = id_cache_size
+        self.__lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """Method release cached lines and connection to indexer."""
+        self.forget()
+        self.__indexer = None
+
+    def forget(self):
+        """Method forget previous result set and cached lines, so next queries read file again."""
+        with self.__lock:
+            self.__loaded_lines = None
+            self.__id_cache.clear()
+
+    def grep(self, patterns: (str, list), as_list=True) -> (list, bytes):
+        """Method returns lines of file, which match all :patterns:, always reading the file (or asking indexer)."""
+        return self.__read(patterns, as_list, phase="grep")
+
+    def __read(self, patterns, as_list, phase):
+        """Method of :grep:, reading is measured as :phase: of timer."""
+        timer = self.timer
+        if self.__indexer:
+            try:
+                with timer.phase(phase):
+                    lines = self.__indexer.grep(self.path, patterns, as_list=as_list)
+                timer.count("bytes read", 0)  # lines are kept by indexer
+                if as_list:
+                    timer.count("lines read", len(lines))
+                return lines
+            except (OSError, ValueError, IndexerError):
+                pass  # indexer stopped or does not index this file
+        with timer.phase(phase):
+            if self.__grep is None:
+                backend = self.__backends.choose(self.path, patterns)
+                timer.count("via " + backend.name)
+                lines = self.__backends.grep(self.path, patterns, as_list=as_list, backend=backend)
+            elif self.__grep is universal_grep:
+                with open_log(self.path) as file:
+                    lines = universal_grep(file, patterns, as_list=as_list)
+            else:
+                lines = self.__grep(self.path, patterns, as_list=as_list)
+        if timer.enabled:
+            stamp = file_stamp(self.path)
+            timer.count("bytes read", stamp[0] if stamp else 0)
+            if as_list:
+                timer.count("lines read", len(lines))
+        return lines
+
+    def search(self, patterns: list) -> list:
+        """
+        Method returns lines of file, that match all :patterns:.
+        If query only narrows the previous one (patterns were added or made stricter) and file
+        was not changed since, lines are filtered from previous result set in memory, otherwise file is scanned.
+        """
+        stamp = file_stamp(self.path)
+        if self.__loaded_lines is not None and stamp is not None and self.__loaded_stamp == stamp and \
+                is_narrowing(self.__loaded_patterns, patterns):
+            with self.timer.phase("narrow"):
+                lines = filter_lines(self.__loaded_lines, set(patterns) - set(self.__loaded_patterns))
+            self.timer.count("bytes read", 0)  # previous result set is used
+            self.timer.count("lines scanned", len(self.__loaded_lines))
+        else:
+            lines = self.grep(patterns)
+            if not all(lines):
+                lines = SpillList(line for line in lines if line)
+
+        self.__loaded_lines = lines
+        self.__loaded_patterns = tuple(patterns)
+        self.__loaded_stamp = stamp
+        return lines
+
+    def read_ids(self, ids: collections.abc.Iterable) -> dict:
+        """Method returns {id: lines} for all :ids:, ids which are not cached are read in one pass."""
+        ids = list(ids)
+        with self.__lock:
+            result = {id_: self.__id_cache[id_] for id_ in ids if id_ in self.__id_cache}
+            for id_ in result:
+                self.__id_cache.move_to_end(id_)
+        missing = [id_ for id_ in ids if id_ not in result]
+        if missing:
+            # one grep for alternation of ids, lines are split between ids afterwards
+            read = {id_: [] for id_ in missing}
+            encoded = [(id_, id_.encode()) for id_ in missing]
+            pattern = "(?:{})".format("|".join(re.escape(id_) for id_ in missing))
+            for line in self.__read(pattern, as_list=True, phase="read ids"):
+                for id_, id_bytes in encoded:
+                    if id_bytes in line:
+                        read[id_].append(line)
+            result.update(read)
+            with self.__lock:
+                for id_, lines in read.items() if self.__id_cache_size else ():
+                    self.__id_cache[id_] = lines
+                    self.__id_cache.move_to_end(id_)
+                while len(self.__id_cache) > self.__id_cache_size:
+                    self.__id_cache.popitem(last=False)
+        return result
+
+    def find_ids(self, email=None, since=None, until=None, query=None) -> list:
+        """
+        Method returns ids of messages, in order of first appearance in file.
+        Without :query: messages are found by their `msgid=` lines (message reception), otherwise by any line
+        satisfying :query:. :email: is searched as plain text, as interface does, so searches, which only
+        narrow the previous one, are served from it`s result (see :is_narrowing:). :since: and :until: limit
+        time of these lines.
+        """
+        if isinstance(query, str):
+            query = Query(query)
+        patterns = [email] if email else []
+        if query:
+            patterns += query.prefilter
+        lines = self.search(patterns or ([''] if query else ['msgid=']))
+
+        since = time_key(since) if since is not None else None
+        until = time_key(until) if until is not None else None
+        ids = {}
+        for line in lines:
+            if query and not query.match(line) or not query and b"msgid=" not in line:
+                continue
+            record = parse_log_line(line)
+            if record is None or not record["qid"]:
+                continue
+            if since is not None or until is not None:
+                moment = parse_syslog_time(record["time"].decode())
+                if since is not None and moment < since or until is not None and moment > until:
+                    continue
+            ids.setdefault(record["qid"].decode(), None)
+        return list(ids)
+
+    def query(self, email=None, since=None, until=None, query=None, batch_size=64):
+        """
+        Method returns lazy iterator of Transaction objects of messages found by :find_ids:.
+        Lines of transactions are read by batches of :batch_size: ids, each batch in one pass.
+        """
+        ids = self.find_ids(email=email, since=since, until=until, query=query)
+        return self.transactions(ids, batch_size=batch_size)
+
+    def transactions(self, ids: collections.abc.Sequence, batch_size=64):
+        """
+        Method returns lazy iterator of Transaction objects of :ids: in their order. Lines are read by batches of
+        :batch_size: ids (see :read_ids:), every batch is one search, so if there are more ids than one batch
+        and indexer is not used, they are read in one pass over file, lines of all ids are kept in :SpillList:.
+        """
+        if len(ids) <= batch_size or self.__indexer:
+            for start in range(0, len(ids), batch_size):
+                batch = ids[start:start + batch_size]
+                lines = self.read_ids(batch)
+                for id_ in batch:
+                    yield Transaction(id_, lines[id_])
+            return
+
+        wanted = {id_.encode(): array.array("Q") for id_ in ids}  # id - numbers of it`s lines
+        with self.timer.phase("read ids"), SpillList() as lines, open_log(self.path) as file:
+            for line in file:
+                positions = [wanted[token] for token in set(re.findall(rb"\w+", line)) if token in wanted]
+                if positions:
+                    for numbers in positions:
+                        numbers.append(len(lines))
+                    lines.append(line.rstrip(b"\r\n"))
+            for id_ in ids:
+                yield Transaction(id_, [lines[num] for num in wanted[id_.encode()]])
+
+
+def parse_host_source(text: str) -> tuple:
+    """Function split log source of one host ("mx1=/var/log/hosts/mx1/maillog" or just path) into (host, path)."""
+    host, sep, path = text.partition("=")
+    if not sep or os.sep in host:
+        return None, text
+    return host, path
+
+
+def dated_key(value, end: datetime.datetime) -> tuple:
+    """
+    Function convert time to (year, month, day, seconds) time key of :timeline:. Time without year
+    (syslog time string, see :time_key:) is taken in the last year, in which it is not later than :end:.
+    """
+    if isinstance(value, datetime.date):
+        return (value.year,) + time_key(value)
+    key = time_key(value)
+    return (end.year if key <= time_key(end) else end.year - 1,) + key
+
+
+def log_start_year(path: str) -> int:
+    """
+    Function returns year of the first line of log file :path:. Syslog lines have no year, so it is found
+    by time of modification of file, which is time of it`s last line (file is supposed to take less than a year).
+    """
+    modified = datetime.datetime.fromtimestamp(os.stat(path).st_mtime)
+    with open_log(path) as file:
+        for line in file:
+            record = parse_log_line(line.rstrip(b"\r\n"))
+            if record is not None:
+                return dated_key(record["time"].decode(), modified)[0]
+    return modified.year
+
+
+def timeline(lines: collections.abc.Iterable, host=None, year=None):
+    """
+    Function returns lazy iterator of (time key, host, line) of :lines: of one host, where time key is
+    (year, month, day, seconds), so it is comparable between hosts, :year: is year of the first line
+    (current one by default). Host is :host: or syslog host of line, lines which are not syslog ones
+    get time of previous line.
+    """
+    year, last = year or datetime.date.today().year, (0, 0, 0)
+    for line in lines:
+        line = line.rstrip(b"\r\n")
+        record = parse_log_line(line)
+        if record is not None:
+            moment = parse_syslog_time(record["time"].decode())
+            if moment[0] < last[0] - 6:  # month went back by half a year, log goes through new year
+                year += 1
+            last = moment
+        yield (year,) + last, host or (record["host"].decode() if record is not None else ""), line
+
+
+class HostLog:
+    """
+    Class of log of one host of many (MX, submission, relays), with it`s rotated files. Lines are read
+    file by file, so any number of hosts is merged in bounded memory (see :merge_hosts:). Year of lines
+    is found for every file by it`s time of modification (see :log_start_year:).
+    """
+
+    def __init__(self, path: str, host=None):
+        """
+        :param host: str
+            Name of host shown with lines, syslog host of every line when None.
+        """
+        self.path = path
+        self.host = host
+
+    def __repr__(self):
+        return "HostLog({!r}, host={!r})".format(self.path, self.host)
+
+    def files(self) -> list:
+        return rotated_log_set(self.path)
+
+    @property
+    def end(self) -> datetime.datetime:
+        """Time of the last line of host log, now if it has no files."""
+        files = self.files()
+        return datetime.datetime.fromtimestamp(os.stat(files[-1]).st_mtime) if files else datetime.datetime.now()
+
+    def lines(self):
+        """Method returns lazy iterator of (time key, host, line) of all lines of host (see :timeline:)."""
+        for file_path in self.files():
+            with open_log(file_path) as file:
+                yield from timeline(file, self.host, log_start_year(file_path))
+
+    def trace(self, msgid: str) -> list:
+        """
+        Method returns (time key, host, line) of lines of transactions of this host, which mention message id
+        :msgid: (`msgid=` survives relaying, queue ids do not), files are searched with grep backends.
+        """
+        traced = []
+        for file_path in self.files():
+            with MailLog(file_path, id_cache_size=0) as log:
+                ids = {record["qid"].decode() for record in map(parse_log_line, log.grep([re.escape(msgid)]))
+                       if record is not None and record["qid"]}
+                if ids:  # lines of all transactions in one pass, in order of file
+                    lines = log.grep(["(?:{})".format("|".join(re.escape(id_) for id_ in sorted(ids)))])
+                    traced += timeline(lines, self.host, log_start_year(file_path))
+        return traced
+
+
+def merge_hosts(host_logs: list, since=None, until=None):
+    """
+    Function returns lazy iterator of (host, line) of logs of all :host_logs: as one timeline, ordered by time
+    (streaming k-way merge, only one line of every host is kept in memory). :since: and :until: limit time,
+    time without year is taken in the last year, in which it is not later than the last line of logs.
+    """
+    end = max((host_log.end for host_log in host_logs), default=datetime.datetime.now())
+    since = dated_key(since, end) if since is not None else None
+    until = dated_key(until, end) if until is not None else None
+    for key, host, line in heapq.merge(*(host_log.lines() for host_log in host_logs), key=lambda item: item[0]):
+        if since is not None and key < since or until is not None and key > until:
+            continue
+        yield host, line
+
+
+def trace_message(host_logs: list, msgid: str) -> list:
+    """Function returns (host, line) of transactions of message :msgid: on all :host_logs:, ordered by time."""
+    msgid = msgid.strip("<>")
+    traced = heapq.merge(*(host_log.trace(msgid) for host_log in host_logs), key=lambda item: item[0])
+    return [(host, line) for key, host, line in traced]
+
+
+def print_timeline(lines: collections.abc.Iterable, out=sys.stdout):
+    """Function print (host, line) of :merge_hosts: or :trace_message: with host as the first column."""
+    for host, line in lines:
+        out.write("{}\t{}{}".format(host, decode_line(line), os.linesep))
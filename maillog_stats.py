@@ -0,0 +1,1007 @@
+"""
+Statistics over sendmail logs, computed in one streaming pass with bounded memory:
+
+    stats = latency_stats(rotated_log_set('/var/log/maillog'))
+    print_latency_report(stats)
+
+Results of every file are cached (see :DEFAULT_CACHE_DIR:) and merged, so rotated files,
+which do not change, are read once.
+"""  # Module does not import curses, it is used by cli interface and headless modes.
+
+import os
+import sys
+import json
+import math
+import heapq
+import base64
+import hashlib
+import sqlite3
+import tempfile
+import collections
+import collections.abc
+
+from maillog import (DEFAULT_CACHE_DIR, load_cached, store_cached, open_log, file_stamp, parse_log_line,
+                     parse_duration, parse_syslog_time, time_key)
+
+DAYS_IN_MONTH = (31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+YEAR_SECONDS = 365 * 86400
+FINAL_STATUSES = ("sent", "bounced")  # statuses of delivery, after which recipient is not tried any more
+
+
+def format_duration(seconds: float) -> str:
+    """Function convert seconds to sendmail duration ("00:30:00", "1+02:00:00"), see :parse_duration:."""
+    seconds = int(round(seconds))
+    days, seconds = divmod(seconds, 86400)
+    text = "{:02d}:{:02d}:{:02d}".format(seconds // 3600, seconds // 60 % 60, seconds % 60)
+    return "{}+{}".format(days, text) if days else text
+
+
+class DDSketch:
+    """
+    Class of mergeable quantile sketch: values are counted in buckets growing exponentially, so any quantile
+    is returned with relative error not larger than :relative_accuracy:, whatever values are.
+    Memory depends on range of values, not on their number; when buckets are more than :max_bins:,
+    the lowest ones are collapsed (low quantiles lose accuracy first).
+    """
+    MIN_VALUE = 1e-9  # values not larger than it are counted as zeros
+
+    def __init__(self, relative_accuracy=0.01, max_bins=2048):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("Relative accuracy must be between 0 and 1.")
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.__log_gamma = math.log(self.gamma)
+        self.bins = {}  # bucket index - count
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def __repr__(self):
+        return "DDSketch(count={}, accuracy={})".format(self.count, self.relative_accuracy)
+
+    def add(self, value: float, count=1):
+        """Method count :value: :count: times."""
+        if value < 0:
+            raise ValueError("Negative values are not supported.")
+        if value <= self.MIN_VALUE:
+            self.zero_count += count
+        else:
+            key = math.ceil(math.log(value) / self.__log_gamma)
+            self.bins[key] = self.bins.get(key, 0) + count
+            if len(self.bins) > self.max_bins:
+                self.__collapse()
+        self.count += count
+        self.sum += value * count
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def __collapse(self):
+        """Method merge the lowest buckets, so there are not more than :max_bins: of them."""
+        keys = sorted(self.bins)
+        extra = keys[:len(keys) - self.max_bins + 1]
+        self.bins[extra[-1]] += sum(self.bins.pop(key) for key in extra[:-1])
+
+    def merge(self, other: "DDSketch"):
+        """Method add all values of :other: sketch of the same accuracy."""
+        if other.gamma != self.gamma:
+            raise ValueError("Sketches of different accuracy can`t be merged.")
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+        while len(self.bins) > self.max_bins:
+            self.__collapse()
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def quantile(self, q: float) -> float:
+        """Method returns estimation of :q: quantile (0 <= q <= 1), or None if sketch is empty."""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return 0.0
+        seen = self.zero_count
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if seen > rank:
+                value = 2 * self.gamma ** key / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else None
+
+    def to_dict(self) -> dict:
+        return {"relative_accuracy": self.relative_accuracy, "max_bins": self.max_bins,
+                "bins": [[key, count] for key, count in self.bins.items()], "zero_count": self.zero_count,
+                "count": self.count, "sum": self.sum,
+                "min": self.min if self.count else None, "max": self.max if self.count else None}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "DDSketch":
+        sketch = cls(data["relative_accuracy"], data["max_bins"])
+        sketch.bins = {key: count for key, count in data["bins"]}
+        sketch.zero_count = data["zero_count"]
+        sketch.count = data["count"]
+        sketch.sum = data["sum"]
+        if sketch.count:
+            sketch.min, sketch.max = data["min"], data["max"]
+        return sketch
+
+
+class LatencyStats:
+    """
+    Class of delivery latency sketches (`delay=` and `xdelay=` of successful deliveries)
+    grouped by mailer, relay host and recipient domain.
+    """
+    METRICS = ("delay", "xdelay")
+    DIMENSIONS = ("mailer", "relay", "domain")
+
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.sketches = {}  # (metric, dimension, value) - DDSketch
+        self.lines = 0  # deliveries counted
+
+    def __sketch(self, key):
+        sketch = self.sketches.get(key)
+        if sketch is None:
+            sketch = self.sketches[key] = DDSketch(self.relative_accuracy)
+        return sketch
+
+    def add_line(self, line: bytes):
+        """Method count delivery line (`to=... stat=Sent`), other lines are skipped."""
+        if b"stat=Sent" not in line or b"delay=" not in line:
+            return
+        record = parse_log_line(line)
+        if record is None or "to" not in record or not record.get("stat", b"").startswith(b"Sent"):
+            return
+
+        groups = {"mailer": {record.get("mailer", b"").decode(errors="replace") or "-"},
+                  "relay": {record.get("relay", b"").split(b" ")[0].rstrip(b".").lower()
+                            .decode(errors="replace") or "-"},
+                  "domain": {address_domain(address) for address in record["to"].split(b",") if address}}
+        counted = False
+        for metric in self.METRICS:
+            try:
+                seconds = parse_duration(record[metric].decode())
+            except (KeyError, ValueError):
+                continue
+            counted = True
+            for dimension, values in groups.items():
+                for value in values:
+                    self.__sketch((metric, dimension, value)).add(seconds)
+        self.lines += counted
+
+    def merge(self, other: "LatencyStats"):
+        """Method add sketches of :other: stats."""
+        for key, sketch in other.sketches.items():
+            self.__sketch(key).merge(sketch)
+        self.lines += other.lines
+        return self
+
+    def rows(self, dimension: str, top=None) -> list:
+        """Method returns [(value, delay sketch, xdelay sketch)] of :dimension:, most frequent first."""
+        values = {key[2] for key in self.sketches if key[1] == dimension}
+        empty = DDSketch(self.relative_accuracy)
+        rows = [(value, self.sketches.get(("delay", dimension, value), empty),
+                 self.sketches.get(("xdelay", dimension, value), empty)) for value in values]
+        rows.sort(key=lambda row: (-row[1].count, row[0]))
+        return rows[:top] if top else rows
+
+    def to_dict(self) -> dict:
+        return {"relative_accuracy": self.relative_accuracy, "lines": self.lines,
+                "sketches": [list(key) + [sketch.to_dict()] for key, sketch in self.sketches.items()]}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LatencyStats":
+        stats = cls(data["relative_accuracy"])
+        stats.lines = data["lines"]
+        stats.sketches = {(metric, dimension, value): DDSketch.from_dict(sketch)
+                          for metric, dimension, value, sketch in data["sketches"]}
+        return stats
+
+
+def latency_stats_of_file(file_path: str, relative_accuracy=0.01, cache_dir=DEFAULT_CACHE_DIR) -> LatencyStats:
+    """Function returns :LatencyStats: of one file, from cache if file did not change since it was read."""
+    params = {"relative_accuracy": relative_accuracy}
+    cached = load_cached(file_path, "latency", params, cache_dir) if cache_dir else None
+    if cached is not None:
+        return LatencyStats.from_dict(cached)
+
+    stamp = file_stamp(file_path)
+    stats = LatencyStats(relative_accuracy)
+    with open_log(file_path) as file:
+        for line in file:
+            stats.add_line(line)
+    if cache_dir:
+        store_cached(file_path, "latency", params, stats.to_dict(), stamp, cache_dir)
+    return stats
+
+
+def latency_stats(file_paths: list, relative_accuracy=0.01, cache_dir=DEFAULT_CACHE_DIR) -> LatencyStats:
+    """Function returns merged :LatencyStats: of all files (see :rotated_log_set:)."""
+    stats = LatencyStats(relative_accuracy)
+    for file_path in file_paths:
+        stats.merge(latency_stats_of_file(file_path, relative_accuracy, cache_dir))
+    return stats
+
+
+def latency_report(stats: LatencyStats, quantiles=(0.5, 0.95, 0.99), top=20) -> list:
+    """Function returns lines of report tables of :stats: by every dimension."""
+    def cells(sketch):
+        return ["{:>10}".format(format_duration(sketch.quantile(q)) if sketch.count else "-") for q in quantiles]
+
+    names = ["p{:g}".format(q * 100) for q in quantiles]
+    lines = ["Delivery latency of {} deliveries (stat=Sent), relative error {:g}%".format(
+        stats.lines, stats.relative_accuracy * 100)]
+    for dimension in LatencyStats.DIMENSIONS:
+        lines.append("")
+        lines.append("{:<30} {:>8} {} | {}".format(
+            "by " + dimension, "count", " ".join("{:>10}".format("delay " + name) for name in names),
+            " ".join("{:>10}".format("xdelay " + name) for name in names)))
+        for value, delay, xdelay in stats.rows(dimension, top):
+            lines.append("{:<30} {:>8} {} | {}".format(value[:30], delay.count, " ".join(cells(delay)),
+                                                        " ".join(cells(xdelay))))
+    return lines
+
+
+def print_latency_report(stats: LatencyStats, out=sys.stdout, **kwargs):
+    """Function print :latency_report: of :stats:."""
+    for line in latency_report(stats, **kwargs):
+        out.write(line + os.linesep)
+
+
+class SpaceSaving:
+    """
+    Class of heavy hitters counter (Space-Saving algorithm): only :capacity: items are counted, new item
+    replaces the least counted one and inherits it`s count as possible error. Any item, which is more
+    frequent than total / capacity, is guaranteed to be kept, and counts are overestimated by at most :errors:.
+    """
+
+    def __init__(self, capacity=100):
+        self.capacity = capacity
+        self.counts = {}  # item - count
+        self.errors = {}  # item - count inherited from replaced item
+        self.total = 0
+        self.__buckets = {}  # count - items with it
+        self.__min = 0  # probably the lowest count in buckets
+
+    def __set_count(self, item, count):
+        old = self.counts.get(item)
+        if old is not None:
+            bucket = self.__buckets[old]
+            bucket.discard(item)
+            if not bucket:
+                del self.__buckets[old]
+        self.counts[item] = count
+        self.__buckets.setdefault(count, set()).add(item)
+        if count < self.__min:
+            self.__min = count
+
+    def __lowest(self):
+        """Method returns one of the least counted items."""
+        if self.__min not in self.__buckets:
+            self.__min = min(self.__buckets)
+        return next(iter(self.__buckets[self.__min]))
+
+    def add(self, item, count=1):
+        """Method count :item: :count: times."""
+        self.total += count
+        if item in self.counts:
+            self.__set_count(item, self.counts[item] + count)
+        elif len(self.counts) < self.capacity:
+            self.errors[item] = 0
+            self.__set_count(item, count)
+        else:
+            victim = self.__lowest()
+            low = self.counts[victim]
+            self.__buckets[low].discard(victim)
+            if not self.__buckets[low]:
+                del self.__buckets[low]
+            del self.counts[victim], self.errors[victim]
+            self.errors[item] = low
+            self.__set_count(item, low + count)
+
+    def top(self, number=10) -> list:
+        """Method returns [(item, count, error)] of :number: most frequent items."""
+        items = sorted(self.counts, key=lambda item: (-self.counts[item], item))[:number]
+        return [(item, self.counts[item], self.errors[item]) for item in items]
+
+
+def status_class(record: dict) -> str:
+    """Function returns class of delivery status of parsed `to=` line: sent, deferred, bounced or other."""
+    dsn = record.get("dsn", b"")[:1]
+    stat = record.get("stat", b"")
+    if dsn == b"2" or stat.startswith(b"Sent"):
+        return "sent"
+    if dsn == b"4" or stat.startswith(b"Deferred"):
+        return "deferred"
+    if dsn == b"5" or b"unknown" in stat.lower() or stat.startswith(b"Service unavailable"):
+        return "bounced"
+    return "other"
+
+
+def address_domain(address: bytes) -> str:
+    """Function returns lowercased domain of address (`<user@mail.net>`) or `(local)` for local users."""
+    address = address.strip(b"<> ")
+    if b"@" not in address:
+        return "(local)"
+    return address.rpartition(b"@")[2].lower().decode(errors="replace")
+
+
+class TrafficStats:
+    """
+    Class of traffic counters gathered in one pass: exact numbers of deliveries by status class,
+    and top senders, recipients, relays and deferring domains with bounded memory (see :SpaceSaving:).
+    Lines older than :since: (see :time_key:) are skipped.
+    """
+
+    def __init__(self, capacity=1000, since=None):
+        self.since = time_key(since) if since is not None else None
+        self.statuses = collections.Counter()  # status class - deliveries
+        self.senders = SpaceSaving(capacity)
+        self.recipients = SpaceSaving(capacity)
+        self.relays = SpaceSaving(capacity)
+        self.deferring = SpaceSaving(capacity)  # domains of deferred recipients
+        self.lines = 0  # lines counted
+        self.first_time = None
+        self.last_time = None
+
+    def add_line(self, line: bytes):
+        """Method count sender (`from=`) or delivery (`to=`) line, other lines are skipped."""
+        if b"from=" not in line and b"to=" not in line:
+            return
+        record = parse_log_line(line)
+        if record is None or not record["qid"]:
+            return
+        if self.since is not None:
+            try:
+                if parse_syslog_time(record["time"].decode()) < self.since:
+                    return
+            except ValueError:
+                return
+
+        if "from" in record:
+            self.senders.add(record["from"].strip(b"<> ").lower().decode(errors="replace"))
+        elif "to" in record and "stat" in record:
+            status = status_class(record)
+            self.statuses[status] += 1
+            recipients = [address.strip(b"<> ").lower() for address in record["to"].split(b",") if address]
+            for address in recipients:
+                self.recipients.add(address.decode(errors="replace"))
+            if status == "deferred":
+                for domain in {address_domain(address) for address in recipients}:
+                    self.deferring.add(domain)
+            relay = record.get("relay", b"").split(b" ")[0].rstrip(b".").lower()
+            if relay:
+                self.relays.add(relay.decode(errors="replace"))
+        else:
+            return
+        self.lines += 1
+        self.first_time = self.first_time or record["time"].decode()
+        self.last_time = record["time"].decode()
+
+    def add_lines(self, lines):
+        for line in lines:
+            self.add_line(line)
+
+
+def traffic_stats(file_paths: list, since=None, capacity=1000) -> TrafficStats:
+    """Function returns :TrafficStats: of lines of all files (see :rotated_log_set:)."""
+    stats = TrafficStats(capacity, since)
+    for file_path in file_paths:
+        with open_log(file_path) as file:
+            stats.add_lines(file)
+    return stats
+
+
+def dashboard_report(stats: TrafficStats, top=10) -> list:
+    """Function returns lines of dashboard of :stats:: status counters and top lists."""
+    deliveries = sum(stats.statuses.values())
+    lines = ["Traffic {} - {}: {} sender lines, {} deliveries".format(
+        stats.first_time or "-", stats.last_time or "-", stats.senders.total, deliveries),
+        "Status: " + " | ".join("{} {} ({:.1f}%)".format(status, stats.statuses[status],
+                                                          stats.statuses[status] * 100 / (deliveries or 1))
+                                 for status in ("sent", "deferred", "bounced", "other"))]
+    for title, counter in (("Top senders", stats.senders), ("Top recipients", stats.recipients),
+                           ("Top relays", stats.relays), ("Deferring domains", stats.deferring)):
+        lines.append("")
+        lines.append("{} (of {})".format(title, counter.total))
+        for item, count, error in counter.top(top):
+            lines.append("  {:>8}{} {}".format(count, "~" if error else " ", item))
+    return lines
+
+
+def print_dashboard(stats: TrafficStats, out=sys.stdout, **kwargs):
+    """Function print :dashboard_report: of :stats:."""
+    for line in dashboard_report(stats, **kwargs):
+        out.write(line + os.linesep)
+
+
+class SlidingCounter:
+    """
+    Class count events and failed ones in the last :window: seconds, by :buckets: buckets of window / buckets
+    seconds. Event is counted in the newest bucket, buckets out of window are dropped from the oldest,
+    so every event takes constant time, and totals of window are kept all the time.
+    """
+
+    def __init__(self, window=600, buckets=60):
+        self.window = window
+        self.step = max(window // buckets, 1)
+        self.events = 0
+        self.failed = 0
+        self.__buckets = collections.deque()  # [start second, events, failed], the oldest first
+
+    def add(self, seconds: int, failed=False):
+        """Method count event at :seconds:, events must come in order of time (late ones go to the newest bucket)."""
+        start = seconds - seconds % self.step
+        if not self.__buckets or self.__buckets[-1][0] < start:
+            self.__buckets.append([start, 0, 0])
+        bucket = self.__buckets[-1]
+        bucket[1] += 1
+        bucket[2] += failed
+        self.events += 1
+        self.failed += failed
+        self.expire(seconds)
+
+    def expire(self, seconds: int):
+        """Method drop buckets, which are out of window ending at :seconds:."""
+        while self.__buckets and self.__buckets[0][0] <= seconds - self.window:
+            _, events, failed = self.__buckets.popleft()
+            self.events -= events
+            self.failed -= failed
+
+    @property
+    def rate(self) -> float:
+        """Share of failed events in window."""
+        return self.failed / self.events if self.events else 0.0
+
+
+class AlertMonitor:
+    """
+    Class watch deliveries (`to=` lines) for spikes of deferrals and bounces: sliding window counters
+    (see :SlidingCounter:) of deliveries by relay and by recipient domain. Alert of key is raised, when share of
+    deferred and bounced deliveries in window goes over :baseline: with at least :min_events: deliveries in it,
+    and ends, when share falls below :CLEAR_RATIO: of baseline (so it does not flap around baseline).
+    Window goes with time of lines, counters without deliveries in window are forgotten.
+    """
+    CLEAR_RATIO = 0.8
+
+    def __init__(self, window=600, baseline=0.5, min_events=20):
+        self.window = window
+        self.baseline = baseline
+        self.min_events = min_events
+        self.counters = {}  # (kind, name) - SlidingCounter, kind is `relay` or `domain`
+        self.alerts = {}  # (kind, name) - SlidingCounter of keys over baseline
+        self.changes = []  # (time, (kind, name), is raised, failed, events) since previous :pop_changes:
+        self.now = 0  # the latest second of year (see :syslog_seconds:) of lines
+        self.__next_sweep = 0
+
+    def add_line(self, line: bytes):
+        """Method count delivery line, other lines are skipped."""
+        if b"to=" not in line or b"stat=" not in line:
+            return
+        record = parse_log_line(line)
+        if record is None or "to" not in record or "stat" not in record:
+            return
+        try:
+            seconds = syslog_seconds(record["time"].decode())
+        except ValueError:
+            return
+        if seconds < self.now - YEAR_SECONDS // 2:  # lines of the new year
+            seconds += YEAR_SECONDS
+        self.now = max(self.now, seconds)
+        time_text = record["time"].decode()
+
+        failed = status_class(record) in ("deferred", "bounced")
+        keys = {("domain", address_domain(address)) for address in record["to"].split(b",") if address}
+        relay = record.get("relay", b"").split(b" ")[0].rstrip(b".").lower()
+        if relay:
+            keys.add(("relay", relay.decode(errors="replace")))
+        for key in keys:
+            counter = self.counters.get(key)
+            if counter is None:
+                counter = self.counters[key] = SlidingCounter(self.window)
+            counter.add(seconds, failed)
+            self.__check(key, counter, time_text)
+
+        if self.now >= self.__next_sweep:  # once in bucket of time, not for every line
+            self.__next_sweep = self.now + max(self.window // 60, 1)
+            for key, counter in list(self.counters.items()):
+                counter.expire(self.now)
+                self.__check(key, counter, time_text)
+                if not counter.events:
+                    del self.counters[key]
+
+    def add_lines(self, lines):
+        for line in lines:
+            self.add_line(line)
+
+    def __check(self, key: tuple, counter: SlidingCounter, time_text: str):
+        if key not in self.alerts:
+            if counter.events >= self.min_events and counter.rate > self.baseline:
+                self.alerts[key] = counter
+                self.changes.append((time_text, key, True, counter.failed, counter.events))
+        elif not counter.events or counter.rate < self.baseline * self.CLEAR_RATIO:
+            del self.alerts[key]
+            self.changes.append((time_text, key, False, counter.failed, counter.events))
+
+    def pop_changes(self) -> list:
+        """Method returns alerts raised and ended since previous call."""
+        changes, self.changes = self.changes, []
+        return changes
+
+    def worst(self) -> list:
+        """Method returns [(kind, name, counter)] of alerting keys, the highest share of failed first."""
+        return [key + (counter,) for key, counter in sorted(self.alerts.items(),
+                                                             key=lambda item: (-item[1].rate, item[0]))]
+
+
+def alert_text(kind: str, name: str, failed: int, events: int, window: int) -> str:
+    """Function returns description of alert of :kind: (relay or domain) :name:."""
+    return "{} {}: {} of {} deliveries deferred or bounced ({:.0f}%) in {}".format(
+        kind, name, failed, events, failed * 100 / (events or 1), format_duration(window))
+
+
+def print_alert_changes(monitor: AlertMonitor, out=sys.stdout):
+    """Function print alerts raised (`ALERT`) and ended (`OK`) since previous print."""
+    for time_text, (kind, name), is_raised, failed, events in monitor.pop_changes():
+        out.write("{} {} {}{}".format(time_text, "ALERT" if is_raised else "OK   ",
+                                      alert_text(kind, name, failed, events, monitor.window), os.linesep))
+
+
+class HyperLogLog:
+    """
+    Class of mergeable distinct counter (HyperLogLog), it`s standard error is about :error:
+    whatever number of items is, and memory is 2 ** :precision: bytes.
+    While few items are counted, their hashes are kept (sparse mode), so small counts are exact
+    and many small counters are cheap; dense registers are used, when hashes take more memory than them.
+    """
+
+    def __init__(self, error=0.01, precision=None):
+        """
+        :param error: float
+            Wanted standard error (relative), precision is chosen to satisfy it.
+        :param precision: int
+            Number of bits of hash selecting register (4 - 18), overrides :error:.
+        """
+        if precision is None:
+            if not 0 < error < 1:
+                raise ValueError("Error must be between 0 and 1.")
+            precision = math.ceil(math.log2((1.04 / error) ** 2))
+        self.precision = min(max(precision, 4), 18)
+        self.registers_number = 1 << self.precision
+        self.sparse = set()  # 64 bit hashes of items, until it is converted to registers
+        self.registers = None
+
+    def __repr__(self):
+        return "HyperLogLog(precision={}, ~{})".format(self.precision, round(self.count()))
+
+    @property
+    def error(self) -> float:
+        """Standard error of estimation (relative), 0 while items are counted exactly."""
+        return 1.04 / math.sqrt(self.registers_number) if self.registers is not None else 0.0
+
+    @staticmethod
+    def hash(item) -> int:
+        if isinstance(item, str):
+            item = item.encode()
+        return int.from_bytes(hashlib.blake2b(item, digest_size=8).digest(), "big")
+
+    def __add_hash(self, hashed: int):
+        index = hashed >> (64 - self.precision)
+        rest = hashed & ((1 << (64 - self.precision)) - 1)
+        rank = 64 - self.precision - rest.bit_length() + 1  # position of the first 1 bit
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def __to_dense(self):
+        self.registers = bytearray(self.registers_number)
+        for hashed in self.sparse:
+            self.__add_hash(hashed)
+        self.sparse = set()
+
+    def add(self, item):
+        """Method count :item: (str or bytes)."""
+        hashed = self.hash(item)
+        if self.registers is not None:
+            self.__add_hash(hashed)
+        else:
+            self.sparse.add(hashed)
+            if len(self.sparse) * 32 > self.registers_number:  # set takes about 32 bytes per hash
+                self.__to_dense()
+
+    def merge(self, other: "HyperLogLog"):
+        """Method add items of :other: counter of the same precision."""
+        if other.precision != self.precision:
+            raise ValueError("Counters of different precision can`t be merged.")
+        if other.registers is None:
+            for hashed in other.sparse:
+                if self.registers is None:
+                    self.sparse.add(hashed)
+                else:
+                    self.__add_hash(hashed)
+            if self.registers is None and len(self.sparse) * 32 > self.registers_number:
+                self.__to_dense()
+        else:
+            if self.registers is None:
+                self.__to_dense()
+            self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self) -> float:
+        """Method returns estimation of number of distinct items."""
+        if self.registers is None:
+            return float(len(self.sparse))
+        number = self.registers_number
+        alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(number, 0.7213 / (1 + 1.079 / number))
+        estimate = alpha * number * number / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * number and zeros:
+            return number * math.log(number / zeros)  # linear counting is better for small numbers
+        return estimate
+
+    def to_dict(self) -> dict:
+        if self.registers is None:
+            return {"precision": self.precision, "sparse": sorted(self.sparse)}
+        return {"precision": self.precision, "registers": base64.b64encode(bytes(self.registers)).decode()}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "HyperLogLog":
+        counter = cls(precision=data["precision"])
+        if "registers" in data:
+            counter.registers = bytearray(base64.b64decode(data["registers"]))
+        else:
+            counter.sparse = set(data["sparse"])
+        return counter
+
+
+class DistinctStats:
+    """
+    Class of distinct counters (see :HyperLogLog:) of senders, recipients and message ids in whole log,
+    and of recipients and message ids of every sender and sender domain.
+    Senders of deliveries are found by queue id among :ids_to_remember: the most recent messages.
+    """
+    TOTALS = ("senders", "recipients", "msgids")
+
+    def __init__(self, error=0.01, ids_to_remember=100000):
+        self.error = error
+        self.counters = {}  # (what is counted, whose: "*", sender or "@domain") - HyperLogLog
+        self.first_time = None
+        self.last_time = None
+        self.__senders = collections.OrderedDict()  # queue id - sender, the most recent last
+        self.__ids_to_remember = ids_to_remember
+
+    def counter(self, what: str, whose="*") -> HyperLogLog:
+        """Method returns counter of :what: of :whose: (`*` - of whole log), new one if it was not counted yet."""
+        counter = self.counters.get((what, whose))
+        if counter is None:
+            counter = self.counters[what, whose] = HyperLogLog(self.error)
+        return counter
+
+    def add_line(self, line: bytes):
+        """Method count sender (`from=`) or delivery (`to=`) line, other lines are skipped."""
+        if b"from=" not in line and b"to=" not in line:
+            return
+        record = parse_log_line(line)
+        if record is None or not record["qid"]:
+            return
+        self.first_time = self.first_time or record["time"].decode()
+        self.last_time = record["time"].decode()
+
+        if "from" in record:
+            sender = record["from"].strip(b"<> ").lower().decode(errors="replace")
+            domain = "@" + address_domain(record["from"])
+            self.counter("senders").add(sender)
+            self.__senders[record["qid"]] = sender
+            if len(self.__senders) > self.__ids_to_remember:
+                self.__senders.popitem(last=False)
+            if "msgid" in record:
+                for whose in ("*", sender, domain):
+                    self.counter("msgids", whose).add(record["msgid"])
+        elif "to" in record:
+            sender = self.__senders.get(record["qid"])
+            whose = ("*", sender, "@" + sender.rpartition("@")[2] if "@" in sender else "@(local)") \
+                if sender else ("*",)
+            for address in record["to"].split(b","):
+                address = address.strip(b"<> ").lower()
+                if address:
+                    for who in whose:
+                        self.counter("recipients", who).add(address)
+
+    def merge(self, other: "DistinctStats"):
+        """Method add counters of :other: stats (of later file)."""
+        for key, counter in other.counters.items():
+            if key in self.counters:
+                self.counters[key].merge(counter)
+            else:
+                self.counters[key] = HyperLogLog.from_dict(counter.to_dict())
+        self.first_time = self.first_time or other.first_time
+        self.last_time = other.last_time or self.last_time
+        return self
+
+    def count(self, what: str, whose="*") -> tuple:
+        """Method returns (estimation, standard error) of number of distinct :what: of :whose:."""
+        counter = self.counters.get((what, whose))
+        if counter is None:
+            return 0, 0.0
+        return counter.count(), counter.error
+
+    def to_dict(self) -> dict:
+        return {"error": self.error, "first_time": self.first_time, "last_time": self.last_time,
+                "counters": [[what, whose, counter.to_dict()] for (what, whose), counter in self.counters.items()]}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "DistinctStats":
+        stats = cls(data["error"])
+        stats.first_time, stats.last_time = data["first_time"], data["last_time"]
+        stats.counters = {(what, whose): HyperLogLog.from_dict(counter) for what, whose, counter in data["counters"]}
+        return stats
+
+
+def distinct_stats_of_file(file_path: str, error=0.01, cache_dir=DEFAULT_CACHE_DIR) -> DistinctStats:
+    """Function returns :DistinctStats: of one file, from cache if file did not change since it was read."""
+    params = {"error": error}
+    cached = load_cached(file_path, "distinct", params, cache_dir) if cache_dir else None
+    if cached is not None:
+        return DistinctStats.from_dict(cached)
+
+    stamp = file_stamp(file_path)
+    stats = DistinctStats(error)
+    with open_log(file_path) as file:
+        for line in file:
+            stats.add_line(line)
+    if cache_dir:
+        store_cached(file_path, "distinct", params, stats.to_dict(), stamp, cache_dir)
+    return stats
+
+
+def distinct_stats(file_paths: list, error=0.01, since=None, until=None,
+                   cache_dir=DEFAULT_CACHE_DIR) -> DistinctStats:
+    """
+    Function returns merged :DistinctStats: of all files (see :rotated_log_set:).
+    Files, which have no lines between :since: and :until: (see :time_key:), are skipped, so time range
+    is selected by whole files.
+    """
+    since = time_key(since) if since is not None else None
+    until = time_key(until) if until is not None else None
+    stats = DistinctStats(error)
+    for file_path in file_paths:
+        file_stats = distinct_stats_of_file(file_path, error, cache_dir)
+        if file_stats.first_time is None or \
+                since is not None and parse_syslog_time(file_stats.last_time) < since or \
+                until is not None and parse_syslog_time(file_stats.first_time) > until:
+            continue
+        stats.merge(file_stats)
+    return stats
+
+
+def distinct_report(stats: DistinctStats, whose=None, top=20) -> list:
+    """
+    Function returns lines of report of :stats:: distinct counts of whole log, and of :whose: (sender address
+    or `@domain`), or of :top: senders with the most recipients, if :whose: is not given.
+    """
+    def cell(what, who):
+        estimate, error = stats.count(what, who)
+        return "{:>10} {:>7}".format(round(estimate), "±{:.1f}%".format(error * 100) if error else "exact")
+
+    lines = ["Distinct counts {} - {} (± - standard error, ~68% of estimations are within it)".format(
+        stats.first_time or "-", stats.last_time or "-")]
+    lines += ["{:<40} {}".format(what, cell(what, "*")) for what in DistinctStats.TOTALS]
+    if whose:
+        whose_list = [whose.lower()]
+    else:
+        senders = {who for what, who in stats.counters if what == "recipients" and who != "*"}
+        whose_list = sorted(senders, key=lambda who: -stats.count("recipients", who)[0])[:top]
+    lines.append("")
+    lines.append("{:<40} {:>18} {:>18}".format("sender or @domain", "recipients", "msgids"))
+    for who in whose_list:
+        lines.append("{:<40} {} {}".format(who[:40], cell("recipients", who), cell("msgids", who)))
+    return lines
+
+
+def print_distinct_report(stats: DistinctStats, out=sys.stdout, **kwargs):
+    """Function print :distinct_report: of :stats:."""
+    for line in distinct_report(stats, **kwargs):
+        out.write(line + os.linesep)
+
+
+def syslog_seconds(text: str) -> int:
+    """Function convert syslog time ("Jul 19 04:40:04") to seconds since start of (not leap) year."""
+    month, day, seconds = parse_syslog_time(text)
+    return (sum(DAYS_IN_MONTH[:month - 1]) + day - 1) * 86400 + seconds
+
+
+class QueueTracker:
+    """
+    Class follow state of every message by queue id: sender (`from=`), delivery attempts to recipients (`to=`)
+    and their statuses. Message is finished, when all it`s recipients got final status (sent or bounced),
+    such messages are forgotten at once. Not more than :max_in_memory: open messages are kept in memory,
+    the least recently updated ones are moved to sqlite database (:spill_path:, temporary file by default),
+    so memory is bounded on logs of any length. Can be used as context manager, to remove the database.
+    """
+
+    def __init__(self, max_in_memory=100000, spill_path=None):
+        self.open = collections.OrderedDict()  # queue id - state, the least recently updated first
+        self.max_in_memory = max_in_memory
+        self.finished = 0  # number of finished messages
+        self.spilled = 0  # number of open messages in database
+        self.last_time = None  # time of the latest line
+        self.__spill_path = spill_path
+        self.__db = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """Method close and remove database of spilled messages, if it is temporary."""
+        if self.__db is not None:
+            self.__db.close()
+            self.__db = None
+            if self.__spill_path is None:
+                os.unlink(self.__db_path)
+
+    def __connect(self):
+        if self.__db is None:
+            if self.__spill_path is None:
+                handle, self.__db_path = tempfile.mkstemp(prefix="sendmail_queue_", suffix=".sqlite3")
+                os.close(handle)
+            else:
+                self.__db_path = self.__spill_path
+            self.__db = sqlite3.connect(self.__db_path)
+            # time of the first line (see :syslog_seconds:) and whether message is deferred are kept for lookup
+            self.__db.execute("CREATE TABLE IF NOT EXISTS open "
+                              "(qid TEXT PRIMARY KEY, state TEXT, first INTEGER, deferred INTEGER)")
+        return self.__db
+
+    def __spill(self):
+        """Method move tenth of open messages, the least recently updated, to database."""
+        number = max(len(self.open) // 10, 1)
+        rows = []
+        for _ in range(number):
+            qid, state = self.open.popitem(last=False)
+            rows.append((qid, json.dumps(state), syslog_seconds(state["first_time"]), self.is_deferred(state)))
+        with self.__connect() as db:
+            db.executemany("INSERT OR REPLACE INTO open VALUES (?, ?, ?, ?)", rows)
+        self.spilled += len(rows)
+
+    def __restore(self, qid):
+        """Method returns state of spilled message and removes it from database, or None."""
+        if not self.spilled:
+            return None
+        with self.__connect() as db:
+            row = db.execute("SELECT state FROM open WHERE qid = ?", (qid,)).fetchone()
+            if row is None:
+                return None
+            db.execute("DELETE FROM open WHERE qid = ?", (qid,))
+        self.spilled -= 1
+        return json.loads(row[0])
+
+    @staticmethod
+    def is_deferred(state: dict) -> bool:
+        """Method check if any recipient of message was deferred."""
+        return any(status == "deferred" for status, _ in state["recipients"].values())
+
+    @staticmethod
+    def is_finished(state: dict) -> bool:
+        """Method check if all recipients of message got final status."""
+        statuses = [status for status, _ in state["recipients"].values()]
+        return bool(statuses) and all(status in FINAL_STATUSES for status in statuses) and \
+            len(statuses) >= state["nrcpts"]
+
+    def add_line(self, line: bytes):
+        """Method update state of message, which line is about."""
+        if b"from=" not in line and b"stat=" not in line:
+            return
+        record = parse_log_line(line)
+        if record is None or not record["qid"]:
+            return
+        qid = record["qid"].decode()
+        time_ = record["time"].decode()
+        self.last_time = time_
+        state = self.open.pop(qid, None) or self.__restore(qid)
+
+        if "from" in record:
+            if state is None:
+                state = {"qid": qid, "sender": None, "nrcpts": 0, "first_time": time_, "recipients": {}}
+            state["sender"] = record["from"].strip(b"<> ").decode(errors="replace")
+            try:
+                state["nrcpts"] = int(record.get("nrcpts", b"0"))
+            except ValueError:
+                pass
+        elif "to" in record and "stat" in record:
+            if state is None:  # message was queued before the first line of log
+                state = {"qid": qid, "sender": None, "nrcpts": 0, "first_time": time_, "recipients": {}}
+            status = (status_class(record), record["stat"].decode(errors="replace"))
+            for address in record["to"].split(b","):
+                address = address.strip(b"<> ")
+                if address:
+                    state["recipients"][address.decode(errors="replace")] = status
+        elif state is None:
+            return
+        state["last_time"] = time_
+
+        if self.is_finished(state):
+            self.finished += 1
+            return
+        self.open[qid] = state
+        if len(self.open) > self.max_in_memory:
+            self.__spill()
+
+    def add_lines(self, lines):
+        for line in lines:
+            self.add_line(line)
+
+    def open_messages(self, only_deferred=True, min_age=0):
+        """
+        Method returns lazy iterator of states of open messages, the oldest first, with `age` (seconds from
+        the first line of message to the latest line of log). If :only_deferred:, only messages with deferred
+        recipients are returned (stuck ones). Spilled messages are filtered and ordered by database and read
+        one by one, merged with ones in memory, so tracker must not be closed, until iterator is finished.
+        """
+        now = syslog_seconds(self.last_time) if self.last_time else 0
+        in_memory = []
+        for state in self.open.values():
+            if only_deferred and not self.is_deferred(state):
+                continue
+            age = now - syslog_seconds(state["first_time"])
+            state["age"] = age + YEAR_SECONDS if age < 0 else age  # log goes through new year
+            if state["age"] >= min_age:
+                in_memory.append(state)
+        in_memory.sort(key=lambda state: -state["age"])
+        if not self.spilled:
+            return iter(in_memory)
+
+        rows = self.__connect().execute(
+            "SELECT state, age FROM (SELECT state, deferred, CASE WHEN first > :now THEN :now - first + :year "
+            "ELSE :now - first END AS age FROM open) WHERE age >= :min_age AND (deferred OR NOT :only_deferred) "
+            "ORDER BY age DESC", {"now": now, "year": YEAR_SECONDS, "min_age": min_age,
+                                  "only_deferred": only_deferred})
+        spilled = (dict(json.loads(state), age=age) for state, age in rows)
+        return heapq.merge(in_memory, spilled, key=lambda state: -state["age"])
+
+
+def track_queue(file_paths: list, max_in_memory=100000) -> QueueTracker:
+    """Function returns :QueueTracker: fed with lines of all files (see :rotated_log_set:), oldest first."""
+    tracker = QueueTracker(max_in_memory)
+    is_read = False
+    try:
+        for file_path in file_paths:
+            with open_log(file_path) as file:
+                tracker.add_lines(file)
+        is_read = True
+    finally:
+        if not is_read:
+            tracker.close()  # database of spilled messages is removed
+    return tracker
+
+
+STUCK_HEADER = "{:<16} {:>11}  {:<30} {}".format("ID", "age", "sender", "recipients: last status")
+
+
+def stuck_row(state: dict) -> str:
+    """Function returns line of table of open messages of one :state: (see :QueueTracker.open_messages:)."""
+    waiting = ["{} ({})".format(address, stat) for address, (status, stat) in state["recipients"].items()
+               if status not in FINAL_STATUSES]
+    return "{:<16} {:>11}  {:<30} {}".format(state["qid"], format_duration(state["age"]),
+                                             (state["sender"] or "-")[:30], ", ".join(waiting))
+
+
+def print_stuck_report(states: collections.abc.Iterable, out=sys.stdout):
+    """Function print table of open messages :states: one by one, as they come, with their number at the end."""
+    out.write(STUCK_HEADER + os.linesep)
+    count = 0
+    for state in states:
+        out.write(stuck_row(state) + os.linesep)
+        count += 1
+    out.write("{} messages are not delivered yet, the oldest first{}".format(count, os.linesep))
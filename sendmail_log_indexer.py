@@ -0,0 +1,240 @@
+#!/usr/bin/python3
+"""
+Daemon keeps sendmail log files indexed in memory, follows lines appended to them,
+and answers grep queries of gather_send_mail_log sessions over unix socket.
+"""  # One daemon serves any number of sessions, so log files are read once.
+
+import re
+import os
+import grp
+import json
+import time
+import array
+import argparse
+import threading
+import socketserver
+
+from maillog import (DEFAULT_INDEXER_SOCKET, IndexerClient, LogTail, SpillList, check_socket_dir, compile_pattern,
+                     file_stamp, rotated_log_set, segment_filters)
+
+# tokens, which look like sendmail queue ids ("06J1e4G4012711"): letters and digits mixed
+ID_TOKEN = re.compile(rb"(?<![0-9A-Za-z])(?=[0-9A-Za-z]*[0-9])(?=[0-9A-Za-z]*[A-Za-z])"
+                      rb"[0-9A-Za-z]{8,20}(?![0-9A-Za-z])")
+# grep pattern, which is one id or alternation of ids, as prefetcher asks them: "(?:id1|id2)"
+ID_PATTERN = re.compile(r"(?:\(\?:)?([0-9A-Za-z]{8,20}(?:\|[0-9A-Za-z]{8,20})*)\)?")
+PAGE_LINES = 4096  # lines in one response to grep, found lines are sent by pages
+
+
+def conf_args_parser() -> argparse.Namespace:
+    """
+    Function config daemon cli interface.
+
+    Returns
+    -------
+    :return: argparse.Namespace
+        Namespace of program arguments
+    """
+    parser = argparse.ArgumentParser(description=__doc__, prog='sendmail_log_indexer',
+                                     formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--version', action='version', version='%(prog)s 1.0')
+    parser.add_argument('--socket', '-S', default=DEFAULT_INDEXER_SOCKET, dest="socket", metavar="PATH",
+                        help='unix socket to listen on (default {})'.format(DEFAULT_INDEXER_SOCKET), action='store')
+    parser.add_argument('--socket_mode', default=0o660, dest="socket_mode", metavar="MODE",
+                        type=lambda text: int(text, 8),
+                        help='octal permissions of socket, users connect if they can write it\n'
+                             '(default 660: owner and group of socket)')
+    parser.add_argument('--group', default=None, dest="group", metavar="GROUP",
+                        help='group of socket and of it`s directory, when it is made, e.g. group of operators,\n'
+                             'who share one daemon')
+    parser.add_argument('--interval', default=1.0, dest="interval", type=float, metavar="SECONDS",
+                        help='how often to check log files for new lines')
+    parser.add_argument('--bloom', default=False, dest="bloom", action='store_true',
+                        help='keep Bloom filters of logs and their rotated files up to date in cache,\n'
+                             'so lookups of `gather_send_mail_log --find` do not build them')
+    parser.add_argument('logs', nargs='+', metavar="LOG",
+                        help='log files to index, only they can be queried')
+    return parser.parse_args()
+
+
+class LogIndex:
+    """
+    Class keep lines of one log file (in :SpillList:, so they are moved to disk, when they take much memory)
+    with numbers of lines by every id mentioned in them.
+    Plain files are followed: appended lines are indexed, truncated or rotated file is indexed anew.
+    """
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self.lines = SpillList()  # bytes lines
+        self.ids = {}  # id - array of numbers of lines, which contain it
+        self.__tail = LogTail(self.path)
+        self.__lock = threading.RLock()
+
+    def __reset(self):
+        self.lines.close()
+        self.lines = SpillList()
+        self.ids = {}
+
+    def __add_lines(self, lines):
+        """Method append lines to index."""
+        for line in lines:
+            num = len(self.lines)
+            self.lines.append(line)
+            for id_ in set(ID_TOKEN.findall(line)):
+                numbers = self.ids.get(id_.decode())
+                if numbers is None:
+                    numbers = self.ids[id_.decode()] = array.array("Q")
+                numbers.append(num)
+
+    def update(self):
+        """Method index lines appended to file since last update."""
+        with self.__lock:
+            chunks = self.__tail.read()
+            if self.__tail.restarted:
+                self.__reset()  # log was rotated or truncated
+            for lines in chunks:
+                self.__add_lines(lines)
+
+    def grep(self, patterns: list) -> SpillList:
+        """
+        Method returns lines, which match all :patterns:, as grep functions do.
+        If one of patterns is id or alternation of ids, only lines from index of these ids are checked.
+        """
+        with self.__lock:
+            candidates = None
+            for pattern in patterns:
+                match = ID_PATTERN.fullmatch(pattern)
+                ids = match.group(1).split("|") if match else []
+                if ids and all(ID_TOKEN.fullmatch(id_.encode()) for id_ in ids):
+                    nums = set()
+                    for id_ in ids:
+                        nums.update(self.ids.get(id_, ()))
+                    candidates = nums if candidates is None else candidates & nums
+
+            compiled = [compile_pattern(pattern, as_bytes=True) for pattern in patterns]
+            if candidates is None:
+                lines = self.lines
+            else:
+                lines = (self.lines[num] for num in sorted(candidates))
+            return SpillList(line for line in lines if all(pattern.search(line) for pattern in compiled))
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """Class answer requests of one connection, request and response are json lines."""
+
+    def handle(self):
+        for request in self.rfile:
+            try:
+                for response in self.server.answer(json.loads(request)):
+                    self.wfile.write(json.dumps(response).encode() + b"\n")
+            except Exception as err:  # any bad request must not stop the daemon
+                response = {"ok": False, "error": "{}: {}".format(type(err).__name__, err)}
+                self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+
+
+class IndexerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Class of daemon, which serves queries over indexes of given log files."""
+    daemon_threads = True
+
+    def __init__(self, socket_path, log_paths, interval=1.0, bloom=False, socket_mode=0o660, group=None):
+        """
+        :param socket_mode: int
+            Permissions of socket, set after it is bound, users connect to daemon, if they can write socket.
+        :param group: str
+            Name of group of socket (and of it`s directory, if it is made), so members of group share daemon.
+        """
+        self.indexes = {}
+        self.bloom = bloom
+        self.__bloom_stamps = {}  # path - stamp of file, when it`s Bloom filters were updated
+        for path in log_paths:
+            index = LogIndex(path)
+            self.indexes[index.path] = index
+            index.update()
+        self.interval = interval
+
+        # socket is made in directory, which others can`t change, clients check it (see :check_socket_dir:)
+        gid = grp.getgrnam(group).gr_gid if group else -1
+        directory = os.path.dirname(os.path.abspath(socket_path))
+        if not os.path.isdir(directory):
+            os.makedirs(directory, mode=0o755)
+            os.chown(directory, -1, gid)
+        check_socket_dir(socket_path)
+        if os.path.exists(socket_path):
+            if IndexerClient(socket_path).is_running():
+                raise OSError("Indexer is already running on `{}`.".format(socket_path))
+            os.unlink(socket_path)  # socket left by stopped daemon
+        super().__init__(socket_path, RequestHandler)
+        os.chown(socket_path, -1, gid)
+        os.chmod(socket_path, socket_mode)
+
+        threading.Thread(target=self.__follow, name="log-follower", daemon=True).start()
+
+    def __follow(self):
+        """Method of background thread, index lines appended to log files."""
+        while True:
+            time.sleep(self.interval)
+            for index in self.indexes.values():
+                try:
+                    index.update()
+                except OSError:  # file is being rotated, it will be indexed next time
+                    pass
+            if self.bloom:
+                self.__update_filters()
+
+    def __update_filters(self):
+        """Method update Bloom filters of log files and their rotated files, which changed since last time."""
+        for index in self.indexes.values():
+            for path in rotated_log_set(index.path):
+                stamp = file_stamp(path)
+                if stamp is not None and self.__bloom_stamps.get(path) != stamp:
+                    try:
+                        segment_filters(path)
+                    except OSError:  # file is being rotated, filters will be updated next time
+                        continue
+                    self.__bloom_stamps[path] = stamp
+
+    def answer(self, request: dict):
+        """
+        Method returns lazy iterator of responses to one request: one response, or pages of
+        :PAGE_LINES: found lines for grep, all pages but the last one have `more`.
+        """
+        if request.get("op") == "ping":
+            yield {"ok": True, "logs": sorted(self.indexes)}
+            return
+
+        if request.get("op") == "grep":
+            index = self.indexes.get(request.get("path"))
+            if index is None:
+                yield {"ok": False, "error": "File `{}` is not indexed.".format(request.get("path"))}
+                return
+            index.update()
+            with index.grep(list(request.get("patterns") or [""])) as lines:
+                for start in range(0, max(len(lines), 1), PAGE_LINES):
+                    page = lines[start:start + PAGE_LINES]
+                    yield {"ok": True, "lines": [line.decode("latin-1") for line in page],
+                           "more": start + PAGE_LINES < len(lines)}
+            return
+
+        yield {"ok": False, "error": "Unknown operation `{}`.".format(request.get("op"))}
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+def main():
+    parser_arg = conf_args_parser()
+    server = IndexerServer(parser_arg.socket, parser_arg.logs, interval=parser_arg.interval, bloom=parser_arg.bloom,
+                           socket_mode=parser_arg.socket_mode, group=parser_arg.group)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""Tests of indexer daemon: sessions ask it instead of reading log."""
+
+import os
+import stat
+import shutil
+import threading
+
+import pytest
+
+from maillog import IndexerClient, MailLog, PhaseTimer
+from sendmail_log_indexer import IndexerServer
+
+TEST_LOG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test.log")
+
+
+@pytest.fixture
+def indexer(tmp_path):
+    """Daemon indexing copy of test.log, serving in background thread, and path of the copy."""
+    log_path = str(tmp_path / "maillog")
+    shutil.copy(TEST_LOG, log_path)
+    socket_path = str(tmp_path / "run" / "indexer.sock")
+    server = IndexerServer(socket_path, [log_path], interval=0.1, socket_mode=0o660)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, socket_path, log_path
+    server.shutdown()
+    server.server_close()
+
+
+def test_socket_mode(indexer):
+    _, socket_path, _ = indexer
+    assert stat.S_IMODE(os.stat(socket_path).st_mode) == 0o660
+    assert not os.stat(os.path.dirname(socket_path)).st_mode & 0o002
+
+
+def test_ping_and_grep(indexer):
+    _, socket_path, log_path = indexer
+    client = IndexerClient(socket_path)
+    assert client.is_running()
+    assert client.request(op="ping")["logs"] == [log_path]
+
+    with open(log_path, "rb") as file:
+        expected = [line.rstrip(b"\n") for line in file if b"06J1e4G4012711" in line]
+    assert client.grep(log_path, ["06J1e4G4012711"], as_list=True) == expected
+    with open(log_path, "rb") as file:
+        assert len(client.grep(log_path, [""], as_list=True)) == len(file.readlines())  # sent by pages
+
+
+def test_mail_log_uses_indexer(indexer):
+    _, socket_path, log_path = indexer
+    timer = PhaseTimer()
+    with MailLog(log_path, indexer_socket=socket_path, timer=timer) as log:
+        lines = log.grep(["sergey@mail.kibr.net"])
+    assert lines and all(b"sergey@mail.kibr.net" in line for line in lines)
+    assert timer.counters["bytes read"] == 0  # lines were kept by daemon, file was not read
+    assert timer.counters["lines read"] == len(lines)
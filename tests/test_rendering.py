@@ -0,0 +1,27 @@
+"""Tests of rendering of tables: time of keystroke and memory do not grow with number of rows."""
+
+import pytest
+
+from benchmark import FakeWindow, fake_curses, rendering_benchmarks, measure, MAX_KEYSTROKE_MS, MAX_RENDER_KB
+
+REPEAT = 3  # the best run is checked, so slow moments of machine do not fail tests
+
+
+@pytest.mark.parametrize("rows", [10, 10000, 1000000])
+def test_keystroke_time_and_memory(rows):
+    with fake_curses():
+        for name, (function, calls) in rendering_benchmarks([rows]).items():
+            result = measure(function, REPEAT, calls)
+            assert result["per_keystroke"] * 1000 <= MAX_KEYSTROKE_MS, name
+            assert result["peak_bytes"] <= MAX_RENDER_KB * 1024, name
+
+
+def test_rows_are_drawn():
+    from gather_send_mail_log import MovingOrganizer
+    with fake_curses():
+        window = FakeWindow(10, 60)
+        organizer = MovingOrganizer(window)
+        organizer.refill_elements(["row {}".format(num) for num in range(1000000)])
+        organizer.select(500000)
+        organizer.draw_on_screen()
+    assert "row 500000" in window.text()